@@ -17,12 +17,21 @@ CALL apoc.periodic.iterate(
        row.shape_pt_lon AS lon,
        row.shape_pt_lat AS lat
   ORDER BY shape_id, seq
-  RETURN shape_id, collect(lon + " " + lat) AS coords
+  RETURN shape_id,
+         collect(lon + " " + lat) AS coords,
+         collect(point({longitude: toFloat(lon), latitude: toFloat(lat)})) AS pts
   ',
   '
-  WITH shape_id, "LINESTRING(" + apoc.text.join(coords, ", ") + ")" AS wkt
+  WITH shape_id, pts, "LINESTRING(" + apoc.text.join(coords, ", ") + ")" AS wkt
   CALL spatial.addWKT("shapes", wkt) YIELD node
-  SET node:Shape, node.id = shape_id
+  SET node:Shape, node.id = shape_id,
+      // Metrics of the shape, which never change once it is loaded.
+      node.length_meters = reduce(total = 0.0, i IN range(0, size(pts) - 2) | total + point.distance(pts[i], pts[i + 1])),
+      node.endpoints_distance_meters = point.distance(pts[0], pts[-1]),
+      node.min_lon = apoc.coll.min([p IN pts | p.x]),
+      node.min_lat = apoc.coll.min([p IN pts | p.y]),
+      node.max_lon = apoc.coll.max([p IN pts | p.x]),
+      node.max_lat = apoc.coll.max([p IN pts | p.y])
   ',
   { batchSize: 1000, params: { dataset: $dataset } }
 ) YIELD batches
@@ -117,3 +117,17 @@ CALL {           // Import progressively to prevent out-of-memory errors.
 } IN TRANSACTIONS OF 1000 ROWS;
 
 CREATE INDEX idx_stop_time_stop_sequence FOR (st: StopTime) ON (st.stop_sequence);
+
+// Link the consecutive stop times (located at stops) of each trip, so that queries don't need to sort them again.
+// NOTE: Consecutive stop times are found by ordering, since stop sequences may have gaps.
+MATCH (t: Trip)
+CALL {
+    WITH t
+    MATCH (t)<-[:PART_OF]-(st: StopTime)-[:LOCATED_AT]->(:Stop)
+    WITH st
+    ORDER BY st.stop_sequence
+    WITH collect(st) AS stop_times
+    UNWIND range(0, size(stop_times) - 2) AS i
+    WITH stop_times[i] AS from_st, stop_times[i + 1] AS to_st, i
+    CREATE (from_st)-[n: NEXT { segment_index: i }]->(to_st)
+} IN TRANSACTIONS OF 1000 ROWS;
@@ -7,6 +7,7 @@ CREATE CONSTRAINT stop_tts_name_type FOR (s: Stop) REQUIRE s.tts_name :: STRING;
 CREATE CONSTRAINT stop_desc_type FOR (s: Stop) REQUIRE s.desc :: STRING;
 CREATE CONSTRAINT stop_latitude_type FOR (s: Stop) REQUIRE s.latitude :: FLOAT;
 CREATE CONSTRAINT stop_longitude_type FOR (s: Stop) REQUIRE s.longitude :: FLOAT;
+CREATE CONSTRAINT stop_location_type FOR (s: Stop) REQUIRE s.location :: POINT;
 CREATE CONSTRAINT stop_url_type FOR (s: Stop) REQUIRE s.url :: STRING;
 CREATE CONSTRAINT stop_timezone_type FOR (s: Stop) REQUIRE s.timezone :: STRING;
 
@@ -68,6 +69,8 @@ CALL {
         desc: row.stop_desc,
         latitude: toFloat(row.stop_lat),
         longitude: toFloat(row.stop_lon),
+        // NOTE: point() returns null if any coordinate is missing (generic nodes and boarding areas).
+        location: point({latitude: toFloat(row.stop_lat), longitude: toFloat(row.stop_lon)}),
         url: row.stop_url,
         timezone: row.stop_timezone,
         platform_code: row.platform_code
@@ -100,6 +103,10 @@ CALL {
 } IN TRANSACTIONS OF 1000 ROWS;
 
 
+// Native point index, used for nearest neighbour searches.
+CREATE POINT INDEX stop_location_index FOR (s: Stop) ON (s.location);
+
+
 // Generate relationships between parent and child stations.
 // NOTE: This has to be done AFTER importing all stops to prevent parent stop matches from possibly not happening.
 LOAD CSV WITH HEADERS FROM "file:///GTFS/" + $dataset + "/stops.txt" AS row
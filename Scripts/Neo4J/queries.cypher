@@ -63,6 +63,36 @@ ORDER BY service_id
 '
 });
 
+// Find transport services which are active for the given date range.
+MERGE (:CypherQuery {
+    name: 'active_services_range',
+    statement: '
+WITH date($start_date) AS start_date, date($end_date) AS end_date
+
+UNWIND range(0, duration.inDays(start_date, end_date).days) AS i
+WITH start_date + duration({days: i}) AS service_date
+
+MATCH (cq: CypherQuery {name: \'active_services\'})
+CALL apoc.cypher.run(cq.statement, {curr_date: service_date}) YIELD value
+
+RETURN service_date, value.service_id AS service_id
+ORDER BY service_date, service_id
+'
+});
+
+// Group the dates of a range by their active services (dates without services are skipped).
+// NOTE: Used by the date range queries, which compute their results once per group.
+MERGE (:CypherQuery {
+    name: 'service_date_classes',
+    statement: '
+MATCH (cq: CypherQuery {name: \'active_services_range\'})
+CALL apoc.cypher.run(cq.statement, {start_date: $start_date, end_date: $end_date}) YIELD value
+WITH value.service_date AS service_date, collect(value.service_id) AS service_ids
+
+RETURN service_ids, collect(service_date) AS service_dates
+'
+});
+
 // Find all the departure times for a given route, stop and date.
 MERGE (:CypherQuery {
     name: 'departure_times',
@@ -278,6 +308,73 @@ ORDER BY route_name, min_headway, median_headway, max_headway, stddev_seconds
 '
 });
 
+// Date range variants of the queries above.
+// Every date with the same active services has the same results, so they are computed once per group of dates.
+
+// Get the most important stops for every date of the given range.
+MERGE (:CypherQuery {
+    name: 'top_stops_range',
+    statement: '
+MATCH (classes: CypherQuery {name: \'service_date_classes\'})
+CALL apoc.cypher.run(classes.statement, {start_date: $start_date, end_date: $end_date}) YIELD value
+WITH value.service_dates AS service_dates
+
+MATCH (cq: CypherQuery {name: \'top_stops\'})
+CALL apoc.cypher.run(cq.statement, {curr_date: service_dates[0]}) YIELD value
+
+UNWIND service_dates AS service_date
+RETURN service_date,
+       value.stop_name AS stop_name,
+       value.route_count AS route_count,
+       value.routes AS routes,
+       value.total_departures AS total_departures,
+       value.first_departure AS first_departure,
+       value.last_departure AS last_departure
+ORDER BY service_date, total_departures DESC, first_departure ASC, last_departure DESC, stop_name ASC
+'
+});
+
+// Generate a histogram of trip start times for every date of the given range.
+MERGE (:CypherQuery {
+    name: 'trip_start_time_distribution_range',
+    statement: '
+MATCH (classes: CypherQuery {name: \'service_date_classes\'})
+CALL apoc.cypher.run(classes.statement, {start_date: $start_date, end_date: $end_date}) YIELD value
+WITH value.service_dates AS service_dates
+
+MATCH (cq: CypherQuery {name: \'trip_start_time_distribution\'})
+CALL apoc.cypher.run(cq.statement, {curr_date: service_dates[0], bucket_size_min: $bucket_size_min}) YIELD value
+
+UNWIND service_dates AS service_date
+RETURN service_date,
+       value.time_bucket AS time_bucket,
+       value.trip_count AS trip_count
+ORDER BY service_date, time_bucket
+'
+});
+
+// Generate headway statistics for all routes on every date of the given range.
+MERGE (:CypherQuery {
+    name: 'headway_stats_range',
+    statement: '
+MATCH (classes: CypherQuery {name: \'service_date_classes\'})
+CALL apoc.cypher.run(classes.statement, {start_date: $start_date, end_date: $end_date}) YIELD value
+WITH value.service_dates AS service_dates
+
+MATCH (cq: CypherQuery {name: \'headway_stats\'})
+CALL apoc.cypher.run(cq.statement, {curr_date: service_dates[0]}) YIELD value
+
+UNWIND service_dates AS service_date
+RETURN service_date,
+       value.route_name AS route_name,
+       value.min_headway AS min_headway,
+       value.median_headway AS median_headway,
+       value.max_headway AS max_headway,
+       value.stddev_seconds AS stddev_seconds
+ORDER BY service_date, route_name, min_headway, median_headway, max_headway, stddev_seconds
+'
+});
+
 ////////////////////////////////////////////////////////
 // Network analysis and optimization.
 ////////////////////////////////////////////////////////
@@ -285,15 +382,9 @@ ORDER BY route_name, min_headway, median_headway, max_headway, stddev_seconds
 MERGE (:CypherQuery {
     name: 'routes_by_speed',
     statement: '
-// Step 1: Find length for each trip shape.
+// Step 1: Find length for each trip shape (computed during the import).
 MATCH (s: Shape)
-WITH s.id AS shape_id, s.wkt AS wkt
-WITH shape_id, substring(wkt, 12, size(wkt)-13) AS coordsText                                       // Strip "LINESTRING(" and trailing ")"
-WITH shape_id, [c IN split(coordsText, \',\') | trim(c)] AS coordStrs                               // Split into coordinate strings and trim
-WITH shape_id, [s IN coordStrs | split(s, \' \')] AS pairs                                          // Split each "lon lat" into [lon, lat]
-WITH shape_id, [p IN pairs | point({longitude: toFloat(p[0]), latitude: toFloat(p[1])})] AS pts     // Turn pairs into proper point objects
-WITH shape_id, reduce(total = 0.0, i IN range(0, size(pts)-2) |                                     // Accumulate distances between points
-                      total + point.distance(pts[i], pts[i+1])) AS length_meters
+WITH s.id AS shape_id, s.length_meters AS length_meters
 
 // Step 2: Find the corresponding trips and calculate their durations.
 MATCH (r:Route)<-[:FOLLOWS]-(t:Trip)-[:HAS_SHAPE]->(s:Shape {id: shape_id})
@@ -359,15 +450,11 @@ ORDER BY active_trip_count DESC, avg_frequency ASC, route_name ASC
 MERGE (:CypherQuery {
     name: 'overlapping_segments',
     statement: '
-MATCH (s:Stop)<-[:LOCATED_AT]-(st:StopTime)-[:PART_OF]->(t:Trip)
-WITH t, s, st
-ORDER BY st.stop_sequence
-
-WITH t, apoc.coll.pairsMin(collect(s)) as stop_sequences
-
-MATCH (t:Trip)-[:FOLLOWS]->(r:Route)
-UNWIND stop_sequences as stop_pair
-WITH DISTINCT r, stop_pair[0] as from_stop, stop_pair[1] as to_stop
+// Segments are the NEXT relationships between consecutive stop times, created during the import.
+MATCH (r:Route)<-[:FOLLOWS]-(:Trip)<-[:PART_OF]-(st1:StopTime)-[:NEXT]->(st2:StopTime)
+MATCH (st1)-[:LOCATED_AT]->(from_stop:Stop)
+MATCH (st2)-[:LOCATED_AT]->(to_stop:Stop)
+WITH DISTINCT r, from_stop, to_stop
 
 WITH from_stop, to_stop, apoc.coll.sort(collect(r.short_name)) AS routes
 
@@ -401,6 +488,39 @@ ORDER BY distance_unrounded, name
 '
 });
 
+// Batch variant of stops_within_distance: the i-th origin is given by the i-th element
+// of each list, and results are tagged with its zero-based index.
+MERGE (:CypherQuery {
+    name: 'stops_within_distance_batch',
+    statement: '
+CALL apoc.util.validate(
+    size($origin_lats) <> size($origin_lons) OR size($origin_lats) <> size($seek_dists),
+    \'Origin latitudes, longitudes and distances must have the same length: %d, %d, %d\',
+    [size($origin_lats), size($origin_lons), size($seek_dists)]
+)
+UNWIND range(0, size($origin_lats) - 1) AS origin_index
+CALL spatial.withinDistance(\'stops\', {lat: $origin_lats[origin_index], lon: $origin_lons[origin_index]}, $seek_dists[origin_index] / 1000.0) YIELD node, distance
+WITH origin_index, node as stop, toInteger(distance * 1000.0) as distance, distance as distance_unrounded
+RETURN origin_index, stop.id as id, stop.name as name, distance
+ORDER BY origin_index, distance_unrounded, name
+'
+});
+
+// NOTE: The distance predicate is served by the point index on Stop.location,
+//       so only stops inside the search radius are ever sorted.
+MERGE (:CypherQuery {
+    name: 'nearest_stops',
+    statement: '
+WITH point({latitude: $origin_lat, longitude: $origin_lon}) AS origin
+MATCH (stop: Stop)
+WHERE point.distance(stop.location, origin) <= $max_dist
+WITH stop, point.distance(stop.location, origin) AS distance_unrounded
+ORDER BY distance_unrounded, stop.name
+LIMIT $k
+RETURN stop.id as id, stop.name as name, toInteger(distance_unrounded) as distance
+'
+});
+
 // Get the next departures for a given stop, date and time.
 MERGE (:CypherQuery {
     name: 'next_departures',
@@ -441,3 +561,32 @@ RETURN
     duration({seconds: display_seconds}) AS time
 '
 });
+
+////////////////////////////////////////////////////////
+// Query snapshots.
+////////////////////////////////////////////////////////
+
+CREATE CONSTRAINT query_snapshot_name_type FOR (qs: QuerySnapshot) REQUIRE qs.name :: STRING;
+CREATE CONSTRAINT query_snapshot_rows_type FOR (qs: QuerySnapshot) REQUIRE qs.rows :: STRING;
+CREATE CONSTRAINT query_snapshot_key FOR (qs: QuerySnapshot) REQUIRE qs.name IS NODE KEY;
+
+// Dataset loaded by the import, identified by a fingerprint of its files.
+MERGE (d: Dataset)
+SET d.name = $dataset,
+    d.fingerprint = $dataset_fingerprint,
+    d.imported_at = datetime();
+
+// Materialize the results of the parameterless queries, tagged with the loaded dataset.
+// Snapshots are optional (see 'import.py --snapshots'), since they hide the cost of these queries.
+// NOTE: Rows are stored as a JSON list, which keeps their order.
+MATCH (cq: CypherQuery), (d: Dataset)
+WHERE $query_snapshots AND cq.name IN ['overlapping_segments', 'routes_by_speed']
+CALL {
+    WITH cq
+    CALL apoc.cypher.run(cq.statement, {}) YIELD value
+    RETURN collect(value) AS rows
+}
+MERGE (qs: QuerySnapshot {name: cq.name})
+SET qs.dataset_fingerprint = d.fingerprint,
+    qs.rows = apoc.convert.toJson(rows),
+    qs.created_at = datetime();
@@ -1,13 +1,11 @@
-
 -- Main import function
 CREATE OR REPLACE PROCEDURE load_from_csv(table_to_import TEXT, file_path TEXT)
 LANGUAGE plpgsql AS
 $pr$
 DECLARE
-    schema_name text := 'public';
-    set_clause text;
-    where_clause text;
-    col_list text[];
+    copy_options TEXT := 'FORMAT CSV, HEADER MATCH, NULL ''\N'', DEFAULT '''', ENCODING ''UTF8''';
+    time_columns TEXT[];
+    staging_table TEXT := table_to_import || '_staging';
 BEGIN
     -- Check if the file exists
     IF pg_stat_file(file_path, true) IS NULL THEN
@@ -20,37 +18,30 @@ BEGIN
     -- Keep the user informed
     RAISE INFO 'Importing content of table "%"...', table_to_import;
 
+    -- Find columns that store GTFS times.
+    SELECT array_agg(attname ORDER BY attnum) INTO time_columns
+    FROM pg_attribute
+    WHERE attrelid = table_to_import::regclass AND attnum > 0 AND NOT attisdropped AND atttypid = 'gtfs_time'::regtype;
+
     -- Load CSV to table
-    EXECUTE format('COPY %I FROM %L WITH (FORMAT CSV, HEADER MATCH, NULL '''', ENCODING ''UTF8'');', table_to_import, file_path);
-
-    -- Retrieve nullable columns with their DEFAULT values
-    SELECT INTO set_clause, where_clause
-        string_agg(
-            format(
-                '%I = CASE WHEN %I IS NULL THEN %s ELSE %I END',
-                metadata.column_name,
-                metadata.column_name,
-                -- Use the column's DEFAULT value directly
-                -- Remove casting if present to avoid syntax errors
-                split_part(metadata.column_default, '::', 1),
-                metadata.column_name
-            ),
-            ', '
-        ),
-        string_agg(format('%I IS NULL', metadata.column_name), ' OR ')
-    FROM (
-        SELECT column_name, column_default
-        FROM information_schema.columns c
-        WHERE table_schema = schema_name
-            AND table_name = table_to_import
-            AND is_nullable = 'YES'
-            AND column_default IS NOT NULL
-    ) AS metadata;
-
-    -- Apply DEFAULT values to columns with NULLs
-    -- NOTE: This can take up to 20% of the import time.
-    IF set_clause IS NOT NULL THEN
-        EXECUTE format('UPDATE %I.%I SET %s WHERE %s;', schema_name, table_to_import, set_clause, where_clause);
+    -- NOTE: Empty fields take the DEFAULT value of their column (NULL if there is none) while loading,
+    --       which avoids rewriting the whole table afterwards. Explicit NULLs are not used by GTFS.
+    IF time_columns IS NULL OR gtfs_time_format() = 'interval' THEN
+        -- COPY parses GTFS times as intervals by itself.
+        EXECUTE format('COPY %I FROM %L WITH (%s);', table_to_import, file_path, copy_options);
+    ELSE
+        -- Times stored as seconds cannot be parsed by COPY, so load them as text into a staging table first.
+        -- NOTE: The client-side import in 'import.py' converts them while streaming instead.
+        EXECUTE format('CREATE TEMP TABLE %I (LIKE %I INCLUDING DEFAULTS);', staging_table, table_to_import);
+        EXECUTE format('ALTER TABLE %I %s;', staging_table,
+            (SELECT string_agg(format('ALTER COLUMN %I TYPE TEXT', c), ', ') FROM unnest(time_columns) c));
+        EXECUTE format('COPY %I FROM %L WITH (%s);', staging_table, file_path, copy_options);
+        EXECUTE format('INSERT INTO %I SELECT %s FROM %I;', table_to_import,
+            (SELECT string_agg(CASE WHEN attname = ANY(time_columns) THEN format('to_gtfs_time(%I)', attname) ELSE format('%I', attname) END, ', ' ORDER BY attnum)
+             FROM pg_attribute
+             WHERE attrelid = table_to_import::regclass AND attnum > 0 AND NOT attisdropped),
+            staging_table);
+        EXECUTE format('DROP TABLE %I;', staging_table);
     END IF;
 END
 $pr$;
@@ -97,3 +88,65 @@ BEGIN
     END IF;
 END;
 $$;
+
+
+-- Storage format for GTFS times, which can be greater than 24:00:00.
+--   'interval': INTERVAL values (16 bytes), which can be used directly in date arithmetic.
+--   'seconds': INTEGER seconds since the start of the service day (4 bytes), which are faster to compare and sort.
+-- Queries should only access them through the helpers below, so that they work with both formats.
+SELECT set_config('gtfs.time_format', :'time_format', false);
+
+DO $do$
+DECLARE
+    time_format TEXT := current_setting('gtfs.time_format');
+BEGIN
+    IF time_format = 'interval' THEN
+        CREATE DOMAIN gtfs_time AS INTERVAL;
+
+        -- Convert a GTFS time string or an interval to the storage format.
+        CREATE FUNCTION to_gtfs_time(time_str TEXT) RETURNS gtfs_time
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        RETURN parse_gtfs_time(time_str);
+
+        CREATE FUNCTION to_gtfs_time(time_val INTERVAL) RETURNS gtfs_time
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        RETURN time_val;
+    ELSIF time_format = 'seconds' THEN
+        CREATE DOMAIN gtfs_time AS INTEGER;
+
+        CREATE FUNCTION to_gtfs_time(time_str TEXT) RETURNS gtfs_time
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        RETURN split_part(time_str, ':', 1)::int * 3600 + split_part(time_str, ':', 2)::int * 60 + split_part(time_str, ':', 3)::int;
+
+        -- Infinite intervals are mapped to the extreme values, so that they can still be used as sentinels.
+        CREATE FUNCTION to_gtfs_time(time_val INTERVAL) RETURNS gtfs_time
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        RETURN CASE
+            WHEN isfinite(time_val) THEN EXTRACT(EPOCH FROM time_val)::int
+            WHEN time_val > INTERVAL '0' THEN 2147483647
+            ELSE -2147483648
+        END;
+    ELSE
+        RAISE EXCEPTION 'Unknown time format: "%". Expected "interval" or "seconds".', time_format;
+    END IF;
+
+    EXECUTE format('CREATE FUNCTION gtfs_time_format() RETURNS TEXT LANGUAGE sql IMMUTABLE PARALLEL SAFE RETURN %L;', time_format);
+END
+$do$;
+
+-- Convert a stored GTFS time to an interval or to a number of seconds, whatever the storage format is.
+CREATE OR REPLACE FUNCTION gtfs_time_interval(time_val INTERVAL) RETURNS INTERVAL
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+RETURN time_val;
+
+CREATE OR REPLACE FUNCTION gtfs_time_interval(time_val INTEGER) RETURNS INTERVAL
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+RETURN make_interval(secs => time_val);
+
+CREATE OR REPLACE FUNCTION gtfs_time_seconds(time_val INTERVAL) RETURNS INTEGER
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+RETURN EXTRACT(EPOCH FROM time_val)::int;
+
+CREATE OR REPLACE FUNCTION gtfs_time_seconds(time_val INTEGER) RETURNS INTEGER
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+RETURN time_val;
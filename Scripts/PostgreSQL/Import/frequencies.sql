@@ -6,10 +6,11 @@ INSERT INTO service_type VALUES
     (1, 'Schedule Based');
 
 DROP TABLE IF EXISTS frequency;
+-- Times are parsed while loading, since they can be >= 24:00 (see 'gtfs_time' in base.sql).
 CREATE TABLE frequency (
     trip_id TEXT,
-    start_time TEXT,
-    end_time TEXT,
+    start_time gtfs_time,
+    end_time gtfs_time,
     headway_secs INTEGER,
     exact_times INTEGER DEFAULT 0
 );
@@ -17,9 +18,6 @@ CREATE TABLE frequency (
 CALL load_from_csv('frequency', :'dataset_dir' || '/frequencies.txt');
 
 ALTER TABLE frequency
--- Transform start and end times into intervals (they can be >= 24:00)
-ALTER COLUMN start_time TYPE INTERVAL USING parse_gtfs_time(start_time),
-ALTER COLUMN end_time TYPE INTERVAL USING parse_gtfs_time(end_time),
 -- Create constraints AFTER loading data for performance reasons.
 ADD CONSTRAINT chk_frequency_non_nulls CHECK (num_nulls(trip_id, start_time, end_time, headway_secs) = 0),
 ADD CONSTRAINT chk_frequency_headway_secs CHECK (headway_secs > 0),
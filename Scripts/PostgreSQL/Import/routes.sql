@@ -145,7 +145,10 @@ ADD CONSTRAINT pk_route PRIMARY KEY (route_id),
 ADD CONSTRAINT fk_route_agency_id FOREIGN KEY (agency_id) REFERENCES agency(agency_id),
 ADD CONSTRAINT fk_route_route_type FOREIGN KEY (route_type) REFERENCES route_type(id),
 ADD CONSTRAINT fk_route_continuous_pickup FOREIGN KEY (continuous_pickup) REFERENCES continuous_status(id),
-ADD CONSTRAINT fk_route_continuous_drop_off FOREIGN KEY (continuous_drop_off) REFERENCES continuous_status(id);
+ADD CONSTRAINT fk_route_continuous_drop_off FOREIGN KEY (continuous_drop_off) REFERENCES continuous_status(id),
+-- Add serial (used as a compact key by other tables).
+ADD COLUMN "serial" SERIAL,
+ADD CONSTRAINT uq_route_serial UNIQUE (serial);
 
 CREATE INDEX idx_route_network_id ON route(network_id);
 
@@ -19,13 +19,29 @@ ADD CONSTRAINT chk_shape_dist_traveled CHECK (shape_dist_traveled >= 0);
 DROP TABLE IF EXISTS shape;
 CREATE TABLE shape (
     shape_id TEXT,
-    shape_geom GEOMETRY(LINESTRING, 4326)   -- 4326 is the SRID for lat/lon coordinates.
+    shape_geom GEOMETRY(LINESTRING, 4326),  -- 4326 is the SRID for lat/lon coordinates.
+    -- Metrics of the shape, which never change once it's loaded.
+    length_meters DOUBLE PRECISION,                         -- Measured on a sphere, to match Neo4J results.
+    geodesic_length_meters DOUBLE PRECISION,                -- Measured on the spheroid.
+    endpoints_distance_meters DOUBLE PRECISION,             -- Straight-line distance between both ends, measured on a sphere.
+    geodesic_endpoints_distance_meters DOUBLE PRECISION,    -- Straight-line distance between both ends, measured on the spheroid.
+    bbox BOX2D
 );
 
 INSERT INTO shape
-SELECT shape_id, ST_SetSRID(ST_LineFromMultiPoint(ST_Collect(ST_Point(shape_pt_lon, shape_pt_lat) ORDER BY shape_pt_sequence)), 4326)
-FROM shape_temp
-GROUP BY shape_id;
+SELECT
+    shape_id,
+    geom,
+    ST_Length(geom::geography, false),
+    ST_Length(geom::geography, true),
+    ST_Distance(ST_StartPoint(geom)::geography, ST_EndPoint(geom)::geography, false),
+    ST_Distance(ST_StartPoint(geom)::geography, ST_EndPoint(geom)::geography, true),
+    Box2D(geom)
+FROM (
+    SELECT shape_id, ST_SetSRID(ST_LineFromMultiPoint(ST_Collect(ST_Point(shape_pt_lon, shape_pt_lat) ORDER BY shape_pt_sequence)), 4326) AS geom
+    FROM shape_temp
+    GROUP BY shape_id
+) AS s;
 
 DROP TABLE shape_temp;
 
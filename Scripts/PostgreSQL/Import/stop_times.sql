@@ -14,17 +14,20 @@ INSERT INTO time_precision VALUES
     (1, 'Exact');
 
 DROP TABLE IF EXISTS stop_time;
-CREATE TABLE stop_time (
+-- The file is loaded into a temporary table first, since stop times refer to trips and stops
+-- through their integer keys instead of their text ids (see 'trips.sql' and 'stops.sql').
+-- Times are parsed while loading, since they can be >= 24:00 (see 'gtfs_time' in base.sql).
+CREATE TEMP TABLE stop_time_raw (
     trip_id TEXT,
-    arrival_time TEXT,
-    departure_time TEXT,
+    arrival_time gtfs_time,
+    departure_time gtfs_time,
     stop_id TEXT,
     location_group_id TEXT,
     location_id TEXT,
     stop_sequence INTEGER,
     stop_headsign TEXT,
-    start_pickup_drop_off_window TEXT,
-    end_pickup_drop_off_window TEXT,
+    start_pickup_drop_off_window gtfs_time,
+    end_pickup_drop_off_window gtfs_time,
     pickup_type INTEGER DEFAULT 0,
     drop_off_type INTEGER DEFAULT 0,
     continuous_pickup INTEGER DEFAULT 1,
@@ -35,25 +38,75 @@ CREATE TABLE stop_time (
     drop_off_booking_rule_id TEXT
 );
 
-CALL load_from_csv('stop_time', :'dataset_dir' || '/stop_times.txt');
+CALL load_from_csv('stop_time_raw', :'dataset_dir' || '/stop_times.txt');
+
+-- Ids without a match would be lost when translating them, so reject them as the foreign keys used to.
+DO $$
+DECLARE
+    invalid_id TEXT;
+BEGIN
+    SELECT r.trip_id INTO invalid_id
+    FROM stop_time_raw r
+    WHERE NOT EXISTS (SELECT 1 FROM trip t WHERE t.trip_id = r.trip_id)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Stop time: Invalid trip_id: %', invalid_id;
+    END IF;
+
+    SELECT r.stop_id INTO invalid_id
+    FROM stop_time_raw r
+    WHERE r.stop_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM stop s WHERE s.stop_id = r.stop_id)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Stop time: Invalid stop_id: %', invalid_id;
+    END IF;
+END
+$$;
+
+-- Rows are stored ordered by trip, so that the stop times of a trip are next to each other.
+CREATE TABLE stop_time AS
+SELECT
+    t.serial AS trip_idx,
+    r.arrival_time,
+    r.departure_time,
+    s.serial AS stop_idx,
+    r.location_group_id,
+    r.location_id,
+    r.stop_sequence,
+    r.stop_headsign,
+    r.start_pickup_drop_off_window,
+    r.end_pickup_drop_off_window,
+    r.pickup_type,
+    r.drop_off_type,
+    r.continuous_pickup,
+    r.continuous_drop_off,
+    r.shape_dist_traveled,
+    r.timepoint,
+    r.pickup_booking_rule_id,
+    r.drop_off_booking_rule_id
+FROM
+    stop_time_raw r
+    JOIN trip t ON t.trip_id = r.trip_id
+    LEFT JOIN stop s ON s.stop_id = r.stop_id
+ORDER BY t.serial, r.stop_sequence;
+
+DROP TABLE stop_time_raw;
 
 ALTER TABLE stop_time
--- Transform times into intervals (they can be >= 24:00)
-ALTER COLUMN arrival_time TYPE INTERVAL USING parse_gtfs_time(arrival_time),
-ALTER COLUMN departure_time TYPE INTERVAL USING parse_gtfs_time(departure_time),
-ALTER COLUMN start_pickup_drop_off_window TYPE INTERVAL USING parse_gtfs_time(start_pickup_drop_off_window),
-ALTER COLUMN end_pickup_drop_off_window TYPE INTERVAL USING parse_gtfs_time(end_pickup_drop_off_window),
 -- Create constraints AFTER loading data for performance reasons.
 ADD CONSTRAINT chk_stop_time_stop_sequence CHECK (stop_sequence >= 0),
 ADD CONSTRAINT chk_stop_time_shape_dist_traveled CHECK (shape_dist_traveled >= 0),
-ADD CONSTRAINT pk_stop_time PRIMARY KEY (trip_id, stop_sequence),
-ADD CONSTRAINT fk_stop_time_trip FOREIGN KEY (trip_id) REFERENCES trip(trip_id),
-ADD CONSTRAINT fk_stop_time_stop FOREIGN KEY (stop_id) REFERENCES stop(stop_id),
+ADD CONSTRAINT pk_stop_time PRIMARY KEY (trip_idx, stop_sequence),
+ADD CONSTRAINT fk_stop_time_trip FOREIGN KEY (trip_idx) REFERENCES trip(serial),
+ADD CONSTRAINT fk_stop_time_stop FOREIGN KEY (stop_idx) REFERENCES stop(serial),
 ADD CONSTRAINT fk_stop_time_pickup_type FOREIGN KEY (pickup_type) REFERENCES stop_method(id),
 ADD CONSTRAINT fk_stop_time_drop_off_type FOREIGN KEY (drop_off_type) REFERENCES stop_method(id),
 ADD CONSTRAINT fk_stop_time_continuous_pickup FOREIGN KEY (continuous_pickup) REFERENCES continuous_status(id),
 ADD CONSTRAINT fk_stop_time_continuous_drop_off FOREIGN KEY (continuous_drop_off) REFERENCES continuous_status(id),
 ADD CONSTRAINT fk_stop_time_timepoint FOREIGN KEY (timepoint) REFERENCES time_precision(id);
 
+-- Some indexes for faster joins.
+CREATE INDEX idx_stop_time_stop_idx ON stop_time(stop_idx);
+
 -- Update stats for better query performance.
 ANALYZE stop_time;
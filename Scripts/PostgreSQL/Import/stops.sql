@@ -47,13 +47,12 @@ ADD CONSTRAINT pk_stop PRIMARY KEY (stop_id),
 ADD CONSTRAINT fk_stop_location_type FOREIGN KEY (location_type) REFERENCES location_type(id),
 ADD CONSTRAINT fk_stop_parent_station FOREIGN KEY (parent_station) REFERENCES stop(stop_id),
 ADD CONSTRAINT fk_stop_wheelchair_boarding FOREIGN KEY (wheelchair_boarding) REFERENCES wheelchair_status(id),
--- Add serial (used in queries).
+-- Add serial (used in queries and as a compact key by other tables).
 ADD COLUMN "serial" SERIAL,
+ADD CONSTRAINT uq_stop_serial UNIQUE (serial),
 -- Include corresponding PostGIS geometry.
 ADD COLUMN "location" GEOMETRY(Point, 4326);
 
-CREATE UNIQUE INDEX idx_stop_serial ON stop (serial);
-
 -- Generate geometry from coordinates
 UPDATE "stop" SET "location" =  ST_SetSRID(ST_Point(stop_lon, stop_lat), 4326);     -- 4326 is the SRID for lat/lon coordinates
 ALTER TABLE "stop"
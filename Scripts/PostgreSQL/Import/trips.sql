@@ -12,6 +12,23 @@ INSERT INTO bicycle_status VALUES
     (1, 'Allowed'),
     (2, 'Not Allowed');
 
+-- Dictionary of every service id, which can be defined by service(service_id) or service_exception(service_id).
+-- Trips refer to services through its compact integer key, and so does the query catalog.
+DROP TABLE IF EXISTS service_key;
+CREATE TABLE service_key AS
+SELECT
+    row_number() OVER (ORDER BY service_id)::INTEGER AS "serial",
+    service_id
+FROM (
+    SELECT service_id FROM service
+    UNION
+    SELECT service_id FROM service_exception
+) AS services;
+
+ALTER TABLE service_key
+ADD CONSTRAINT pk_service_key PRIMARY KEY (service_id),
+ADD CONSTRAINT uq_service_key_serial UNIQUE (serial);
+
 DROP TABLE IF EXISTS trip;
 CREATE TABLE trip (
     route_id TEXT,
@@ -26,37 +43,38 @@ CREATE TABLE trip (
     bikes_allowed INTEGER DEFAULT 0
 );
 
--- Service ids can refer to either service(service_id) or service_exception(service_id),
--- so we use a trigger to validate the data.
-CREATE OR REPLACE FUNCTION trip_validate_service_id() RETURNS TRIGGER
-LANGUAGE plpgsql AS $$
-BEGIN
-    IF NOT EXISTS (
-        SELECT 1 FROM service WHERE service_id = NEW.service_id
-        UNION ALL
-        SELECT 1 FROM service_exception WHERE service_id = NEW.service_id
-    ) THEN
-        RAISE EXCEPTION 'Trip: Invalid service_id: %', NEW.service_id;
-    END IF;
-
-    RETURN NEW;
-END;
-$$;
-
-CREATE TRIGGER trip_service_id_validation
-BEFORE INSERT OR UPDATE ON trip
-FOR EACH ROW EXECUTE FUNCTION trip_validate_service_id();
-
 CALL load_from_csv('trip', :'dataset_dir' || '/trips.txt');
 
 -- Create constraints AFTER loading data for performance reasons.
+-- NOTE: Service ids can refer to either service(service_id) or service_exception(service_id),
+--       which is why they are validated against the service_key dictionary.
 ALTER TABLE trip
 ADD CONSTRAINT chk_trip_non_nulls CHECK (num_nulls(route_id, service_id) = 0),
 ADD CONSTRAINT pk_trip PRIMARY KEY (trip_id),
 ADD CONSTRAINT fk_trip_route_id FOREIGN KEY (route_id) REFERENCES route(route_id),
+ADD CONSTRAINT fk_trip_service_id FOREIGN KEY (service_id) REFERENCES service_key(service_id),
 ADD CONSTRAINT fk_trip_direction_id FOREIGN KEY (direction_id) REFERENCES travel_direction(id),
 ADD CONSTRAINT fk_trip_wheelchair_accessible FOREIGN KEY (wheelchair_accessible) REFERENCES wheelchair_status(id),
-ADD CONSTRAINT fk_trip_bikes_allowed FOREIGN KEY (bikes_allowed) REFERENCES bicycle_status(id);
+ADD CONSTRAINT fk_trip_bikes_allowed FOREIGN KEY (bikes_allowed) REFERENCES bicycle_status(id),
+-- Add integer keys, so that the largest tables (and the queries) don't need to store and compare text ids.
+ADD COLUMN "serial" SERIAL,
+ADD COLUMN route_idx INTEGER,
+ADD COLUMN service_idx INTEGER,
+ADD CONSTRAINT uq_trip_serial UNIQUE (serial);
+
+UPDATE trip t
+SET route_idx = r.serial, service_idx = sk.serial
+FROM route r, service_key sk
+WHERE r.route_id = t.route_id AND sk.service_id = t.service_id;
+
+ALTER TABLE trip
+ADD CONSTRAINT fk_trip_route_idx FOREIGN KEY (route_idx) REFERENCES route(serial),
+ADD CONSTRAINT fk_trip_service_idx FOREIGN KEY (service_idx) REFERENCES service_key(serial);
+
+-- Some indexes for faster joins.
+CREATE INDEX idx_trip_route_idx ON trip(route_idx);
+CREATE INDEX idx_trip_service_idx ON trip(service_idx);
 
 -- Update stats for better query performance.
+ANALYZE service_key;
 ANALYZE trip;
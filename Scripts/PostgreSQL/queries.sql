@@ -1,9 +1,107 @@
 
+--------------------------------------------------------
+-- Query snapshots.
+--------------------------------------------------------
+
+
+-- Dataset loaded by the import, identified by a fingerprint of its files.
+CREATE TABLE dataset_info AS (
+    SELECT
+        :'dataset'::TEXT AS dataset_name,
+        :'dataset_fingerprint'::TEXT AS fingerprint,
+        now() AS imported_at
+);
+
+-- Parameterless queries whose results have been materialized by refresh_query_snapshots,
+-- along with the fingerprint of the dataset they were computed on.
+CREATE TABLE query_snapshot (
+    query_name TEXT PRIMARY KEY,
+    dataset_fingerprint TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Whether a query can be served from a snapshot of the loaded dataset.
+-- Every import recreates the database along with its snapshots, so the fingerprint
+-- only guards against tables that are reloaded by hand afterwards.
+CREATE OR REPLACE FUNCTION has_query_snapshot(query_name TEXT)
+RETURNS BOOLEAN
+LANGUAGE sql STABLE
+AS $$
+    SELECT EXISTS (
+        SELECT 1
+        FROM query_snapshot qs
+            JOIN dataset_info di ON qs.dataset_fingerprint = di.fingerprint
+        WHERE qs.query_name = has_query_snapshot.query_name
+    );
+$$;
+
+
 --------------------------------------------------------
 -- Basic queries. These are the foundation for others.
 --------------------------------------------------------
 
 
+-- Calendar of the services that are active on each date of the feed.
+-- It is computed once, so that queries only need an index lookup to find the active services.
+-- NOTE: Each service is only expanded over its own date range, so the work is proportional to the size of the result.
+CREATE TABLE service_calendar AS (
+    WITH days_and_services AS (
+        SELECT d::date as service_date, s.service_id
+        FROM
+            service s
+            CROSS JOIN LATERAL generate_series(s.start_date, s.end_date, interval '1 day') d
+        WHERE
+            -- Make sure the service is running on the current day of week.
+            (CASE extract(dow FROM d)
+                WHEN 0 THEN sunday
+                WHEN 1 THEN monday
+                WHEN 2 THEN tuesday
+                WHEN 3 THEN wednesday
+                WHEN 4 THEN thursday
+                WHEN 5 THEN friday
+                WHEN 6 THEN saturday
+            END)
+    ),
+
+    added_services AS (
+        SELECT se1.date as service_date, se1.service_id
+        FROM service_exception se1
+        WHERE se1.exception_type = 1
+    ),
+
+    removed_services AS (
+        SELECT se2.date as service_date, se2.service_id
+        FROM service_exception se2
+        WHERE se2.exception_type = 2
+    ),
+
+    active AS (
+        SELECT * FROM days_and_services
+        UNION (SELECT * FROM added_services)
+        EXCEPT (SELECT * FROM removed_services)
+    )
+
+    SELECT a.service_date, sk.serial AS service_idx
+    FROM active a JOIN service_key sk ON sk.service_id = a.service_id
+    ORDER BY a.service_date, sk.serial
+);
+
+ALTER TABLE service_calendar
+ADD CONSTRAINT pk_service_calendar PRIMARY KEY (service_date, service_idx);
+
+ANALYZE service_calendar;
+
+-- Find the integer keys of the services which are active for the given date.
+-- NOTE: Used internally by the rest of the queries. Written in SQL so that it gets inlined into them.
+CREATE OR REPLACE FUNCTION active_service_indices(curr_date DATE)
+RETURNS TABLE(service_idx INTEGER)
+LANGUAGE sql STABLE
+AS $$
+    SELECT sc.service_idx
+    FROM service_calendar sc
+    WHERE sc.service_date = curr_date;
+$$;
+
 -- Find transport services which are active for the given date.
 CREATE OR REPLACE FUNCTION active_services(curr_date DATE)
 RETURNS TABLE(service_id TEXT)
@@ -23,53 +121,40 @@ LANGUAGE plpgsql
 AS $$
 BEGIN
     RETURN QUERY
+    SELECT sc.service_date, sk.service_id
+    FROM
+        service_calendar sc
+        JOIN service_key sk ON sk.serial = sc.service_idx
+    WHERE sc.service_date BETWEEN start_date AND end_date
+    ORDER BY sc.service_date, sk.service_id;
+END
+$$;
 
-    WITH days_and_services AS (
-        SELECT d::date as service_date, s.service_id
-        FROM
-            generate_series(start_date, end_date, interval '1 day') d
-            JOIN service s ON
-                s.start_date <= d AND
-                s.end_date >= d AND
-                -- Make sure the service is running on the current day of week.
-                (CASE extract(dow FROM d)
-                    WHEN 0 THEN sunday
-                    WHEN 1 THEN monday
-                    WHEN 2 THEN tuesday
-                    WHEN 3 THEN wednesday
-                    WHEN 4 THEN thursday
-                    WHEN 5 THEN friday
-                    WHEN 6 THEN saturday
-                END)
-    ),
-
-    added_services AS (
-        SELECT se1.date as service_date, se1.service_id
-        FROM service_exception se1
-        WHERE
-            se1.date >= start_date AND
-            se1.date <= end_date AND
-            se1.exception_type = 1
-    ),
+-- Departure board of every stop, sorted by stop and departure time.
+-- It includes the trip information needed by departure queries, so that they only need an index range scan.
+CREATE TABLE stop_departure AS (
+    SELECT
+        st.stop_idx,
+        st.departure_time,
+        t.service_idx,
+        t.route_idx,
+        t.direction_id,
+        st.trip_idx,
+        t.trip_headsign
+    FROM
+        stop_time st
+        JOIN trip t ON t.serial = st.trip_idx
+    WHERE st.stop_idx IS NOT NULL
+    ORDER BY st.stop_idx, st.departure_time
+);
 
-    removed_services AS (
-        SELECT se2.date as service_date, se2.service_id
-        FROM service_exception se2
-        WHERE
-            se2.date >= start_date AND
-            se2.date <= end_date AND
-            se2.exception_type = 2
-    )
+CREATE INDEX idx_stop_departure_stop_idx_departure_time ON stop_departure (stop_idx, departure_time) INCLUDE (service_idx, route_idx);
 
-    SELECT * FROM days_and_services
-    UNION (SELECT * FROM added_services)
-    EXCEPT (SELECT * FROM removed_services)
-    ORDER BY service_date, service_id;
-END
-$$;
+ANALYZE stop_departure;
 
 -- Find all the departure times for a given route, stop and date.
-CREATE OR REPLACE FUNCTION departure_times(route_id_input TEXT, stop_id_input TEXT, curr_date DATE)
+-- The amount of results can be limited with max_results.
+CREATE OR REPLACE FUNCTION departure_times(route_id_input TEXT, stop_id_input TEXT, curr_date DATE, max_results INTEGER = NULL)
 RETURNS TABLE (
     service_id TEXT,
     route_id TEXT,
@@ -84,25 +169,28 @@ BEGIN
     RETURN QUERY
 
     -- Step 1: Find all services that are active on the current date.
-    WITH services_today AS (SELECT a.service_id FROM active_services(curr_date) a)
+    WITH services_today AS (SELECT a.service_idx FROM active_service_indices(curr_date) a)
 
-    -- Step 2: Join everything and extract the required information.
+    -- Step 2: Scan the departure board of the stop and extract the required information.
     SELECT
         t.service_id,
-        t.route_id,
+        r.route_id,
         t.trip_id,
         td.name as direction,
-        st.stop_id,
-        st.departure_time
+        s.stop_id,
+        gtfs_time_interval(sd.departure_time) AS departure_time
     FROM
-        stop_time st
-        JOIN trip t ON t.trip_id = st.trip_id
-        JOIN services_today sv ON sv.service_id = t.service_id
-        JOIN travel_direction td ON td.id = t.direction_id
+        stop s
+        JOIN stop_departure sd ON sd.stop_idx = s.serial
+        JOIN route r ON r.serial = sd.route_idx
+        JOIN services_today sv ON sv.service_idx = sd.service_idx
+        JOIN trip t ON t.serial = sd.trip_idx
+        JOIN travel_direction td ON td.id = sd.direction_id
     WHERE
-        t.route_id = route_id_input
-        AND st.stop_id = stop_id_input
-    ORDER BY st.departure_time ASC, direction DESC;
+        r.route_id = route_id_input
+        AND s.stop_id = stop_id_input
+    ORDER BY sd.departure_time ASC, direction DESC
+    LIMIT max_results;
 END
 $$;
 
@@ -110,42 +198,133 @@ $$;
 -- Network inspection and visualization.
 --------------------------------------------------------
 
--- Additional table needed for the next query.
--- Contains pairs (d, s), where d is the dates and s is the services active in those dates.
--- TODO: Optimize this, since it's very slow if a dataset contains few services but in a very long period (e.g. 100 years).
-CREATE TABLE day_service_sets AS (
-    -- Group dates with the same services.
-    SELECT
-        array_agg(DISTINCT service_date ORDER BY service_date) AS service_dates,
-        service_set
-    FROM (
-        -- Group services by date.
-        SELECT
-            ds.service_date,
-            array_agg(DISTINCT ds.service_id ORDER BY ds.service_id) AS service_set
+-- Additional tables needed for the next query.
+-- Contains the distinct sets of services that are active together on some date, and the periods in which each set is active.
+-- Dates are never expanded: the calendar is split into the segments between consecutive service start/end dates and exceptions,
+-- in which the active services only depend on the weekday, so the work is proportional to the amount of services and exceptions.
+CREATE TABLE day_service_set_periods AS (
+    -- Step 1: Find the dates in which the active services may change.
+    WITH boundaries AS (
+        SELECT start_date AS date FROM service
+        UNION DISTINCT
+        SELECT end_date + 1 AS date FROM service
+        UNION DISTINCT
+        SELECT date FROM service_exception
+        UNION DISTINCT
+        SELECT date + 1 AS date FROM service_exception
+    ),
+
+    -- Step 2: Split the calendar into [segment_start, segment_end) segments.
+    --         Every exception gets a single-day segment, and services are active either in a whole segment or not at all.
+    segments AS (
+        SELECT segment_start, segment_end
         FROM (
-            -- Get active services for every day in the service period.
-            WITH dates AS (
-                SELECT start_date as date FROM service
-                UNION DISTINCT
-                SELECT end_date as date FROM service
-                UNION DISTINCT
-                SELECT date FROM service_exception
-            )
+            SELECT date AS segment_start, LEAD(date) OVER (ORDER BY date) AS segment_end
+            FROM boundaries
+        )
+        WHERE segment_end IS NOT NULL
+    ),
 
-            SELECT * FROM active_services(
-                (SELECT min(date) FROM dates),
-                (SELECT max(date) FROM dates)
-            )
-        ) ds
-        GROUP BY ds.service_date
+    -- Step 3: Find the weekdays that occur in each segment (all of them, unless it's shorter than a week).
+    weekday_classes AS (
+        SELECT seg.segment_start, seg.segment_end, wd.dow
+        FROM
+            segments seg
+            CROSS JOIN generate_series(0, 6) AS wd(dow)
+        WHERE seg.segment_start + (wd.dow - extract(dow FROM seg.segment_start)::INTEGER + 7) % 7 < seg.segment_end
+    ),
+
+    -- Step 4: Find the active services of each weekday in each segment.
+    class_services AS (
+        SELECT wc.segment_start, wc.segment_end, wc.dow, s.service_id
+        FROM
+            weekday_classes wc
+            JOIN service s ON
+                s.start_date <= wc.segment_start AND
+                s.end_date >= wc.segment_end - 1 AND
+                -- Make sure the service is running on the day of week.
+                (CASE wc.dow
+                    WHEN 0 THEN sunday
+                    WHEN 1 THEN monday
+                    WHEN 2 THEN tuesday
+                    WHEN 3 THEN wednesday
+                    WHEN 4 THEN thursday
+                    WHEN 5 THEN friday
+                    WHEN 6 THEN saturday
+                END)
+        UNION
+        SELECT wc.segment_start, wc.segment_end, wc.dow, se1.service_id
+        FROM
+            weekday_classes wc
+            JOIN service_exception se1 ON se1.date = wc.segment_start AND se1.exception_type = 1
+        EXCEPT
+        SELECT wc.segment_start, wc.segment_end, wc.dow, se2.service_id
+        FROM
+            weekday_classes wc
+            JOIN service_exception se2 ON se2.date = wc.segment_start AND se2.exception_type = 2
+    ),
+
+    -- Step 5: Group services by weekday and segment.
+    class_sets AS (
+        SELECT
+            cs.segment_start,
+            cs.segment_end,
+            cs.dow,
+            array_agg(DISTINCT sk.serial ORDER BY sk.serial) AS service_set
+        FROM
+            class_services cs
+            JOIN service_key sk ON sk.service_id = cs.service_id
+        GROUP BY cs.segment_start, cs.segment_end, cs.dow
     )
-    GROUP BY service_set
+
+    -- Step 6: Merge the weekdays of a segment with the same services into a single weekday mask.
+    SELECT
+        dense_rank() OVER (ORDER BY cls.service_set)::INTEGER AS set_id,
+        cls.service_set,
+        daterange(cls.segment_start, cls.segment_end) AS period,
+        array_agg(cls.dow ORDER BY cls.dow)::INTEGER[] AS weekdays
+    FROM class_sets cls
+    GROUP BY cls.service_set, cls.segment_start, cls.segment_end
+);
+
+CREATE TABLE day_service_sets AS (
+    SELECT DISTINCT set_id, service_set
+    FROM day_service_set_periods
+    ORDER BY set_id
 );
 
-CREATE INDEX idx_day_sets ON day_service_sets USING GIN (service_dates);
+ALTER TABLE day_service_set_periods DROP COLUMN service_set;
+
+ALTER TABLE day_service_sets
+ADD CONSTRAINT pk_day_service_sets PRIMARY KEY (set_id);
+
+CREATE INDEX idx_day_service_set_periods_period ON day_service_set_periods USING GIST (period);
 CREATE INDEX idx_service_sets ON day_service_sets USING GIN (service_set);
 
+-- Find the service set that is active on the given date (NULL if there are no services).
+CREATE OR REPLACE FUNCTION day_service_set(curr_date DATE)
+RETURNS INTEGER
+LANGUAGE sql STABLE
+AS $$
+    SELECT p.set_id
+    FROM day_service_set_periods p
+    WHERE p.period @> curr_date AND extract(dow FROM curr_date)::INTEGER = ANY(p.weekdays);
+$$;
+
+-- Find the service set that is active on every date of the given range (dates without services are skipped).
+-- NOTE: Used by the date range queries, which compute their results once per service set.
+CREATE OR REPLACE FUNCTION day_service_sets_in_range(start_date DATE, end_date DATE)
+RETURNS TABLE(service_date DATE, set_id INTEGER)
+LANGUAGE sql STABLE
+AS $$
+    SELECT d::date AS service_date, p.set_id
+    FROM
+        generate_series(start_date, end_date, interval '1 day') d
+        JOIN day_service_set_periods p ON
+            p.period @> d::date AND
+            extract(dow FROM d)::INTEGER = ANY(p.weekdays);
+$$;
+
 -- Get the amount of trips, routes and stops in the network every day.
 CREATE OR REPLACE FUNCTION daily_status(start_date DATE, end_date DATE)
 RETURNS TABLE(
@@ -156,30 +335,36 @@ RETURNS TABLE(
 )
 LANGUAGE plpgsql
 AS $$
-DECLARE
-    days date[];
 BEGIN
-    days := ARRAY(SELECT generate_series(start_date, end_date, interval '1 day')::date);
-
     RETURN QUERY
-    WITH results AS (
+
+    -- Step 1: Find the service set of every day in the range.
+    WITH day_sets AS (
+        SELECT d.service_date AS day, d.set_id
+        FROM day_service_sets_in_range(start_date, end_date) d
+    ),
+
+    -- Step 2: Calculate the results once per service set (every date with the same services has the same results).
+    set_stats AS (
         SELECT
-            UNNEST(dss.service_dates) AS service_date,
-            COUNT(DISTINCT t.trip_id) AS total_trips,
-            COUNT(DISTINCT r.route_id) AS active_routes,
-            COUNT(DISTINCT st.stop_id) AS active_stops
+            dss.set_id,
+            COUNT(DISTINCT t.serial) AS total_trips,
+            COUNT(DISTINCT t.route_idx) AS active_routes,
+            COUNT(DISTINCT st.stop_idx) AS active_stops
         FROM
             day_service_sets dss
-            JOIN trip t ON ARRAY[t.service_id] <@ dss.service_set
-            JOIN route r ON r.route_id = t.route_id
-            JOIN stop_time st ON st.trip_id = t.trip_id
+            JOIN trip t ON ARRAY[t.service_idx] <@ dss.service_set
+            JOIN stop_time st ON st.trip_idx = t.serial
         WHERE
-            dss.service_dates && days
-        GROUP BY dss.service_dates
-        ORDER BY service_date
+            dss.set_id IN (SELECT ds.set_id FROM day_sets ds)
+        GROUP BY dss.set_id
     )
 
-    SELECT * FROM results r WHERE r.service_date BETWEEN start_date AND end_date;
+    SELECT ds.day, ss.total_trips, ss.active_routes, ss.active_stops
+    FROM
+        day_sets ds
+        JOIN set_stats ss ON ss.set_id = ds.set_id
+    ORDER BY ds.day;
 END
 $$;
 
@@ -199,29 +384,29 @@ BEGIN
     RETURN QUERY
 
     -- Step 1: Find all services that are active on the current date.
-    WITH services_today AS (SELECT service_id FROM active_services(curr_date)),
+    WITH services_today AS (SELECT a.service_idx FROM active_service_indices(curr_date) a),
 
     -- Step 2: Map stops to routes that serve them today.
     stops_and_routes AS (
-        SELECT DISTINCT st.stop_id, t.route_id
+        SELECT DISTINCT st.stop_idx, t.route_idx
         FROM
             stop_time st
-            JOIN trip t ON st.trip_id = t.trip_id
-            JOIN services_today s ON t.service_id = s.service_id
+            JOIN trip t ON st.trip_idx = t.serial
+            JOIN services_today s ON t.service_idx = s.service_idx
     ),
 
     -- Step 2: Aggregate departures per stop.
     stop_departure_stats AS (
         SELECT
-            st.stop_id,
+            st.stop_idx,
             COUNT(*)::INTEGER AS total_departures,
-            MIN(st.departure_time) AS first_departure,
-            MAX(st.departure_time) AS last_departure
+            gtfs_time_interval(MIN(st.departure_time)) AS first_departure,
+            gtfs_time_interval(MAX(st.departure_time)) AS last_departure
         FROM
             stop_time st
-            JOIN trip t ON st.trip_id = t.trip_id
-            JOIN services_today s ON t.service_id = s.service_id
-        GROUP BY st.stop_id
+            JOIN trip t ON st.trip_idx = t.serial
+            JOIN services_today s ON t.service_idx = s.service_idx
+        GROUP BY st.stop_idx
     ),
 
     -- Step 3: Combine stops with their route info and departure stats.
@@ -235,9 +420,9 @@ BEGIN
             sds.last_departure
         FROM
             stops_and_routes sar
-            JOIN stop s ON s.stop_id = sar.stop_id
-            JOIN route r ON r.route_id = sar.route_id
-            JOIN stop_departure_stats sds ON sds.stop_id = sar.stop_id
+            JOIN stop s ON s.serial = sar.stop_idx
+            JOIN route r ON r.serial = sar.route_idx
+            JOIN stop_departure_stats sds ON sds.stop_idx = sar.stop_idx
         GROUP BY s.stop_id, s.stop_name, sds.total_departures, sds.first_departure, sds.last_departure
     )
 
@@ -256,6 +441,129 @@ BEGIN
 END
 $$;
 
+-- Get the most important stops for every date of the given range.
+CREATE OR REPLACE FUNCTION top_stops(start_date DATE, end_date DATE)
+RETURNS TABLE(
+  service_date DATE,
+  stop_name TEXT,
+  route_count INTEGER,
+  routes TEXT[],
+  total_departures BIGINT,
+  first_departure INTERVAL,
+  last_departure INTERVAL
+)
+LANGUAGE plpgsql AS $$
+BEGIN
+    RETURN QUERY
+
+    -- Step 1: Find the service set of every day in the range.
+    WITH day_sets AS (
+        SELECT d.service_date, d.set_id
+        FROM day_service_sets_in_range(start_date, end_date) d
+    ),
+
+    -- Step 2: Calculate the results once per service set, using any of its dates
+    --         (every date with the same services has the same results).
+    set_results AS (
+        SELECT sd.set_id, ts.*
+        FROM
+            (SELECT ds.set_id, MIN(ds.service_date) AS set_date FROM day_sets ds GROUP BY ds.set_id) sd
+            CROSS JOIN LATERAL top_stops(sd.set_date) ts
+    )
+
+    SELECT ds.service_date, sr.stop_name, sr.route_count, sr.routes, sr.total_departures, sr.first_departure, sr.last_departure
+    FROM
+        day_sets ds
+        JOIN set_results sr ON sr.set_id = ds.set_id
+    ORDER BY ds.service_date, sr.total_departures DESC, sr.first_departure ASC, sr.last_departure DESC, sr.stop_name ASC;
+END
+$$;
+
+
+-- Segments between consecutive stops of every trip, computed once for all the queries that need them.
+-- NOTE: Consecutive stops are found by ordering, since stop sequences may have gaps.
+CREATE TABLE trip_segment AS (
+    SELECT
+        trip_idx,
+        segment_idx,
+        from_stop_idx,
+        to_stop_idx,
+        departure_time,
+        arrival_time
+    FROM (
+        SELECT
+            trip_idx,
+            (ROW_NUMBER() OVER trip_window - 1)::INTEGER AS segment_idx,
+            stop_idx AS from_stop_idx,
+            LEAD(stop_idx) OVER trip_window AS to_stop_idx,
+            departure_time,
+            LEAD(arrival_time) OVER trip_window AS arrival_time
+        FROM stop_time
+        WHERE stop_idx IS NOT NULL
+        WINDOW trip_window AS (PARTITION BY trip_idx ORDER BY stop_sequence)
+    )
+    -- Exclude the last stop of each trip, which has no 'next' stop.
+    WHERE to_stop_idx IS NOT NULL
+    ORDER BY trip_idx, segment_idx
+);
+
+ALTER TABLE trip_segment
+ADD CONSTRAINT pk_trip_segment PRIMARY KEY (trip_idx, segment_idx);
+
+ANALYZE trip_segment;
+
+-- Additional table needed for the next queries.
+-- Contains a summary of every trip, so that queries don't need to scan all of its stop times.
+-- NOTE: The first and last stops are found by stop_sequence, since it may not start at 1.
+CREATE TABLE trip_summary AS (
+    WITH trip_bounds AS (
+        SELECT DISTINCT ON (trip_idx)
+            trip_idx,
+            FIRST_VALUE(stop_idx) OVER trip_window AS first_stop_idx,
+            LAST_VALUE(stop_idx) OVER trip_window AS last_stop_idx,
+            FIRST_VALUE(departure_time) OVER trip_window AS start_time,
+            LAST_VALUE(arrival_time) OVER trip_window AS end_time,
+            COUNT(*) OVER trip_window AS stop_count
+        FROM stop_time
+        WINDOW trip_window AS (
+            PARTITION BY trip_idx
+            ORDER BY stop_sequence
+            ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+        )
+        ORDER BY trip_idx, stop_sequence
+    )
+
+    SELECT
+        t.serial AS trip_idx,
+        t.route_idx,
+        t.service_idx,
+        t.direction_id,
+        tb.first_stop_idx,
+        tb.last_stop_idx,
+        tb.start_time,
+        tb.end_time,
+        gtfs_time_seconds(tb.end_time) - gtfs_time_seconds(tb.start_time) AS duration_seconds,
+        tb.stop_count::INTEGER AS stop_count,
+        sh.length_meters AS shape_length_meters,
+        -- Seconds in which the trip is running, to find the active trips at a given time with an index.
+        CASE WHEN gtfs_time_seconds(tb.start_time) <= gtfs_time_seconds(tb.end_time)
+            THEN int4range(gtfs_time_seconds(tb.start_time), gtfs_time_seconds(tb.end_time), '[]')
+        END AS active_span
+    FROM
+        trip t
+        JOIN trip_bounds tb ON tb.trip_idx = t.serial
+        LEFT JOIN shape sh ON sh.shape_id = t.shape_id
+    ORDER BY t.serial
+);
+
+ALTER TABLE trip_summary
+ADD CONSTRAINT pk_trip_summary PRIMARY KEY (trip_idx);
+
+CREATE INDEX idx_trip_summary_service_idx ON trip_summary (service_idx);
+CREATE INDEX idx_trip_summary_active_span ON trip_summary USING GIST (service_idx, active_span);
+CREATE INDEX idx_trip_summary_route_idx ON trip_summary (route_idx);
+
+ANALYZE trip_summary;
 
 -- Generate a histogram of trip start times for a given date.
 CREATE OR REPLACE FUNCTION trip_start_time_distribution(curr_date DATE, bucket_size_min INT)
@@ -266,33 +574,73 @@ BEGIN
     RETURN QUERY
 
     -- Step 1: Find all services that are active on the current date.
-    WITH services_today AS (SELECT service_id FROM active_services(curr_date)),
-
-    -- Step 2: Find the exact start time for every trip in the system.
-    -- We could use stop_sequence = 1, but that may cause problems if a trip starts with stop_sequence = 0.
-    trip_start_times AS (
-        SELECT DISTINCT ON (trip_id)
-            trip_id,
-            departure_time AS start_time
-        FROM stop_time
-        ORDER BY trip_id, stop_sequence ASC
-    )
+    WITH services_today AS (SELECT a.service_idx FROM active_service_indices(curr_date) a)
 
-    -- Final step: Join, filter, bucket, and count the trip departures.
+    -- Final step: Filter, bucket, and count the trip departures.
     SELECT
         -- Generate the time buckets and count the amount of trips in each one.
-        (FLOOR(EXTRACT(EPOCH FROM tst.start_time) / (bucket_size_min * 60)) * (bucket_size_min * interval '1 minute')) AS time_bucket,
+        (FLOOR(gtfs_time_seconds(ts.start_time) / (bucket_size_min * 60)) * (bucket_size_min * interval '1 minute')) AS time_bucket,
         COUNT(*) AS trips_starting
-    FROM trip AS t
+    FROM trip_summary AS ts
          -- Join to filter for only trips running on our given date.
-         JOIN services_today AS s ON t.service_id = s.service_id
-         -- Join to get the pre-calculated start time for each trip.
-         JOIN trip_start_times AS tst ON t.trip_id = tst.trip_id
+         JOIN services_today AS s ON ts.service_idx = s.service_idx
     GROUP BY time_bucket
     ORDER BY time_bucket;
 END
 $$;
 
+-- Generate a histogram of trip start times for every date of the given range.
+CREATE OR REPLACE FUNCTION trip_start_time_distribution(start_date DATE, end_date DATE, bucket_size_min INT)
+RETURNS TABLE(service_date DATE, time_bucket INTERVAL, trip_count BIGINT)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+
+    -- Step 1: Find the service set of every day in the range.
+    WITH day_sets AS (
+        SELECT d.service_date, d.set_id
+        FROM day_service_sets_in_range(start_date, end_date) d
+    ),
+
+    -- Step 2: Calculate the results once per service set, using any of its dates
+    --         (every date with the same services has the same results).
+    set_results AS (
+        SELECT sd.set_id, tstd.*
+        FROM
+            (SELECT ds.set_id, MIN(ds.service_date) AS set_date FROM day_sets ds GROUP BY ds.set_id) sd
+            CROSS JOIN LATERAL trip_start_time_distribution(sd.set_date, bucket_size_min) tstd
+    )
+
+    SELECT ds.service_date, sr.time_bucket, sr.trip_count
+    FROM
+        day_sets ds
+        JOIN set_results sr ON sr.set_id = ds.set_id
+    ORDER BY ds.service_date, sr.time_bucket;
+END
+$$;
+
+
+-- Additional table needed for the next query.
+-- Contains the sorted departures (in seconds) of every route, direction and stop, for each service set.
+-- Headways of a date can be obtained from the arrays of its service set, without sorting its stop times.
+CREATE TABLE route_stop_departures AS (
+    SELECT
+        dss.set_id,
+        sd.route_idx,
+        sd.direction_id,
+        sd.stop_idx,
+        array_agg(gtfs_time_seconds(sd.departure_time) ORDER BY sd.departure_time) AS departures
+    FROM
+        day_service_sets dss
+        JOIN stop_departure sd ON sd.service_idx = ANY(dss.service_set)
+    WHERE sd.departure_time IS NOT NULL
+    GROUP BY dss.set_id, sd.route_idx, sd.direction_id, sd.stop_idx
+);
+
+CREATE INDEX idx_route_stop_departures_set_id ON route_stop_departures (set_id, route_idx);
+
+ANALYZE route_stop_departures;
 
 -- Generate headway statistics for all routes on a given date.
 -- NOTE: This query is intended for datasets *without* frequencies.txt.
@@ -310,40 +658,32 @@ AS $$
 BEGIN
     RETURN QUERY
 
-    -- Step 1: Find all services that are active on the current date.
-    WITH services_today AS (SELECT service_id FROM active_services(curr_date)),
-
-    -- Step 2: Find all distinct (route, stop) pairs for trips running today.
-    --         After that, calculate headways for each stop time.
-    stop_headways AS (
+    -- Step 1: Take the departures of every (route, direction, stop) for the service set of the current date.
+    --         After that, calculate headways as the differences between consecutive departures.
+    WITH stop_headways AS (
         SELECT
-            t.route_id,
-            st.stop_id,
-            t.direction_id,
-            LEAD(st.departure_time) OVER (
-                PARTITION BY t.route_id, t.direction_id, st.stop_id
-                ORDER BY st.departure_time
-            ) - st.departure_time AS headway
+            rsd.route_idx,
+            rsd.departures[i + 1] - rsd.departures[i] AS headway_secs
         FROM
-            trip t
-            JOIN services_today sv ON sv.service_id = t.service_id
-            JOIN stop_time st ON st.trip_id = t.trip_id
+            route_stop_departures rsd
+            CROSS JOIN LATERAL generate_series(1, cardinality(rsd.departures) - 1) AS i
+        WHERE rsd.set_id = day_service_set(curr_date)
     ),
 
-    -- Step 3: Aggregate headways per route.
+    -- Step 2: Aggregate headways per route.
     route_agg AS (
         SELECT
-            sh.route_id,
-            make_interval(secs => ROUND(PERCENTILE_CONT(0.05) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM sh.headway)))) AS min_headway,
-            make_interval(secs => ROUND(PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM sh.headway)))) AS median_headway,
-            make_interval(secs => ROUND(PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM sh.headway)))) AS max_headway,
+            sh.route_idx,
+            make_interval(secs => ROUND(PERCENTILE_CONT(0.05) WITHIN GROUP (ORDER BY sh.headway_secs))) AS min_headway,
+            make_interval(secs => ROUND(PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY sh.headway_secs))) AS median_headway,
+            make_interval(secs => ROUND(PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY sh.headway_secs))) AS max_headway,
             -- The coalesce is meant to deal with cases in which there is a single headway (STDDEV_SAMP returns NULL).
-            COALESCE(STDDEV_SAMP(EXTRACT(EPOCH FROM sh.headway)), 0.0) AS stddev_secs
+            COALESCE(STDDEV_SAMP(sh.headway_secs), 0.0) AS stddev_secs
         FROM stop_headways sh
-        GROUP BY sh.route_id
+        GROUP BY sh.route_idx
     )
 
-    -- Step 4: Return results.
+    -- Step 3: Return results.
     SELECT
         COALESCE(r.route_short_name, r.route_long_name) AS route_name,
         a.min_headway,
@@ -352,7 +692,7 @@ BEGIN
         ROUND(a.stddev_secs) AS stddev_seconds
     FROM
         route r
-        LEFT JOIN route_agg a USING (route_id)
+        LEFT JOIN route_agg a ON a.route_idx = r.serial
     WHERE
         a.min_headway IS NOT NULL
         AND a.median_headway IS NOT NULL
@@ -361,6 +701,44 @@ BEGIN
 END;
 $$;
 
+-- Generate headway statistics for all routes on every date of the given range.
+CREATE OR REPLACE FUNCTION headway_stats(start_date DATE, end_date DATE)
+RETURNS TABLE (
+    service_date DATE,
+    route_name TEXT,
+    min_headway INTERVAL,
+    median_headway INTERVAL,
+    max_headway INTERVAL,
+    stddev_seconds NUMERIC
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+
+    -- Step 1: Find the service set of every day in the range.
+    WITH day_sets AS (
+        SELECT d.service_date, d.set_id
+        FROM day_service_sets_in_range(start_date, end_date) d
+    ),
+
+    -- Step 2: Calculate the results once per service set, using any of its dates
+    --         (every date with the same services has the same results).
+    set_results AS (
+        SELECT sd.set_id, hs.*
+        FROM
+            (SELECT ds.set_id, MIN(ds.service_date) AS set_date FROM day_sets ds GROUP BY ds.set_id) sd
+            CROSS JOIN LATERAL headway_stats(sd.set_date) hs
+    )
+
+    SELECT ds.service_date, sr.route_name, sr.min_headway, sr.median_headway, sr.max_headway, sr.stddev_seconds
+    FROM
+        day_sets ds
+        JOIN set_results sr ON sr.set_id = ds.set_id
+    ORDER BY ds.service_date, sr.route_name, sr.min_headway, sr.median_headway, sr.max_headway, sr.stddev_seconds;
+END;
+$$;
+
 
 --------------------------------------------------------
 -- Network analysis and optimization.
@@ -368,60 +746,44 @@ $$;
 
 
 -- Get a ranking of the routes linked by average speed (considering the average of all of their trips).
-CREATE OR REPLACE FUNCTION routes_by_speed()
+CREATE OR REPLACE FUNCTION routes_by_speed(force_recompute BOOLEAN = FALSE)
 RETURNS TABLE(route_name TEXT, trip_count BIGINT, avg_speed_kmh NUMERIC(5, 2), route_geom GEOMETRY, route_color CHAR(6))
 LANGUAGE plpgsql
 AS $$
 BEGIN
-    RETURN QUERY
-
-    -- Step 1: Calculate the length of each shape in meters using PostGIS.
-    --         Use sphere instead of spheroid (false) to match Neo4J results.
-    WITH shape_lengths AS (
-        SELECT shape_id, shape_geom, ST_LENGTH(shape_geom::geography, false) AS length_meters
-        FROM shape
-    ),
+    -- Serve the results materialized during the import, if any.
+    IF NOT force_recompute AND has_query_snapshot('routes_by_speed') THEN
+        RETURN QUERY
+        SELECT s.route_name, s.trip_count, s.avg_speed_kmh, s.route_geom, s.route_color
+        FROM routes_by_speed_snapshot s
+        ORDER BY s.ordinality;
+        RETURN;
+    END IF;
 
-    -- Step 2: Calculate the scheduled duration of each trip in seconds.
-    trip_durations AS (
-        SELECT DISTINCT
-            trip_id,
-            EXTRACT(
-                EPOCH FROM (
-                    LAST_VALUE(arrival_time::interval) OVER trip_window -
-                    FIRST_VALUE(departure_time::interval) OVER trip_window
-                )
-            ) AS duration_seconds
-        FROM stop_time
-        WINDOW trip_window AS (
-            PARTITION BY trip_id
-            ORDER BY stop_sequence
-            ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
-        )
-    )
+    RETURN QUERY
 
-    -- Final step: Join the data, calculate speed for each trip, and average it by route.
+    -- Join the data, calculate speed for each trip, and average it by route.
+    -- Shape lengths and trip durations are taken from the trip summary.
     SELECT
         COALESCE(r.route_short_name, r.route_long_name) AS route_name,
-        COUNT(DISTINCT t.trip_id) AS trip_count,
+        COUNT(DISTINCT ts.trip_idx) AS trip_count,
         -- Calculate the average speed and convert it to kilometers per hour (m/s * 3.6).
-        AVG((sl.length_meters / td.duration_seconds) * 3.6)::numeric(5, 2) AS avg_speed_kmh,
+        AVG((ts.shape_length_meters / ts.duration_seconds) * 3.6)::numeric(5, 2) AS avg_speed_kmh,
         -- All shapes should be very similar, so just take one of them.
-        (ARRAY_AGG(sl.shape_geom))[1] AS shape_geom,
+        (ARRAY_AGG(sh.shape_geom))[1] AS shape_geom,
         r.route_color AS route_color
     FROM
         route AS r
-        JOIN trip AS t ON r.route_id = t.route_id
-        JOIN shape_lengths AS sl ON t.shape_id = sl.shape_id
-        JOIN trip_durations AS td ON t.trip_id = td.trip_id
-    WHERE td.duration_seconds > 0                               -- Avoid any division-by-zero errors.
+        JOIN trip_summary AS ts ON r.serial = ts.route_idx
+        JOIN trip AS t ON ts.trip_idx = t.serial
+        JOIN shape AS sh ON t.shape_id = sh.shape_id
+    WHERE ts.duration_seconds > 0                               -- Avoid any division-by-zero errors.
     GROUP BY r.route_id, r.route_short_name, r.route_long_name
     ORDER BY avg_speed_kmh DESC, route_name;
 END
 $$;
 
 -- Find the most important routes at a given time of day, according to their frequency and number of active trips.
--- TODO: Optimize this. There is no need for trip_times to be calculated for every trip, just the active ones.
 CREATE OR REPLACE FUNCTION routes_by_relevance(curr_date DATE, curr_time INTERVAL)
 RETURNS TABLE(route_name TEXT, active_trip_count BIGINT, avg_frequency INTERVAL, route_geom GEOMETRY)
 LANGUAGE plpgsql
@@ -430,105 +792,167 @@ BEGIN
     RETURN QUERY
 
     -- Step 1: Find all services that are active on the current date.
-    WITH services_today AS (SELECT service_id FROM active_services(curr_date)),
-
-    -- Step 2: Calculate the start and end time for every trip in the system.
-    trip_times AS (
-        SELECT DISTINCT
-            trip_id,
-            FIRST_VALUE(departure_time::interval) OVER trip_window AS start_time,
-            LAST_VALUE(arrival_time::interval) OVER trip_window AS end_time
-        FROM stop_time
-        WINDOW trip_window AS (
-            PARTITION BY trip_id
-            ORDER BY stop_sequence
-            ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
-        )
+    WITH services_today AS (SELECT a.service_idx FROM active_service_indices(curr_date) a),
+
+    -- Step 2: Find the trips that are running at the given time, using their start and end times.
+    active_trips AS (
+        SELECT ts.trip_idx, ts.route_idx, ts.start_time
+        FROM trip_summary AS ts
+             JOIN services_today AS s ON ts.service_idx = s.service_idx
+        WHERE ts.active_span @> gtfs_time_seconds(curr_time)
     ),
 
     -- Step 3: Calculate the average frequency for each route.
     avg_frequencies AS (
         SELECT
-            route_id,
+            route_idx,
             -- Calculate the average of all headways.
-            AVG(next_trip_start_time - start_time) AS avg_headway
+            AVG(gtfs_time_interval(next_trip_start_time) - gtfs_time_interval(start_time)) AS avg_headway
         FROM (
             -- Subquery to find the start time of the 'next' trip on the same route.
             SELECT
-                t.route_id,
-                tt.start_time,
-                LEAD(tt.start_time, 1) OVER (PARTITION BY t.route_id ORDER BY tt.start_time) AS next_trip_start_time
-            FROM trip AS t
-                 JOIN services_today AS s ON t.service_id = s.service_id
-                 JOIN trip_times AS tt ON t.trip_id = tt.trip_id
-            WHERE curr_time BETWEEN tt.start_time AND tt.end_time
+                act.route_idx,
+                act.start_time,
+                LEAD(act.start_time, 1) OVER (PARTITION BY act.route_idx ORDER BY act.start_time) AS next_trip_start_time
+            FROM active_trips AS act
         ) AS trip_sequences
         -- Exclude the last trip of the day for each route, which has no 'next' trip.
         WHERE next_trip_start_time IS NOT NULL
-        GROUP BY route_id
+        GROUP BY route_idx
     ),
 
     -- Step 4: Get a representative shape for each route.
     route_shapes AS (
-        SELECT DISTINCT ON (t.route_id)
-            t.route_id,
+        SELECT DISTINCT ON (t.route_idx)
+            t.route_idx,
             s.shape_geom
         FROM trip AS t
         JOIN shape AS s ON t.shape_id = s.shape_id
         -- It doesn't matter which shape we get, so we just take the first one.
-        ORDER BY t.route_id
+        ORDER BY t.route_idx
     )
 
-    -- Final step: Join everything, filter for active trips, and count them per route.
+    -- Final step: Join everything and count the active trips per route.
     SELECT
         COALESCE(r.route_short_name, r.route_long_name) AS route_name,
-        COUNT(t.trip_id) AS active_trip_count,
+        COUNT(act.trip_idx) AS active_trip_count,
         DATE_TRUNC('second', h.avg_headway) AS avg_frequency,
         rs.shape_geom AS route_geom
     FROM route AS r
-         JOIN trip AS t ON r.route_id = t.route_id
-         JOIN services_today AS s ON t.service_id = s.service_id
-         JOIN trip_times AS tt ON t.trip_id = tt.trip_id
+         JOIN active_trips AS act ON r.serial = act.route_idx
          -- Use a LEFT JOIN in case a route has only one trip today (no headway to calculate).
-         LEFT JOIN avg_frequencies h ON r.route_id = h.route_id
+         LEFT JOIN avg_frequencies h ON r.serial = h.route_idx
          -- Use a LEFT JOIN to ensure we still get routes even if they don't have a shape.
-         LEFT JOIN route_shapes rs ON r.route_id = rs.route_id
-    WHERE curr_time BETWEEN tt.start_time AND tt.end_time
+         LEFT JOIN route_shapes rs ON r.serial = rs.route_idx
     GROUP BY r.route_id, r.route_short_name, r.route_long_name, h.avg_headway, rs.shape_geom
     ORDER BY active_trip_count DESC, avg_frequency ASC, route_name ASC;
 END
 $$;
 
--- Determine which segments of the network are covered by the most routes, which might be a sign of redundant planning.
-CREATE OR REPLACE FUNCTION overlapping_segments()
-RETURNS TABLE(from_stop TEXT, to_stop TEXT, route_count BIGINT, routes TEXT[])
+-- Find the vehicles that are running at a given date and time, and estimate their positions.
+-- Positions are interpolated between the last stop that the vehicle departed from and the next one.
+CREATE OR REPLACE FUNCTION active_vehicles(curr_date DATE, curr_time INTERVAL)
+RETURNS TABLE(
+    trip_id TEXT,
+    route_name TEXT,
+    destination TEXT,
+    previous_stop TEXT,
+    next_stop TEXT,
+    vehicle_geom GEOMETRY(Point, 4326)
+)
 LANGUAGE plpgsql
 AS $$
 BEGIN
     RETURN QUERY
 
-    -- Step 1: Create a complete list of all directed segments.
-    -- A segment is the connection between one stop and the very next stop on a trip.
-    -- We use the LEAD() window function to find the 'next' stop_id efficiently.
-    WITH trip_segments AS (
-        SELECT
-            trip_id,
-            stop_id AS from_stop_id,
-            LEAD(stop_id, 1) OVER (PARTITION BY trip_id ORDER BY stop_sequence) AS to_stop_id
-        FROM stop_time
+    -- Step 1: Find all services that are active on the current date.
+    WITH services_today AS (SELECT a.service_idx FROM active_service_indices(curr_date) a),
+
+    -- Step 2: Find the trips that are running at the given time.
+    active_trips AS (
+        SELECT ts.trip_idx
+        FROM trip_summary AS ts
+             JOIN services_today AS s ON ts.service_idx = s.service_idx
+        WHERE ts.active_span @> gtfs_time_seconds(curr_time)
     ),
 
-    -- Step 2: Link each segment to its route_id.
+    -- Step 3: Find the last departure and the next arrival of each trip.
+    vehicle_stops AS (
+        SELECT
+            act.trip_idx,
+            prev.stop_idx AS previous_stop_idx,
+            nxt.stop_idx AS next_stop_idx,
+            -- Fraction of the way between both stops that has been covered.
+            CASE WHEN gtfs_time_seconds(nxt.arrival_time) > gtfs_time_seconds(prev.departure_time) THEN
+                LEAST(1.0, GREATEST(0.0,
+                    (gtfs_time_seconds(curr_time) - gtfs_time_seconds(prev.departure_time))::FLOAT /
+                    (gtfs_time_seconds(nxt.arrival_time) - gtfs_time_seconds(prev.departure_time))
+                ))
+            ELSE 0.0
+            END AS fraction
+        FROM active_trips AS act
+            CROSS JOIN LATERAL (
+                SELECT st.stop_idx, st.stop_sequence, st.departure_time
+                FROM stop_time st
+                WHERE st.trip_idx = act.trip_idx AND st.departure_time <= to_gtfs_time(curr_time)
+                ORDER BY st.stop_sequence DESC
+                LIMIT 1
+            ) AS prev
+            LEFT JOIN LATERAL (
+                SELECT st.stop_idx, st.arrival_time
+                FROM stop_time st
+                WHERE st.trip_idx = act.trip_idx AND st.stop_sequence > prev.stop_sequence AND st.arrival_time IS NOT NULL
+                ORDER BY st.stop_sequence ASC
+                LIMIT 1
+            ) AS nxt ON true
+    )
+
+    -- Final step: Add the trip and stop information.
+    SELECT
+        t.trip_id,
+        COALESCE(r.route_short_name, r.route_long_name) AS route_name,
+        t.trip_headsign AS destination,
+        ps.stop_name AS previous_stop,
+        ns.stop_name AS next_stop,
+        CASE WHEN ns.location IS NULL THEN ps.location
+            ELSE ST_LineInterpolatePoint(ST_MakeLine(ps.location, ns.location), vs.fraction)
+        END AS vehicle_geom
+    FROM vehicle_stops AS vs
+         JOIN trip AS t ON t.serial = vs.trip_idx
+         JOIN route AS r ON r.serial = t.route_idx
+         LEFT JOIN stop AS ps ON ps.serial = vs.previous_stop_idx
+         LEFT JOIN stop AS ns ON ns.serial = vs.next_stop_idx
+    ORDER BY route_name, t.trip_id;
+END
+$$;
+
+-- Determine which segments of the network are covered by the most routes, which might be a sign of redundant planning.
+CREATE OR REPLACE FUNCTION overlapping_segments(force_recompute BOOLEAN = FALSE)
+RETURNS TABLE(from_stop TEXT, to_stop TEXT, route_count BIGINT, routes TEXT[])
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Serve the results materialized during the import, if any.
+    IF NOT force_recompute AND has_query_snapshot('overlapping_segments') THEN
+        RETURN QUERY
+        SELECT s.from_stop, s.to_stop, s.route_count, s.routes
+        FROM overlapping_segments_snapshot s
+        ORDER BY s.ordinality;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+
+    -- Step 1: Link each segment to its route.
     -- This de-duplicates the data so we only have one entry per route for each segment,
     -- regardless of how many trips that route makes along that segment.
-    segment_routes AS (
+    WITH segment_routes AS (
         SELECT DISTINCT
-            ts.from_stop_id,
-            ts.to_stop_id,
-            t.route_id
-        FROM trip_segments AS ts
-            JOIN trip AS t ON ts.trip_id = t.trip_id
-        WHERE ts.to_stop_id IS NOT NULL -- Exclude the last stop of each trip, which has no 'next' stop.
+            ts.from_stop_idx,
+            ts.to_stop_idx,
+            t.route_idx
+        FROM trip_segment AS ts
+            JOIN trip AS t ON ts.trip_idx = t.serial
     )
 
     -- Final step: Group the segments and count the distinct routes.
@@ -536,47 +960,52 @@ BEGIN
     SELECT
         s1.stop_name AS from_stop,
         s2.stop_name AS to_stop,
-        COUNT(sr.route_id) AS route_count,
+        COUNT(sr.route_idx) AS route_count,
         -- Collect the short names of all overlapping routes into a sorted array.
         array_agg(r.route_short_name ORDER BY r.route_short_name) AS routes
     FROM segment_routes AS sr
          -- Join to the stops table twice to get the names for the start and end of the segment.
-         JOIN stop AS s1 ON sr.from_stop_id = s1.stop_id
-         JOIN stop AS s2 ON sr.to_stop_id = s2.stop_id
+         JOIN stop AS s1 ON sr.from_stop_idx = s1.serial
+         JOIN stop AS s2 ON sr.to_stop_idx = s2.serial
          -- Join to the routes table to get the route names for the array.
-         JOIN route AS r ON sr.route_id = r.route_id
-    GROUP BY sr.from_stop_id, sr.to_stop_id, s1.stop_name, s2.stop_name
+         JOIN route AS r ON sr.route_idx = r.serial
+    GROUP BY sr.from_stop_idx, sr.to_stop_idx, s1.stop_name, s2.stop_name
     -- Order the results to show the most heavily overlapped segments first.
     ORDER BY route_count DESC, from_stop, to_stop;
 END
 $$;
 
--- Divide the network into hexagons and count the stops in each one.
-CREATE OR REPLACE FUNCTION stop_density_heatmap(grid_size_meters INT)
-RETURNS TABLE(
-    stop_count BIGINT,
-    hexagon_geom GEOMETRY(Polygon, 4326)
-)
-LANGUAGE plpgsql
+-- Find the best SRID for a meter-based projection (UTM) of the network, using the centroid of all stops.
+-- This makes the functions that use it portable to any city in the world.
+CREATE OR REPLACE FUNCTION network_utm_srid()
+RETURNS INTEGER
+LANGUAGE sql STABLE
 AS $$
-DECLARE
-    -- Dynamically determine the best SRID for a meter-based projection (UTM).
-    utm_srid INTEGER;
-BEGIN
-    -- Step 1: Find the centroid of all stops to determine the correct UTM zone.
-    -- This makes the function portable to any city in the world.
     SELECT
         -- Formula for UTM Zone SRID: 32600 + zone number for Northern Hemisphere, 32700 for Southern.
-        CASE
+        (CASE
             WHEN ST_Y(centroid) > 0 THEN 32600
             ELSE 32700
-        END + floor((ST_X(centroid) + 180) / 6) + 1
-    INTO utm_srid
+        END + floor((ST_X(centroid) + 180) / 6) + 1)::INTEGER
     FROM (
         SELECT ST_Centroid(ST_Collect(location)) AS centroid FROM stop
     ) AS s;
+$$;
 
-    -- Step 2: Main query using the dynamically found SRID.
+-- Compute the hexagons that contain stops, along with their stop count, for a given grid size.
+-- Only non-empty hexagons are returned.
+-- NOTE: Hexagons are generated around each stop instead of covering the whole network, which would mostly
+--       produce empty cells. Grids are aligned to the origin, so the (i, j) coordinates identify each cell.
+CREATE OR REPLACE FUNCTION compute_stop_density(grid_size_meters INT)
+RETURNS TABLE(
+    stop_count BIGINT,
+    hexagon_geom GEOMETRY(Polygon, 4326)
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    utm_srid INTEGER := network_utm_srid();
+BEGIN
     RETURN QUERY
     -- We will do all our work in the projected, meter-based system.
     WITH projected_stops AS (
@@ -584,36 +1013,84 @@ BEGIN
         FROM stop
     ),
 
-    -- Step 3: Define the grid bounds in the projected system.
-    bounds AS (
-        SELECT ST_Expand(ST_Collect(geom), grid_size_meters) AS geom
-        FROM projected_stops
-    ),
-
-    -- Step 4: Generate the hexagon grid in meters.
-    hexagons AS (
-        SELECT h.geom
-        FROM bounds, ST_HexagonGrid(grid_size_meters, bounds.geom) AS h
+    -- Step 1: Find the hexagons of each stop (more than one if it lies on their border).
+    stop_cells AS (
+        SELECT h.i, h.j
+        FROM
+            projected_stops ps
+            CROSS JOIN LATERAL ST_HexagonGrid(grid_size_meters, ps.geom) AS h
+        WHERE ST_Intersects(ps.geom, h.geom)
     )
 
-    -- Final step: Count stops in each hexagon and transform the grid back to lat/lon.
+    -- Final step: Count stops in each hexagon and transform it back to lat/lon.
     SELECT
-        COUNT(ps.geom) AS stop_count,
+        COUNT(*) AS stop_count,
         -- Transform the result back to 4326 for easy mapping in tools like QGIS.
-        ST_Transform(h.geom, 4326)::GEOMETRY(Polygon, 4326) AS hexagon_geom
-    FROM
-        hexagons h
-        LEFT JOIN projected_stops ps ON ST_Intersects(ps.geom, h.geom)
+        ST_Transform(ST_SetSRID(ST_Hexagon(grid_size_meters, sc.i, sc.j), utm_srid), 4326)::GEOMETRY(Polygon, 4326) AS hexagon_geom
+    FROM stop_cells sc
     GROUP BY
-        h.geom
+        sc.i, sc.j
     ORDER BY
         stop_count DESC;
 END;
 $$;
 
+-- Stop density of the network at several resolutions, so that heatmaps don't need to compute it.
+CREATE TABLE stop_density_grid (
+    grid_size_meters INT,
+    stop_count BIGINT,
+    hexagon_geom GEOMETRY(Polygon, 4326)
+);
+
+CREATE INDEX idx_stop_density_grid_grid_size_meters ON stop_density_grid (grid_size_meters, stop_count DESC);
+
+-- (Re)compute the stop density for the given grid sizes.
+-- NOTE: It should be called again if stops are modified.
+CREATE OR REPLACE PROCEDURE refresh_stop_density_grid(grid_sizes INT[] = ARRAY[250, 500, 1000, 2000, 4000])
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM stop_density_grid;
+
+    INSERT INTO stop_density_grid
+    SELECT g.size, d.stop_count, d.hexagon_geom
+    FROM
+        unnest(grid_sizes) AS g(size)
+        CROSS JOIN LATERAL compute_stop_density(g.size) AS d;
+
+    ANALYZE stop_density_grid;
+END;
+$$;
+
+CALL refresh_stop_density_grid();
+
+-- Divide the network into hexagons and count the stops in each one.
+-- Precomputed grid sizes are read from stop_density_grid, and any other size is computed on the fly.
+CREATE OR REPLACE FUNCTION stop_density_heatmap(grid_size_meters INT)
+RETURNS TABLE(
+    stop_count BIGINT,
+    hexagon_geom GEOMETRY(Polygon, 4326)
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM stop_density_grid g WHERE g.grid_size_meters = stop_density_heatmap.grid_size_meters) THEN
+        RETURN QUERY
+        SELECT g.stop_count, g.hexagon_geom
+        FROM stop_density_grid g
+        WHERE g.grid_size_meters = stop_density_heatmap.grid_size_meters
+        ORDER BY g.stop_count DESC;
+    ELSE
+        RETURN QUERY
+        SELECT d.stop_count, d.hexagon_geom
+        FROM compute_stop_density(grid_size_meters) d;
+    END IF;
+END;
+$$;
+
 -- Determine how direct each route is, which can suggest redundant planning (too straight) or inefficiencies (too curvy).
 -- TODO: Implement this in Neo4J.
-CREATE OR REPLACE FUNCTION route_straightness()
+CREATE OR REPLACE FUNCTION route_straightness(force_recompute BOOLEAN = FALSE)
 RETURNS TABLE(
     route_name TEXT,
     straightness_index NUMERIC(3, 2),
@@ -624,32 +1101,28 @@ RETURNS TABLE(
 LANGUAGE plpgsql
 AS $$
 BEGIN
+    -- Serve the results materialized during the import, if any.
+    IF NOT force_recompute AND has_query_snapshot('route_straightness') THEN
+        RETURN QUERY
+        SELECT s.route_name, s.straightness_index, s.route_length_km, s.direct_distance_km, s.route_geom
+        FROM route_straightness_snapshot s
+        ORDER BY s.ordinality;
+        RETURN;
+    END IF;
+
     RETURN QUERY
 
-    -- Step 1: Get a single, representative shape for each route and its geometry.
-    WITH route_shapes AS (
+    -- Step 1: Get a single, representative shape for each route, along with its path length and direct distance.
+    --         Both distances are calculated during the import of shapes.
+    WITH shape_calcs AS (
         SELECT DISTINCT ON (t.route_id)
             t.route_id,
+            s.geodesic_length_meters AS path_length_meters,
+            s.geodesic_endpoints_distance_meters AS direct_dist_meters,
             s.shape_geom
         FROM trip t
         JOIN shape s ON t.shape_id = s.shape_id
         ORDER BY t.route_id -- It doesn't matter which shape we get.
-    ),
-
-    -- Step 2: Calculate path length and direct distance for each shape.
-    shape_calcs AS (
-        SELECT
-            rs.route_id,
-            -- Calculate the actual path length in meters.
-            ST_Length(rs.shape_geom::geography, true) AS path_length_meters,
-            -- Calculate the straight-line distance between start and end.
-            ST_Distance(
-                ST_StartPoint(rs.shape_geom)::geography,
-                ST_EndPoint(rs.shape_geom)::geography,
-                true
-            ) AS direct_dist_meters,
-            rs.shape_geom
-        FROM route_shapes rs
     )
 
     -- Final step: Join, calculate the index, and format for output.
@@ -670,6 +1143,44 @@ BEGIN
 END;
 $$;
 
+-- (Re)compute the snapshots of the parameterless queries and tag them with the loaded dataset.
+-- WITH ORDINALITY keeps the position of each row, so that snapshots are served in the original order.
+-- NOTE: It should be called again if the data is modified.
+CREATE OR REPLACE PROCEDURE refresh_query_snapshots()
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM query_snapshot;
+
+    DROP TABLE IF EXISTS overlapping_segments_snapshot;
+    CREATE TABLE overlapping_segments_snapshot AS
+    SELECT * FROM overlapping_segments(force_recompute => TRUE) WITH ORDINALITY;
+
+    DROP TABLE IF EXISTS routes_by_speed_snapshot;
+    CREATE TABLE routes_by_speed_snapshot AS
+    SELECT * FROM routes_by_speed(force_recompute => TRUE) WITH ORDINALITY;
+
+    DROP TABLE IF EXISTS route_straightness_snapshot;
+    CREATE TABLE route_straightness_snapshot AS
+    SELECT * FROM route_straightness(force_recompute => TRUE) WITH ORDINALITY;
+
+    INSERT INTO query_snapshot (query_name, dataset_fingerprint)
+    SELECT q.query_name, di.fingerprint
+    FROM
+        unnest(ARRAY['overlapping_segments', 'routes_by_speed', 'route_straightness']) AS q(query_name)
+        CROSS JOIN dataset_info di;
+END;
+$$;
+
+-- Snapshots are optional (see 'import.py --snapshots'), since they hide the cost of these queries.
+DO $$
+BEGIN
+    IF :'query_snapshots'::BOOLEAN THEN
+        CALL refresh_query_snapshots();
+    END IF;
+END
+$$;
+
 
 --------------------------------------------------------
 -- User-oriented queries.
@@ -705,8 +1216,91 @@ BEGIN
 END
 $$;
 
+
+-- Locate stops within a given distance of many points at once.
+-- The i-th origin is given by the i-th element of each array, and results are tagged
+-- with its zero-based index so that callers can map them back to their inputs.
+CREATE OR REPLACE FUNCTION stops_within_distance_batch(origin_lats FLOAT[], origin_lons FLOAT[], seek_dists FLOAT[])
+RETURNS TABLE(origin_index INTEGER, id TEXT, name TEXT, lat FLOAT, lon FLOAT, distance NUMERIC(8, 0), geom GEOMETRY(Point, 4326))
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF cardinality(origin_lats) <> cardinality(origin_lons) OR cardinality(origin_lats) <> cardinality(seek_dists) THEN
+        RAISE EXCEPTION 'Origin latitudes, longitudes and distances must have the same length: %, %, %',
+            cardinality(origin_lats), cardinality(origin_lons), cardinality(seek_dists);
+    END IF;
+
+    RETURN QUERY
+    WITH user_locations AS (
+        SELECT
+            (o.ord - 1)::INTEGER AS origin_index,
+            ST_SetSRID(ST_MakePoint(o.origin_lon, o.origin_lat), 4326)::geography AS point,
+            o.seek_dist
+        FROM unnest(origin_lats, origin_lons, seek_dists) WITH ORDINALITY AS o(origin_lat, origin_lon, seek_dist, ord)
+    )
+    SELECT
+        ul.origin_index,
+        s.stop_id,
+        s.stop_name,
+        ST_Y(s.location) AS lat,
+        ST_X(s.location) AS lon,
+        -- Use sphere instead of spheroid (false) to match Neo4J results.
+        m.exact_distance::NUMERIC(8, 0) AS distance,
+        s.location AS geom
+    FROM user_locations ul
+    -- Each origin probes the geography GiST index on its own.
+    CROSS JOIN LATERAL (
+        SELECT stp.stop_id, stp.stop_name, stp.location
+        FROM stop stp
+        WHERE ST_DWithin(stp.location::geography, ul.point, ul.seek_dist, false)
+    ) s
+    CROSS JOIN LATERAL (SELECT ST_Distance(s.location::geography, ul.point, false) AS exact_distance) m
+    -- Order by distance *before* rounding.
+    ORDER BY ul.origin_index, m.exact_distance, s.stop_name;
+END
+$$;
+
+
+-- Locate the k stops closest to a certain point, up to a maximum distance.
+-- NOTE: The KNN operator (<->) walks the geography GiST index in distance order,
+--       so only the first k candidates (and any ties with the last one) are read instead of every stop in range.
+CREATE OR REPLACE FUNCTION nearest_stops(origin_lat FLOAT, origin_lon FLOAT, k INTEGER, max_dist FLOAT)
+RETURNS TABLE(id TEXT, name TEXT, lat FLOAT, lon FLOAT, distance NUMERIC(8, 0), geom GEOMETRY(Point, 4326))
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    WITH
+    user_location AS (SELECT ST_SetSRID(ST_MakePoint(origin_lon, origin_lat), 4326)::geography AS point),
+    candidates AS (
+        SELECT
+            s.stop_id,
+            s.stop_name,
+            s.location,
+            -- Use sphere instead of spheroid (false) to match Neo4J results.
+            ST_Distance(s.location::geography, ul.point, false) AS exact_distance
+        FROM stop s, user_location ul
+        WHERE ST_DWithin(s.location::geography, ul.point, max_dist, false)
+        -- Ties are broken by name as in Neo4J, since stations and their platforms often share coordinates.
+        ORDER BY s.location::geography <-> ul.point, s.stop_name
+        LIMIT k
+    )
+    SELECT
+        c.stop_id,
+        c.stop_name,
+        ST_Y(c.location) AS lat,
+        ST_X(c.location) AS lon,
+        c.exact_distance::NUMERIC(8, 0) AS distance,
+        c.location AS geom
+    FROM candidates c
+    -- Order by distance *before* rounding.
+    ORDER BY c.exact_distance, c.stop_name;
+END
+$$;
+
 -- Get the next departures for a given stop, date and time.
-CREATE OR REPLACE FUNCTION next_departures(stop_id TEXT, curr_date DATE, curr_time INTERVAL)
+-- The amount of results can be limited with max_results, as departure boards usually do.
+CREATE OR REPLACE FUNCTION next_departures(stop_id TEXT, curr_date DATE, curr_time INTERVAL, max_results INTEGER = NULL)
 RETURNS TABLE(route TEXT, destination TEXT, "time" INTERVAL)
 LANGUAGE plpgsql
 AS $$
@@ -714,16 +1308,19 @@ BEGIN
     RETURN QUERY
     SELECT
         COALESCE(r.route_short_name, r.route_long_name) AS route,
-        t.trip_headsign AS destination,
-        ((EXTRACT(EPOCH FROM st.departure_time) % 86400) * '1 second'::INTERVAL) AS "time"  -- Periods get converted to <24:00.
-    FROM stop_time st
-        JOIN trip t ON st.trip_id = t.trip_id
-        JOIN route r ON t.route_id = r.route_id
+        sd.trip_headsign AS destination,
+        ((gtfs_time_seconds(sd.departure_time) % 86400) * '1 second'::INTERVAL) AS "time"  -- Periods get converted to <24:00.
+    FROM stop s
+        JOIN stop_departure sd ON sd.stop_idx = s.serial
+        JOIN route r ON sd.route_idx = r.serial
     WHERE
-        st.stop_id = next_departures.stop_id AND
-        t.service_id IN (SELECT active_services(next_departures.curr_date)) AND
-        st.departure_time >= next_departures.curr_time
-    ORDER BY st.departure_time, destination;
+        s.stop_id = next_departures.stop_id AND
+        sd.service_idx IN (
+            SELECT a.service_idx FROM active_service_indices(next_departures.curr_date) a
+        ) AND
+        sd.departure_time >= to_gtfs_time(next_departures.curr_time)
+    ORDER BY sd.departure_time, destination
+    LIMIT next_departures.max_results;
 END
 $$;
 
@@ -735,51 +1332,48 @@ $$;
 
 
 -- Materialized connection view for the CSA.
--- TODO: Fix this so that it doesn't depend on stop_sequence - 1 (it's not mandatory according to the GTFS spec)
+-- Only integer keys are stored, text ids can be found through the trip and stop tables.
 CREATE MATERIALIZED VIEW connections AS
 SELECT
-    t.trip_id,
-    t.service_id,
-    st1.stop_id AS departure_stop_id,
-    st2.stop_id AS arrival_stop_id,
-    st1.departure_time,
-    st2.arrival_time,
-    s1.serial AS departure_stop_idx,
-    s2.serial AS arrival_stop_idx
+    ts.trip_idx,
+    t.service_idx,
+    ts.departure_time,
+    ts.arrival_time,
+    ts.from_stop_idx AS departure_stop_idx,
+    ts.to_stop_idx AS arrival_stop_idx
 FROM
-    stop_time st1
-    JOIN stop_time st2 ON st1.trip_id = st2.trip_id AND st1.stop_sequence = st2.stop_sequence - 1
-    JOIN stop s1 ON st1.stop_id = s1.stop_id
-    JOIN stop s2 ON st2.stop_id = s2.stop_id
-    JOIN trip t ON st1.trip_id = t.trip_id
+    trip_segment ts
+    JOIN trip t ON ts.trip_idx = t.serial
 ORDER BY
-    st1.departure_time;
+    ts.departure_time;
 
-CREATE INDEX idx_connections_service_id ON connections (service_id);
+CREATE INDEX idx_connections_service_idx ON connections (service_idx);
 CREATE INDEX idx_connections_departure_time ON connections (departure_time);
 
 ANALYZE connections;
 
--- Materialized view for the neighbors of each stop.
-CREATE MATERIALIZED VIEW neighbor_stops AS (
+-- Connections of every service set, so that a reachability query streams the connections of its date
+-- already filtered and sorted, instead of joining all of them with the active services and sorting the result.
+-- Connections are repeated in each set that contains their service, trading space for query time.
+-- Rows are inserted in index order, so the table is already clustered by set and departure time.
+CREATE TABLE service_set_connections AS (
     SELECT
-        s1.serial AS stop_idx_1,
-        s2.serial AS stop_idx_2,
-        ST_Distance(s1.location::geography, s2.location::geography, false) AS distance_meters
+        dss.set_id,
+        c.departure_time,
+        c.arrival_time,
+        c.trip_idx,
+        c.departure_stop_idx,
+        c.arrival_stop_idx
     FROM
-        stop s1, stop s2
-    WHERE
-        s1.stop_id <> s2.stop_id                                                        -- Prevent self-pairs (A,A).
-        AND ST_DWithin(s1.location::geography, s2.location::geography, 1000, false)     -- We consider a maximum of 1000 meters.
-    ORDER BY
-        s1.serial,
-        s2.serial
+        day_service_sets dss
+        CROSS JOIN LATERAL unnest(dss.service_set) AS ss(service_idx)
+        JOIN connections c ON c.service_idx = ss.service_idx
+    ORDER BY dss.set_id, c.departure_time
 );
 
-CREATE INDEX idx_neighbor_stops_stop_idx_1 ON neighbor_stops USING BTREE (stop_idx_1);
-CREATE INDEX idx_neighbor_stops_distance_meters ON neighbor_stops USING BTREE (distance_meters);
+CREATE INDEX idx_service_set_connections_set_id ON service_set_connections (set_id, departure_time);
 
-ANALYZE neighbor_stops;
+ANALYZE service_set_connections;
 
 -- Multiple types to store as much information as possible in local variables.
 CREATE TYPE NEIGHBOR_ENTRY AS (
@@ -800,10 +1394,191 @@ CREATE TYPE TRANSFER_TABLE AS (
     val TRANSFER_ENTRY[]
 );
 
+-- Footpaths between stops: walks within a radius, GTFS transfers and pathways, merged into a single set of edges.
+-- Optionally, it also contains their transitive closure, so that chains of footpaths can be taken as a single one.
+CREATE TABLE footpath (
+    from_stop_idx INTEGER,
+    to_stop_idx INTEGER,
+    kind TEXT,                  -- 'walk', 'transfer', 'pathway' or 'transitive'.
+    distance_meters FLOAT,      -- Only for walks, so that queries can limit their walking distance and speed.
+    duration_secs INTEGER,
+    CONSTRAINT pk_footpath PRIMARY KEY (from_stop_idx, to_stop_idx, kind)
+);
+
+-- Adjacency lists of every stop, built from the footpaths so that each reachability query only has to read them.
+-- Neighbors (walks) are sorted by distance and transfers (any other footpath) by time, so the closest ones always come first.
+-- Every stop gets a row (even with empty arrays), which keeps them aligned with the serial when aggregated.
+CREATE TABLE stop_adjacency (
+    stop_idx INTEGER,
+    neighbors NEIGHBOR_ENTRY[],
+    transfers TRANSFER_ENTRY[],
+    CONSTRAINT pk_stop_adjacency PRIMARY KEY (stop_idx)
+);
+
+-- Size of the footpath graph, per kind of footpath.
+-- Useful to choose the radius in dense networks, where the amount of walks grows quadratically with it.
+CREATE OR REPLACE FUNCTION footpath_stats()
+RETURNS TABLE(
+    kind TEXT,
+    edge_count BIGINT,
+    edges_per_stop NUMERIC,
+    avg_duration_secs NUMERIC
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        fp.kind,
+        COUNT(*) AS edge_count,
+        ROUND(COUNT(*)::NUMERIC / (SELECT COUNT(*) FROM stop), 2) AS edges_per_stop,
+        ROUND(AVG(fp.duration_secs), 1) AS avg_duration_secs
+    FROM footpath fp
+    GROUP BY fp.kind
+    ORDER BY fp.kind;
+$$;
+
+-- Disk size of the footpath graph, including the adjacency lists and their indexes.
+CREATE OR REPLACE FUNCTION footpath_size()
+RETURNS BIGINT
+LANGUAGE sql STABLE
+AS $$
+    SELECT pg_total_relation_size('footpath') + pg_total_relation_size('stop_adjacency');
+$$;
+
+-- (Re)build the footpaths and the adjacency lists of the stops.
+-- Walking durations are computed with the given speed, although queries still use their own radius and speed for walks.
+-- The transitive closure only chains transfers and pathways (e.g. through the generic nodes of a station), whose times
+-- don't depend on the query, so walks are still expanded by each query with its own limits. It is also limited to
+-- the time needed to walk the radius, which keeps it close to the size of the direct footpaths.
+-- NOTE: It should be called again if stops, transfers or pathways are modified.
+CREATE OR REPLACE PROCEDURE build_footpaths(
+    radius_meters NUMERIC = 1000,
+    walking_speed_mps NUMERIC = 1.4,
+    transitive BOOLEAN = false
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    max_duration_secs INTEGER := FLOOR(radius_meters / walking_speed_mps);
+    added_count BIGINT;
+BEGIN
+    DELETE FROM footpath;
+
+    -- Walks to every stop within the radius.
+    INSERT INTO footpath
+    SELECT
+        s1.serial,
+        s2.serial,
+        'walk',
+        ST_Distance(s1.location::geography, s2.location::geography, false),
+        CEIL(ST_Distance(s1.location::geography, s2.location::geography, false) / walking_speed_mps)
+    FROM
+        stop s1, stop s2
+    WHERE
+        s1.stop_id <> s2.stop_id                                                                -- Prevent self-pairs (A,A).
+        AND ST_DWithin(s1.location::geography, s2.location::geography, radius_meters, false);
+
+    -- Transfers with a known time. Transfers that are not possible (type 3) are left out.
+    INSERT INTO footpath
+    SELECT f.serial, t.serial, 'transfer', NULL, MIN(tr.min_transfer_time)
+    FROM
+        "transfer" tr
+        JOIN stop f ON tr.from_stop_id = f.stop_id
+        JOIN stop t ON tr.to_stop_id = t.stop_id
+    WHERE
+        tr.min_transfer_time IS NOT NULL
+        AND (tr.transfer_type IS NULL OR tr.transfer_type <> 3)
+    GROUP BY f.serial, t.serial;
+
+    -- Pathways, in both directions when they are bidirectional.
+    -- Their time is estimated from their length if the traversal time is missing.
+    INSERT INTO footpath
+    SELECT e.from_stop_idx, e.to_stop_idx, 'pathway', NULL, MIN(e.duration_secs)
+    FROM (
+        SELECT f.serial AS from_stop_idx, t.serial AS to_stop_idx, pw.is_bidirectional,
+               COALESCE(pw.traversal_time, CEIL(pw.length / walking_speed_mps))::INTEGER AS duration_secs
+        FROM
+            pathway pw
+            JOIN stop f ON pw.from_stop_id = f.stop_id
+            JOIN stop t ON pw.to_stop_id = t.stop_id
+    ) p
+    CROSS JOIN LATERAL (
+        VALUES (p.from_stop_idx, p.to_stop_idx, p.duration_secs), (p.to_stop_idx, p.from_stop_idx, p.duration_secs)
+    ) AS e(from_stop_idx, to_stop_idx, duration_secs)
+    WHERE
+        e.duration_secs IS NOT NULL
+        AND e.from_stop_idx <> e.to_stop_idx
+        AND (p.is_bidirectional OR e.from_stop_idx = p.from_stop_idx)
+    GROUP BY e.from_stop_idx, e.to_stop_idx;
+
+    -- Add chains of transfers and pathways until none of them improves the fastest one between two stops.
+    -- Every iteration doubles the length of the chains that are considered.
+    -- NOTE: Walks are left out, since a chain would fix the radius and speed of its walks for every query.
+    IF transitive THEN
+        LOOP
+            WITH fastest AS (
+                SELECT fp.from_stop_idx, fp.to_stop_idx, MIN(fp.duration_secs) AS duration_secs
+                FROM footpath fp
+                WHERE fp.kind <> 'walk'
+                GROUP BY fp.from_stop_idx, fp.to_stop_idx
+            ),
+            chains AS (
+                SELECT a.from_stop_idx, b.to_stop_idx, MIN(a.duration_secs + b.duration_secs) AS duration_secs
+                FROM
+                    fastest a
+                    JOIN fastest b ON a.to_stop_idx = b.from_stop_idx
+                WHERE
+                    a.from_stop_idx <> b.to_stop_idx
+                    AND a.duration_secs + b.duration_secs <= max_duration_secs
+                GROUP BY a.from_stop_idx, b.to_stop_idx
+            )
+            INSERT INTO footpath
+            SELECT c.from_stop_idx, c.to_stop_idx, 'transitive', NULL, c.duration_secs
+            FROM
+                chains c
+                LEFT JOIN fastest f ON c.from_stop_idx = f.from_stop_idx AND c.to_stop_idx = f.to_stop_idx
+            WHERE f.duration_secs IS NULL OR c.duration_secs < f.duration_secs
+            ON CONFLICT (from_stop_idx, to_stop_idx, kind) DO UPDATE SET duration_secs = EXCLUDED.duration_secs;
+
+            GET DIAGNOSTICS added_count = ROW_COUNT;
+            EXIT WHEN added_count = 0;
+        END LOOP;
+    END IF;
+
+    ANALYZE footpath;
+
+    -- Compile the footpaths into the adjacency lists read by the CSA.
+    DELETE FROM stop_adjacency;
+
+    INSERT INTO stop_adjacency
+    SELECT
+        s.serial,
+        COALESCE(
+            (SELECT array_agg(ROW(fp.to_stop_idx, fp.distance_meters)::NEIGHBOR_ENTRY ORDER BY fp.distance_meters ASC)
+             FROM footpath fp
+             WHERE fp.from_stop_idx = s.serial AND fp.kind = 'walk'),
+            ARRAY[]::NEIGHBOR_ENTRY[]
+        ),
+        COALESCE(
+            (SELECT array_agg(ROW(fp.to_stop_idx, fp.duration_secs)::TRANSFER_ENTRY ORDER BY fp.duration_secs ASC)
+             FROM footpath fp
+             WHERE fp.from_stop_idx = s.serial AND fp.kind <> 'walk'),
+            ARRAY[]::TRANSFER_ENTRY[]
+        )
+    FROM stop s
+    ORDER BY s.serial;
+
+    ANALYZE stop_adjacency;
+
+    RAISE NOTICE 'Built % footpaths (%, including the adjacency lists).', (SELECT COUNT(*) FROM footpath), pg_size_pretty(footpath_size());
+END;
+$$;
+
+CALL build_footpaths(:'footpath_radius', :'walking_speed', :'transitive_footpaths');
+
 CREATE TYPE REACHABILITY_RESULT AS (
     earliest_arrival_time INTERVAL,
     previous_stop_id INTEGER,
-    trip_id_used TEXT
+    trip_idx_used INTEGER       -- trip(serial), or one of the special values for walks and transfers.
 );
 
 -- Function that finds the minimum time required to reach each stop from a given origin stop.
@@ -826,12 +1601,17 @@ RETURNS TABLE(
 LANGUAGE plpgsql
 AS $$
 DECLARE
+    walk_trip_idx CONSTANT INTEGER := -1;
+    transfer_trip_idx CONSTANT INTEGER := -2;
     idx INTEGER;
     results REACHABILITY_RESULT[];
     neighbors NEIGHBOR_TABLE[];
     transfers TRANSFER_TABLE[];
     conn RECORD;
-    conf_stop RECORD;
+    conn_departure_time INTERVAL;
+    conn_arrival_time INTERVAL;
+    conf_stop_idx INTEGER;
+    conf_arrival_time INTERVAL;
     nei NEIGHBOR_ENTRY;
     transfer TRANSFER_ENTRY;
     last_scanned_departure_time INTERVAL;
@@ -839,74 +1619,43 @@ DECLARE
     new_arrival_via_walk INTERVAL;
     stop_count INTEGER;
     confirmed_stop_count INTEGER;
+    -- Binary min-heap (by arrival time) of stops whose arrival time improved but is not confirmed yet.
+    -- Entries are never updated in place: outdated ones are pushed again and skipped when popped.
+    heap_stop_idx INTEGER[];
+    heap_arrival_time INTERVAL[];
+    heap_size INTEGER;
+    heap_pos INTEGER;
+    heap_child INTEGER;
+    confirmed BOOLEAN[];
+    improved_stops INTEGER[];
+    confirmed_stops INTEGER[];
+    confirmed_times INTERVAL[];
 BEGIN
     -- Step 1: Initialize data structures.
     -- Array containing results that gets built as the algorithm progresses.
-    SELECT array_agg(('infinity'::INTERVAL, NULL::TEXT, NULL::TEXT)::REACHABILITY_RESULT)
+    SELECT array_agg(('infinity'::INTERVAL, NULL::INTEGER, NULL::INTEGER)::REACHABILITY_RESULT)
     INTO results
     FROM "stop" s;
 
-    -- Temporary table that is used for range queries (to determine stops whose optimal path has been already found).
-    CREATE TEMP TABLE pqueue (
-        stop_idx INTEGER,
-        arrival_time INTERVAL
-    ) ON COMMIT DROP;
-
-    INSERT INTO pqueue
-    SELECT s.serial, 'infinity'::INTERVAL
-    FROM "stop" s;
-
-    CREATE UNIQUE INDEX idx_pqueue_stop_idx ON pqueue USING BTREE (stop_idx);
-    CREATE INDEX idx_pqueue_arrival_time ON pqueue USING BTREE (arrival_time);
-
     -- Counters to stop the algorithm early if possible.
     stop_count := (SELECT CARDINALITY(results));
     confirmed_stop_count := 0;
+    confirmed := array_fill(false, ARRAY[stop_count]);
 
-    -- We get neighbors and transfers in a single query to prevent multiple ones when the results get "confirmed".
-    neighbors := (
-        WITH filtered_neighbors AS (
-            SELECT
-                s.serial AS stop_idx_1,
-                ROW(
-                    COALESCE(
-                        array_agg(ROW(ns.stop_idx_2, ns.distance_meters)::NEIGHBOR_ENTRY ORDER BY ns.distance_meters ASC) FILTER (WHERE ns.stop_idx_2 IS NOT NULL AND ns.distance_meters <= max_distance_walked_meters),
-                        ARRAY[]::NEIGHBOR_ENTRY[]
-                    )
-                )::NEIGHBOR_TABLE AS arr
-            FROM stop s
-                 LEFT JOIN neighbor_stops ns ON s.serial = ns.stop_idx_1
-            GROUP BY s.serial
-            ORDER BY s.serial
-        )
-        SELECT array_agg(fn.arr ORDER BY fn.stop_idx_1)
-        FROM filtered_neighbors fn
-    );
-    transfers := (
-        WITH grouped_transfers AS (
-            SELECT
-                f.serial,
-                ROW(
-                    COALESCE(
-                        array_agg(ROW(t.serial, min_transfer_time)::TRANSFER_ENTRY ORDER BY min_transfer_time ASC) FILTER (WHERE t.serial IS NOT NULL AND min_transfer_time IS NOT NULL),
-                        ARRAY[]::TRANSFER_ENTRY[]
-                    )
-                )::TRANSFER_TABLE AS arr
-            FROM stop f
-                 LEFT JOIN "transfer" tr ON tr.from_stop_id = f.stop_id
-                 LEFT JOIN stop t ON tr.to_stop_id = t.stop_id
-            WHERE tr.transfer_type IS NULL OR tr.transfer_type <> 3
-            GROUP BY f.serial
-            ORDER BY f.serial
-        )
-        SELECT array_agg(gt.arr ORDER BY serial)
-        FROM grouped_transfers gt
-    );
+    -- Neighbors and transfers are read in a single query to prevent multiple ones when the results get "confirmed".
+    SELECT
+        array_agg(ROW(sa.neighbors)::NEIGHBOR_TABLE ORDER BY sa.stop_idx),
+        array_agg(ROW(sa.transfers)::TRANSFER_TABLE ORDER BY sa.stop_idx)
+    INTO neighbors, transfers
+    FROM stop_adjacency sa;
 
     -- Set the starting condition for the origin stop
     idx := (SELECT serial FROM stop s WHERE s.stop_id = origin_stop_id);
     results[idx].earliest_arrival_time := departure_time;
-    UPDATE pqueue SET arrival_time = departure_time WHERE stop_idx = idx;
+    improved_stops := ARRAY[idx];
+    heap_stop_idx := ARRAY[]::INTEGER[];
+    heap_arrival_time := ARRAY[]::INTERVAL[];
+    heap_size := 0;
 
     -- No results have been confirmed yet.
     last_scanned_departure_time := '-infinity'::INTERVAL;
@@ -914,73 +1663,134 @@ BEGIN
     -- Step 2: Main loop through chronologically sorted connections
     <<outer>>
     FOR conn IN
-        WITH services_today AS (SELECT * FROM active_services(departure_date))
-        SELECT *
-        FROM connections c
-            JOIN services_today s ON c.service_id = s.service_id
-        WHERE c.departure_time >= earliest_arrivals.departure_time
+        -- The connections of the service set of the date come sorted from the index, so there's no join or sort.
+        -- Times are selected in their storage format (and converted below), so that the planner can merge them
+        -- with the sentinel following the (set_id, departure_time) index, instead of sorting them on every call.
+        SELECT
+            c.trip_idx,
+            c.departure_time,
+            c.arrival_time,
+            c.departure_stop_idx,
+            c.arrival_stop_idx
+        FROM service_set_connections c
+        WHERE c.set_id = day_service_set(departure_date)
+          AND c.departure_time >= to_gtfs_time(earliest_arrivals.departure_time)
         -- This guarantees all nodes with an earliest_arrival_time greater than any departure time
         -- have their walking and transfer paths expanded.
-        UNION
-        SELECT NULL, NULL, NULL, NULL, 'infinity'::INTERVAL, NULL, NULL, NULL, NULL
+        UNION ALL
+        SELECT NULL, to_gtfs_time('infinity'::INTERVAL), NULL, NULL, NULL
         ORDER BY departure_time ASC
     LOOP
+        -- The sentinel is the only row without a trip, and it keeps an infinite departure time in both formats.
+        conn_departure_time := CASE WHEN conn.trip_idx IS NULL THEN 'infinity'::INTERVAL ELSE gtfs_time_interval(conn.departure_time) END;
+        conn_arrival_time := gtfs_time_interval(conn.arrival_time);
+
         -- Earliest arrival times are "confirmed" when they become <= the current connection's departure time.
         -- When that happens, we must scan their stops' transfers and walking paths as soon as possible.
-        IF last_scanned_departure_time < conn.departure_time THEN
+        IF last_scanned_departure_time < conn_departure_time THEN
 
-            FOR conf_stop IN
-                -- Remove the stops from the queue after processing them.
-                DELETE FROM pqueue pq WHERE pq.arrival_time <= conn.departure_time RETURNING *
+            -- Push the stops improved since the last scan into the heap (sift-up).
+            FOREACH idx IN ARRAY improved_stops
             LOOP
+                CONTINUE WHEN confirmed[idx];
+                heap_size := heap_size + 1;
+                heap_pos := heap_size;
+                WHILE heap_pos > 1 AND heap_arrival_time[heap_pos / 2] > results[idx].earliest_arrival_time LOOP
+                    heap_stop_idx[heap_pos] := heap_stop_idx[heap_pos / 2];
+                    heap_arrival_time[heap_pos] := heap_arrival_time[heap_pos / 2];
+                    heap_pos := heap_pos / 2;
+                END LOOP;
+                heap_stop_idx[heap_pos] := idx;
+                heap_arrival_time[heap_pos] := results[idx].earliest_arrival_time;
+            END LOOP;
+            improved_stops := ARRAY[]::INTEGER[];
+
+            -- Pop every stop that can be confirmed at this time (sift-down), skipping outdated entries.
+            -- They are expanded afterwards, so improvements found meanwhile wait until the next scan.
+            confirmed_stops := ARRAY[]::INTEGER[];
+            confirmed_times := ARRAY[]::INTERVAL[];
+            WHILE heap_size > 0 AND heap_arrival_time[1] <= conn_departure_time LOOP
+                conf_stop_idx := heap_stop_idx[1];
+                conf_arrival_time := heap_arrival_time[1];
+                idx := heap_stop_idx[heap_size];
+                heap_size := heap_size - 1;
+                heap_pos := 1;
+                LOOP
+                    heap_child := 2 * heap_pos;
+                    EXIT WHEN heap_child > heap_size;
+                    IF heap_child < heap_size AND heap_arrival_time[heap_child + 1] < heap_arrival_time[heap_child] THEN
+                        heap_child := heap_child + 1;
+                    END IF;
+                    EXIT WHEN heap_arrival_time[heap_size + 1] <= heap_arrival_time[heap_child];
+                    heap_stop_idx[heap_pos] := heap_stop_idx[heap_child];
+                    heap_arrival_time[heap_pos] := heap_arrival_time[heap_child];
+                    heap_pos := heap_child;
+                END LOOP;
+                heap_stop_idx[heap_pos] := idx;
+                heap_arrival_time[heap_pos] := heap_arrival_time[heap_size + 1];
+
+                CONTINUE WHEN confirmed[conf_stop_idx] OR conf_arrival_time > results[conf_stop_idx].earliest_arrival_time;
+                confirmed[conf_stop_idx] := true;
+                confirmed_stops := confirmed_stops || conf_stop_idx;
+                confirmed_times := confirmed_times || conf_arrival_time;
+            END LOOP;
+
+            FOR i IN 1 .. COALESCE(array_length(confirmed_stops, 1), 0)
+            LOOP
+                conf_stop_idx := confirmed_stops[i];
+                conf_arrival_time := confirmed_times[i];
+
                 -- If all earliest arrival times have been found, stop the algorithm.
                 -- Also stop it when there is a specific destination and it has been reached.
                 confirmed_stop_count := confirmed_stop_count + 1;
-                EXIT outer WHEN confirmed_stop_count = stop_count OR (destination_stop_serial IS NOT NULL AND conf_stop.stop_idx = destination_stop_serial);
+                EXIT outer WHEN confirmed_stop_count = stop_count OR (destination_stop_serial IS NOT NULL AND conf_stop_idx = destination_stop_serial);
 
                 -- Iterate over nearby stops and see if any of them lead to an earlier arrival time.
-                FOREACH nei IN ARRAY neighbors[conf_stop.stop_idx].val
+                -- They are sorted by distance, so we can stop at the first one that is too far away.
+                FOREACH nei IN ARRAY neighbors[conf_stop_idx].val
                 LOOP
+                    EXIT WHEN nei.distance_meters > max_distance_walked_meters;
+
                     -- Calculate arrival time at the neighbor stop.
-                    new_arrival_via_walk := conf_stop.arrival_time + (nei.distance_meters / walking_speed_mps) * interval '1 second';
+                    new_arrival_via_walk := conf_arrival_time + (nei.distance_meters / walking_speed_mps) * interval '1 second';
 
                     -- If the walk offers a better arrival time, update the arrival time and record the path as a walk.
                     IF results[nei.stop_idx_2].earliest_arrival_time IS NULL OR new_arrival_via_walk < results[nei.stop_idx_2].earliest_arrival_time THEN
-                        results[nei.stop_idx_2] = (new_arrival_via_walk, conf_stop.stop_idx, 'Walk');
-                        UPDATE pqueue SET arrival_time = new_arrival_via_walk WHERE stop_idx = nei.stop_idx_2;
+                        results[nei.stop_idx_2] = (new_arrival_via_walk, conf_stop_idx, walk_trip_idx);
+                        improved_stops := improved_stops || nei.stop_idx_2;
                     END IF;
                 END LOOP;
 
                 -- Iterate over transfers from the confirmed stop and see if any of them lead to an earlier arrival time.
-                FOREACH transfer IN ARRAY transfers[conf_stop.stop_idx].val
+                FOREACH transfer IN ARRAY transfers[conf_stop_idx].val
                 LOOP
                     -- Calculate arrival time at the transfer destination
-                    new_arrival_via_transfer := conf_stop.arrival_time + (transfer.min_transfer_time_secs * interval '1 second');
+                    new_arrival_via_transfer := conf_arrival_time + (transfer.min_transfer_time_secs * interval '1 second');
 
                     -- If the transfer offers a better arrival time, update the arrival time and record the path as a transfer.
                     IF results[transfer.to_stop_idx].earliest_arrival_time IS NULL OR new_arrival_via_transfer < results[transfer.to_stop_idx].earliest_arrival_time THEN
-                        results[transfer.to_stop_idx] = (new_arrival_via_transfer, conf_stop.stop_idx, 'Transfer');
-                        UPDATE pqueue SET arrival_time = new_arrival_via_transfer WHERE stop_idx = transfer.to_stop_idx;
+                        results[transfer.to_stop_idx] = (new_arrival_via_transfer, conf_stop_idx, transfer_trip_idx);
+                        improved_stops := improved_stops || transfer.to_stop_idx;
                     END IF;
                 END LOOP;
 
             END LOOP;
 
             -- Keep the last time so there are no multiple attempts if the time doesn't change.
-            last_scanned_departure_time := conn.departure_time;
+            last_scanned_departure_time := conn_departure_time;
 
         END IF;
 
         -- Process the next regular connection (trip). We check if it's reachable from its departure stop.
         -- If the value is NULL (the stop is unreachable), this gets skipped.
-        IF results[conn.departure_stop_idx].earliest_arrival_time <= conn.departure_time THEN
+        IF results[conn.departure_stop_idx].earliest_arrival_time <= conn_departure_time THEN
 
             -- If this connection provides an earlier arrival time at its destination
-            IF results[conn.arrival_stop_idx].earliest_arrival_time IS NULL OR conn.arrival_time < results[conn.arrival_stop_idx].earliest_arrival_time THEN
+            IF results[conn.arrival_stop_idx].earliest_arrival_time IS NULL OR conn_arrival_time < results[conn.arrival_stop_idx].earliest_arrival_time THEN
 
                 -- Update the arrival time and record the path (trip and previous stop)
-                results[conn.arrival_stop_idx] = (conn.arrival_time, conn.departure_stop_idx, conn.trip_id);
-                UPDATE pqueue SET arrival_time = conn.arrival_time WHERE stop_idx = conn.arrival_stop_idx;
+                results[conn.arrival_stop_idx] = (conn_arrival_time, conn.departure_stop_idx, conn.trip_idx);
+                improved_stops := improved_stops || conn.arrival_stop_idx;
 
             END IF;
 
@@ -995,7 +1805,7 @@ BEGIN
         SELECT
             u.earliest_arrival_time,
             u.previous_stop_id,
-            u.trip_id_used,
+            u.trip_idx_used,
             u.ordinality
         FROM UNNEST(results) WITH ORDINALITY u
     )
@@ -1003,11 +1813,16 @@ BEGIN
         s.stop_id,
         date_trunc('second', u.earliest_arrival_time + INTERVAL '0.5 seconds') AS earliest_arrival_time,
         ps.stop_id AS previous_stop_id,
-        u.trip_id_used,
+        CASE u.trip_idx_used
+            WHEN walk_trip_idx THEN 'Walk'
+            WHEN transfer_trip_idx THEN 'Transfer'
+            ELSE t.trip_id
+        END AS trip_id_used,
         s.location AS stop_geom
     FROM stop s
          JOIN unnested_array u ON s.serial = u.ordinality
          LEFT JOIN stop ps ON u.previous_stop_id = ps.serial
+         LEFT JOIN trip t ON u.trip_idx_used = t.serial
     ORDER BY u.earliest_arrival_time, s.stop_id;
 END
 $$;
@@ -3,6 +3,7 @@
 # and be imported from other scripts.
 
 from contextlib import contextmanager
+import os
 from neo4j import GraphDatabase
 import psycopg
 from psycopg.rows import dict_row
@@ -26,36 +27,84 @@ NEO4J_CONFIG = {
 
 QUERY_PARAMETERS = {
     'active_services': [ 'curr_date' ],
+    'active_services_range': [ 'start_date', 'end_date' ],
     'daily_status': [ 'start_date', 'end_date' ],
     'departure_times': [ 'route_id', 'stop_id', 'curr_date' ],
     'headway_stats': [ 'curr_date' ],
+    'headway_stats_range': [ 'start_date', 'end_date' ],
+    'nearest_stops': [ 'origin_lat', 'origin_lon', 'k', 'max_dist' ],
     'next_departures': [ 'stop_id', 'curr_date', 'curr_time' ],
     'overlapping_segments': [],
     'routes_by_relevance': [ 'curr_date', 'curr_time' ],
     'routes_by_speed': [],
     'stops_within_distance': [ 'origin_lat', 'origin_lon', 'seek_dist' ],
+    'stops_within_distance_batch': [ 'origin_lats', 'origin_lons', 'seek_dists' ],
     'top_stops': [ 'curr_date' ],
+    'top_stops_range': [ 'start_date', 'end_date' ],
     'trip_start_time_distribution': [ 'curr_date', 'bucket_size_min' ],
+    'trip_start_time_distribution_range': [ 'start_date', 'end_date', 'bucket_size_min' ],
 
     # NOTE: These queries are not available in Neo4J due to lack of library support
     #       or excessive complexity in implementation (modified CSA algorithm).
     'stop_density_heatmap': [ 'grid_size_meters' ],
     'earliest_arrivals': [ 'origin_stop_id', 'departure_date', 'departure_time' ],
     'shortest_path': [ 'origin_stop_id', 'destination_stop_id', 'departure_date', 'departure_time' ],
-    'route_straightness': []
+    'route_straightness': [],
+    'active_vehicles': [ 'curr_date', 'curr_time' ]
 }
 
-QUERIES = { 'postgres': {}, 'neo4j': {} }
-for query_name, params in QUERY_PARAMETERS.items():
-    pg_param_string = ", ".join(["%s"] * len(params))
-    QUERIES['postgres'][query_name] = f"SELECT * FROM {query_name}({pg_param_string});"
+# Parameterless queries whose results can be materialized during the import (see 'import.py --snapshots').
+SNAPSHOT_QUERIES = [ 'overlapping_segments', 'routes_by_speed', 'route_straightness' ]
+
+# Set GTFS_FORCE_RECOMPUTE=1 to ignore the snapshots, e.g. when measuring query performance.
+FORCE_RECOMPUTE = os.environ.get('GTFS_FORCE_RECOMPUTE', '').lower() in ('1', 'true', 'yes')
+
+def neo4j_catalog_query(query_name: str, params: list) -> str:
+    """Returns the Cypher code that runs a query of the catalog with the given parameters."""
     neo4j_param_string = ", ".join([f"{param}: ${param}" for param in params])
-    QUERIES['neo4j'][query_name] = f"""
+    return f"""
         MATCH (cq: CypherQuery {{name: '{query_name}'}})
         CALL apoc.cypher.run(cq.statement, {{{neo4j_param_string}}}) YIELD value
         RETURN value
     """
 
+def neo4j_snapshot_query(query_name: str) -> str:
+    """
+    Returns the Cypher code that serves a parameterless query from its snapshot, if it matches the loaded dataset.
+    Every import recreates the database along with its snapshots, so the fingerprint
+    only guards against nodes that are reloaded by hand afterwards.
+    """
+    return f"""
+        OPTIONAL MATCH (d: Dataset)
+        OPTIONAL MATCH (qs: QuerySnapshot {{name: '{query_name}', dataset_fingerprint: d.fingerprint}})
+        CALL apoc.when(
+            qs IS NOT NULL,
+            'UNWIND apoc.convert.fromJsonList(qs.rows) AS value RETURN value',
+            'MATCH (cq: CypherQuery {{name: "{query_name}"}}) CALL apoc.cypher.run(cq.statement, {{}}) YIELD value RETURN value',
+            {{qs: qs}}
+        ) YIELD value
+        RETURN value.value AS value
+    """
+
+QUERIES = { 'postgres': {}, 'neo4j': {} }
+for query_name, params in QUERY_PARAMETERS.items():
+    pg_param_string = ", ".join(["%s"] * len(params))
+    # Date range variants are overloads of the single-date functions in PostgreSQL.
+    pg_function_name = query_name.removesuffix('_range')
+    QUERIES['postgres'][query_name] = f"SELECT * FROM {pg_function_name}({pg_param_string});"
+    QUERIES['neo4j'][query_name] = neo4j_catalog_query(query_name, params)
+
+# Queries that always compute their results, regardless of the snapshots.
+RECOMPUTED_QUERIES = { 'postgres': {}, 'neo4j': {} }
+for query_name in SNAPSHOT_QUERIES:
+    RECOMPUTED_QUERIES['postgres'][query_name] = f"SELECT * FROM {query_name}(force_recompute => TRUE);"
+    RECOMPUTED_QUERIES['neo4j'][query_name] = neo4j_catalog_query(query_name, [])
+    # PostgreSQL functions serve their own snapshots, while Neo4J needs a wrapper.
+    if FORCE_RECOMPUTE:
+        QUERIES['postgres'][query_name] = RECOMPUTED_QUERIES['postgres'][query_name]
+    else:
+        QUERIES['neo4j'][query_name] = neo4j_snapshot_query(query_name)
+
 # Generate functions to query both PostgreSQL and Neo4J.
 @contextmanager
 def pg_query_runner():
@@ -126,6 +175,36 @@ def bounding_box(pg_query_runner) -> dict:
     pg_bbox = pg_query_runner(sql, ())[0]
     return pg_bbox
 
+def stops_within_distance_batch(pg_query_runner, origins: list[dict]) -> list[list[dict]]:
+    """
+    Finds the stops around many origins with a single query.
+
+    Args:
+        pg_query_runner: Function returned by the pg_query_runner context manager.
+        origins (list): Dictionaries with 'lat', 'lon' and 'radius' (in meters) keys.
+
+    Returns:
+        list: For each origin (in the same order), the list of stops within its radius,
+              sorted by distance.
+    """
+    if not origins:
+        return []
+
+    rows = pg_query_runner(
+        QUERIES['postgres']['stops_within_distance_batch'],
+        (
+            [float(origin['lat']) for origin in origins],
+            [float(origin['lon']) for origin in origins],
+            [float(origin['radius']) for origin in origins]
+        )
+    )
+
+    # Rows come sorted by origin, so grouping them keeps the per-origin ordering.
+    results = [[] for _ in origins]
+    for row in rows:
+        results[row.pop('origin_index')].append(row)
+    return results
+
 # Helper function to represent data on the map.
 def focused_bounds(gdf, quantile_trim=0.05):
     """
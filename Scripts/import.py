@@ -1,11 +1,23 @@
 #!/usr/bin/env python3
 
 import argparse
+import csv
+import hashlib
+import io
+import os
+import re
 import sys
-from pathlib import Path
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path, PurePosixPath
 import logging
 
 from database import NEO4J_CONFIG, PG_CONFIG
+from process_dataset import normalize_rows
 
 try:
     from neo4j import GraphDatabase, exceptions as neo4j_exceptions
@@ -18,8 +30,326 @@ except ImportError as e:
 # Ignore deprecated method warnings from Neo4J (mostly linked to apoc.trigger.add).
 logging.getLogger("neo4j").setLevel(logging.ERROR)    
 
-def execute_neo4j_commands(commands, dataset_name):
-    """Connects to Neo4J and executes a series of Cypher commands."""
+# Matches the calls to 'load_from_csv' in the PostgreSQL import scripts.
+LOAD_FROM_CSV_PATTERN = re.compile(r"CALL\s+load_from_csv\(\s*'(\w+)'\s*,\s*:'dataset_dir'\s*\|\|\s*'/([\w.]+)'\s*\);")
+
+# Amount of CSV text buffered before sending it to the server during a COPY.
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Commands run on every PostgreSQL connection opened by the import.
+SESSION_SETUP = "SET client_min_messages = 'warning';"
+
+# Additional session settings for bulk imports, which trade durability for speed.
+BULK_SESSION_SETUP = """
+    SET maintenance_work_mem = '1GB';
+    SET max_parallel_maintenance_workers = 4;
+    SET synchronous_commit = off;
+"""
+
+# Returns every unlogged table along with the tables it references through foreign keys.
+UNLOGGED_TABLES_QUERY = """
+    SELECT c.relname, array_remove(array_agg(DISTINCT r.relname), NULL)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_constraint fk ON fk.conrelid = c.oid AND fk.contype = 'f' AND fk.confrelid <> c.oid
+    LEFT JOIN pg_class r ON r.oid = fk.confrelid AND r.relpersistence = 'u'
+    WHERE n.nspname = 'public' AND c.relkind = 'r' AND c.relpersistence = 'u'
+    GROUP BY c.relname;
+"""
+
+# Matches the parameters of the Neo4J import scripts.
+NEO4J_PARAMETER_PATTERN = re.compile(r"\$(\w+)")
+
+# Matches the opening tag of a dollar-quoted string ($$ or $tag$).
+DOLLAR_QUOTE_PATTERN = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)?\$")
+
+# Matches any text without comments, quotes or statement separators.
+PLAIN_SQL_PATTERN = re.compile(r"[^-/'\"$;]+")
+
+# Matches the objects that a SQL statement creates or modifies.
+# NOTE: Indexes and statistics are not included, since they do not change the contents of a table.
+WRITE_PATTERNS = [
+    re.compile(r'create\s+(?:or\s+replace\s+)?(?:(?:temp|temporary|unlogged|materialized)\s+)?(?:table|view|function|procedure|type|domain)\s+(?:if\s+not\s+exists\s+)?"?(\w+)'),
+    re.compile(r'drop\s+(?:table|materialized\s+view|view|function|procedure|type|domain)\s+(?:if\s+exists\s+)?"?(\w+)'),
+    re.compile(r'alter\s+table\s+(?:if\s+exists\s+)?(?:only\s+)?"?(\w+)'),
+    re.compile(r'(?:insert\s+into|update|delete\s+from|truncate(?:\s+table)?|refresh\s+materialized\s+view(?:\s+concurrently)?)\s+"?(\w+)'),
+    re.compile(r'create\s+(?:or\s+replace\s+)?trigger\s+\w+\s+.*?\s+on\s+"?(\w+)', re.DOTALL),
+    re.compile(r"load_from_csv\(\s*'(\w+)'"),
+]
+
+# Keywords that the patterns above may capture instead of an object name (e.g. "BEFORE UPDATE ON").
+SQL_KEYWORDS = frozenset(['on', 'of', 'or', 'set', 'cascade', 'restrict', 'no'])
+
+# Matches the tables that a SQL statement reads: foreign key targets and FROM/JOIN items (including comma lists).
+REFERENCES_PATTERN = re.compile(r'\breferences\s+"?(\w+)')
+JOIN_PATTERN = re.compile(r'\bjoin\s+(?:lateral\s+)?"?(\w+)')
+FROM_PATTERN = re.compile(r'\bfrom\s+("?\w+"?(?:\s+(?:as\s+)?\w+)?(?:\s*,\s*"?\w+"?(?:\s+(?:as\s+)?\w+)?)*)')
+
+# Matches the procedures run by a SQL statement, whose own writes are hidden behind the call.
+CALL_PATTERN = re.compile(r'\bcall\s+"?(\w+)')
+
+class DirectorySource:
+    """GTFS files extracted into a directory."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self, file_name):
+        return (self.path / file_name).is_file()
+
+    def open(self, file_name):
+        return open(self.path / file_name, 'r', newline='', encoding='utf-8-sig')
+
+    def open_binary(self, file_name):
+        return open(self.path / file_name, 'rb')
+
+class ZipSource:
+    """GTFS files contained in a zip archive, which are read without extracting them."""
+
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path)
+        # Some feeds place their files inside a folder, so index members by their base name.
+        self.members = {
+            PurePosixPath(info.filename).name: info
+            for info in self.archive.infolist() if not info.is_dir()
+        }
+
+    def exists(self, file_name):
+        return file_name in self.members
+
+    def open(self, file_name):
+        return io.TextIOWrapper(self.archive.open(self.members[file_name]), encoding='utf-8-sig', newline='')
+
+    def open_binary(self, file_name):
+        return self.archive.open(self.members[file_name])
+
+def gtfs_time_to_seconds(time_str):
+    """Converts a GTFS time string (H:MM:SS, possibly >= 24:00:00) into seconds, keeping empty values."""
+    if not time_str:
+        return time_str
+    hours, minutes, seconds = time_str.split(':')
+    return str(int(hours) * 3600 + int(minutes) * 60 + int(seconds))
+
+def copy_from_source(cur, source, table, file_name):
+    """
+    Streams a GTFS file into a table through COPY FROM STDIN, normalizing its columns on the fly.
+    Equivalent to 'load_from_csv', but the file does not need to be accessible by the server.
+    """
+    if not source.exists(file_name):
+        return
+
+    # Retrieve the columns of the table (which may be temporary) in order.
+    # Also find the ones that store GTFS times as seconds, since COPY cannot parse them.
+    cur.execute("""
+        SELECT attname, atttypid = 'gtfs_time'::regtype AND gtfs_time_format() = 'seconds'
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum;
+    """, (table,))
+    attributes = cur.fetchall()
+    columns = [name for name, _ in attributes]
+    time_indices = [i for i, (_, is_time) in enumerate(attributes) if is_time]
+
+    # Empty fields take the DEFAULT value of their column, as in 'load_from_csv'.
+    copy_statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT CSV, NULL '\\N', DEFAULT '')").format(
+        sql.Identifier(table), sql.SQL(', ').join(map(sql.Identifier, columns))
+    )
+
+    with source.open(file_name) as f, cur.copy(copy_statement) as copy:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        for row in normalize_rows(reader, header, columns):
+            for i in time_indices:
+                row[i] = gtfs_time_to_seconds(row[i])
+            writer.writerow(row)
+            if buffer.tell() >= COPY_BUFFER_SIZE:
+                copy.write(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+        copy.write(buffer.getvalue())
+
+def dataset_fingerprint(source, file_names):
+    """
+    Hashes the contents of the GTFS files of a dataset, which identifies it regardless of its name or location.
+    Snapshots of query results are tagged with it, so that they are never served for a different dataset.
+    Since the database is recreated by every import, this only matters when its tables are reloaded by hand.
+    """
+    digest = hashlib.sha256()
+    for file_name in sorted(file_names):
+        if not source.exists(file_name):
+            continue
+        digest.update(file_name.encode() + b'\0')
+        with source.open_binary(file_name) as f:
+            while (chunk := f.read(COPY_BUFFER_SIZE)):
+                digest.update(chunk)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+@contextmanager
+def import_phase(name):
+    """Measures and reports the time spent on a phase of the import."""
+    start = time.perf_counter()
+    yield
+    print(f"{name} finished in {time.perf_counter() - start:.2f} s.")
+
+def prepare_bulk_script(script, defer_indexes=True):
+    """
+    Adapts a PostgreSQL script for bulk imports: its tables are created UNLOGGED, skipping the WAL.
+    Returns the script and, separately, its index definitions so that they can be built later.
+    """
+    statements, indexes = [], []
+    for statement in split_sql_statements(script):
+        if defer_indexes and re.match(r'CREATE\s+(UNIQUE\s+)?INDEX\b', statement, re.IGNORECASE):
+            indexes.append(statement)
+        else:
+            statements.append(re.sub(r'^CREATE\s+TABLE\b', 'CREATE UNLOGGED TABLE', statement, flags=re.IGNORECASE))
+    return '\n'.join(statements), indexes
+
+def split_sql_statements(script):
+    """
+    Splits a SQL script into its statements, dropping comments.
+    Quoted identifiers, strings and dollar-quoted bodies are kept intact.
+    """
+    statements = []
+    current = []
+    i, n = 0, len(script)
+
+    while i < n:
+        if (match := PLAIN_SQL_PATTERN.match(script, i)):
+            current.append(match.group(0))
+            i = match.end()
+        elif script.startswith('--', i):
+            end = script.find('\n', i)
+            i = n if end == -1 else end
+        elif script.startswith('/*', i):
+            end = script.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            current.append(' ')
+        elif script[i] in "'\"":
+            # Doubled quotes are escaped quotes, not the end of the string.
+            quote, end = script[i], i + 1
+            while True:
+                end = script.find(quote, end)
+                if end == -1:
+                    end = n
+                    break
+                if script.startswith(quote * 2, end):
+                    end += 2
+                    continue
+                end += 1
+                break
+            current.append(script[i:end])
+            i = end
+        elif (match := DOLLAR_QUOTE_PATTERN.match(script, i)):
+            end = script.find(match.group(0), match.end())
+            end = n if end == -1 else end + len(match.group(0))
+            current.append(script[i:end])
+            i = end
+        elif script[i] == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement + ';')
+            current = []
+            i += 1
+        else:
+            current.append(script[i])
+            i += 1
+
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement + ';')
+    return statements
+
+class ImportStep:
+    """A unit of the PostgreSQL import that runs on a worker connection, once the steps it depends on are done."""
+
+    def __init__(self, name, script):
+        self.name = name
+        self.script = script
+        # Drop the comments, including the ones inside function bodies.
+        text = re.sub(r'--[^\n]*', '', ' '.join(split_sql_statements(script)).lower())
+        unquoted_text = re.sub(r"'(?:[^']|'')*'", "''", text)
+        # Objects created or modified by the script.
+        self.writes = {name for pattern in WRITE_PATTERNS for name in pattern.findall(text)} - SQL_KEYWORDS
+        # Tables used by the script, either through foreign keys or in queries.
+        self.tables = set(REFERENCES_PATTERN.findall(unquoted_text)) | set(JOIN_PATTERN.findall(unquoted_text)) | {
+            item.split()[0].strip('"')
+            for items in FROM_PATTERN.findall(unquoted_text) for item in items.split(',')
+        } | self.writes
+        # Every identifier mentioned by the script, ignoring the contents of string literals.
+        self.identifiers = set(re.findall(r'[a-z_][a-z0-9_]*', unquoted_text)) | self.writes
+        # Procedures run by the script (including the ones inside DO blocks).
+        self.calls = set(CALL_PATTERN.findall(unquoted_text)) - {'load_from_csv'}
+
+def build_table_graph(steps):
+    """
+    Returns the dependencies of each import script: every previous script that modifies a table it uses
+    (e.g. the target of one of its foreign keys) or that uses a table it modifies.
+    Since scripts only depend on previous ones, the result is always acyclic and preserves the original semantics.
+    """
+    return {
+        i: {j for j in range(i) if steps[i].writes & steps[j].tables or steps[j].writes & steps[i].tables}
+        for i in range(len(steps))
+    }
+
+def build_catalog_graph(steps):
+    """
+    Returns the dependencies of each statement of the query catalog: every previous statement that modifies
+    an object it mentions, or that mentions an object it modifies.
+    Function bodies are only known as text, so any identifier they share counts as a use. Calls to procedures
+    are attributed the writes of the statement that defined them, since they modify tables without naming them.
+    """
+    routine_writes = {}
+    writes = []
+    for step in steps:
+        step_writes = set(step.writes)
+        for routine in step.calls:
+            step_writes |= routine_writes.get(routine, set())
+        for routine in step.writes:
+            routine_writes[routine] = step_writes
+        writes.append(step_writes)
+
+    return {
+        i: {j for j in range(i) if writes[i] & steps[j].identifiers or writes[j] & steps[i].identifiers}
+        for i in range(len(steps))
+    }
+
+def run_import_graph(steps, dependencies, run_step, jobs):
+    """Runs each step as soon as its dependencies are done, with up to 'jobs' steps at the same time."""
+    pending = {i: set(deps) for i, deps in dependencies.items()}
+    dependents = defaultdict(list)
+    for i, deps in dependencies.items():
+        for j in deps:
+            dependents[j].append(i)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        ready = [i for i, deps in pending.items() if not deps]
+        running = {}
+        while ready or running:
+            for i in ready:
+                running[pool.submit(run_step, steps[i])] = i
+            ready = []
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                # Propagate errors, which stops the import after the running steps finish.
+                future.result()
+                for j in dependents[i]:
+                    pending[j].discard(i)
+                    if not pending[j]:
+                        ready.append(j)
+
+def cypher_literal(value):
+    """Formats a Python value as a Cypher literal."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def execute_neo4j_commands(commands, parameters):
+    """Connects to Neo4J and executes a series of Cypher commands, replacing the given $parameters."""
     try:
         with GraphDatabase.driver(NEO4J_CONFIG['uri'], auth=(NEO4J_CONFIG['user'], NEO4J_CONFIG['password'])) as driver:
             # Check for connectivity
@@ -38,8 +368,11 @@ def execute_neo4j_commands(commands, dataset_name):
                     #       Complex scripts with semicolons in strings might require more robust parsing.
                     statements = [s.strip() for s in command_part.split(';') if s.strip()]
                     for statement in statements:
-                        # Substitute the parameter placeholder
-                        param_statement = statement.replace('$dataset', f'"{dataset_name}"')
+                        # Substitute the parameter placeholders, keeping the ones used by the query catalog.
+                        param_statement = NEO4J_PARAMETER_PATTERN.sub(
+                            lambda m: cypher_literal(parameters[m.group(1)]) if m.group(1) in parameters else m.group(0),
+                            statement
+                        )
                         session.run(param_statement)
 
             print("Neo4J import executed successfully.")
@@ -54,10 +387,86 @@ def execute_neo4j_commands(commands, dataset_name):
         print(f"An unexpected Neo4J error occurred: {e}", file=sys.stderr)
         sys.exit(1)
 
-def execute_postgres_commands(commands, dataset_name):
-    """Connects to PostgreSQL and executes a series of SQL commands."""
+def substitute_variables(script, variables):
+    """Replaces the psql variables (:'name') in a script with their values as string literals."""
+    # A better approach would be to adapt SQL scripts to use session variables or function parameters.
+    for name, value in variables.items():
+        script = script.replace(f":'{name}'", "'" + value.replace("'", "''") + "'")
+    return script
+
+def execute_postgres_script(cur, script, variables, source=None):
+    """
+    Executes an import script on a cursor, replacing the given psql \\set variables.
+    If a source is given, GTFS files are streamed from the client instead of being read by the server.
+    """
+    if source is None:
+        cur.execute(substitute_variables(script, variables))
+        return
+
+    # Run the statements around each data load, which is replaced by a client-side COPY.
+    position = 0
+    for match in LOAD_FROM_CSV_PATTERN.finditer(script):
+        if script[position:match.start()].strip():
+            cur.execute(substitute_variables(script[position:match.start()], variables))
+        copy_from_source(cur, source, match.group(1), match.group(2))
+        position = match.end()
+    if script[position:].strip():
+        cur.execute(substitute_variables(script[position:], variables))
+
+def execute_postgres_commands(prelude, scripts, variables, source=None, jobs=None, bulk=False, keep_unlogged=False):
+    """
+    Connects to PostgreSQL and executes a series of SQL commands.
+    The prelude runs first on a single connection. Then, the (name, script) pairs are split into steps that run
+    concurrently on a connection per worker, respecting the dependencies between them.
+    In bulk mode, tables are unlogged until the end and indexes are built in a separate phase.
+    """
     conn_info = f"host={PG_CONFIG['host']} port={PG_CONFIG['port']} user={PG_CONFIG['user']} password={PG_CONFIG['password']}"
-    
+    session_setup = SESSION_SETUP + (BULK_SESSION_SETUP if bulk else "")
+
+    def connect():
+        conn = psycopg.connect(conn_info, dbname=PG_CONFIG['dbname'])
+        conn.execute(session_setup)
+        return conn
+
+    # Each worker thread keeps its connection for all the steps it runs, instead of opening one per step.
+    # NOTE: Import scripts drop their temporary tables, so nothing is left behind for the next step.
+    worker = threading.local()
+    worker_connections = []
+
+    def run_step(step):
+        if not hasattr(worker, 'conn'):
+            worker.conn = connect()
+            worker_connections.append(worker.conn)
+        try:
+            with worker.conn.cursor() as cur:
+                execute_postgres_script(cur, step.script, variables, source)
+            worker.conn.commit()
+        except psycopg.Error as e:
+            # Identify the step that failed, since they run in any order.
+            raise type(e)(f"{step.name}: {e}") from e
+
+    def run_steps(steps, dependencies):
+        try:
+            run_import_graph(steps, dependencies, run_step, jobs)
+        finally:
+            # Workers only live during a phase.
+            for conn in worker_connections:
+                conn.close()
+            worker_connections.clear()
+
+    # Import scripts run as a whole, since some of them rely on temporary tables.
+    # The statements of the query catalog, however, are independent steps.
+    table_steps, index_steps, catalog_steps = [], [], []
+    for name, script in scripts:
+        if bulk:
+            # The indexes of the query catalog are built on its own objects, so they are not deferred.
+            script, indexes = prepare_bulk_script(script, defer_indexes=not name.startswith("queries"))
+            index_steps += [ImportStep(f"{name} (index #{i + 1})", index) for i, index in enumerate(indexes)]
+        if name.startswith("queries"):
+            catalog_steps += [ImportStep(f"{name} #{i + 1}", statement) for i, statement in enumerate(split_sql_statements(script))]
+        else:
+            table_steps.append(ImportStep(name, script))
+
     try:
         # Connect to the default 'postgres' database to manage the 'gtfs' database
         with psycopg.connect(conn_info, dbname="postgres", autocommit=True) as conn:
@@ -68,15 +477,43 @@ def execute_postgres_commands(commands, dataset_name):
                 
         
         # Now connect to the newly created 'gtfs' database
-        with psycopg.connect(conn_info, dbname=PG_CONFIG['dbname']) as conn:
+        with import_phase("Setup"), connect() as conn:
             with conn.cursor() as cur:
-                for command_part in commands:
-                    # Replace the psql \set variable. 
-                    # A better approach would be to adapt SQL scripts to use session variables or function parameters.
-                    command = command_part.replace(":'dataset_dir'", f"'/var/lib/postgresql/import/GTFS/{dataset_name}'")
-                    cur.execute(command)
+                for command_part in prelude:
+                    if bulk:
+                        command_part, _ = prepare_bulk_script(command_part)
+                    execute_postgres_script(cur, command_part, variables, source)
                     conn.commit()
 
+        with import_phase("Table import"):
+            run_steps(table_steps, build_table_graph(table_steps))
+
+        # Every table exists at this point, so all indexes can be built at the same time.
+        if index_steps:
+            with import_phase("Index creation"):
+                run_steps(index_steps, {i: set() for i in range(len(index_steps))})
+
+        with import_phase("Query catalog"):
+            run_steps(catalog_steps, build_catalog_graph(catalog_steps))
+
+        # The footpath graph grows quickly with the walking radius in dense networks, so its size is reported.
+        with connect() as conn:
+            print(f"Footpaths ({conn.execute('SELECT pg_size_pretty(footpath_size());').fetchone()[0]}):")
+            for kind, edge_count, edges_per_stop, _ in conn.execute("SELECT * FROM footpath_stats();"):
+                print(f"  {kind}: {edge_count} edges ({edges_per_stop} per stop)")
+
+        if bulk and not keep_unlogged:
+            # Logged tables cannot reference unlogged ones, so referenced tables are switched first.
+            with import_phase("Logging tables"):
+                with connect() as conn:
+                    tables = conn.execute(UNLOGGED_TABLES_QUERY).fetchall()
+                positions = {table: i for i, (table, _) in enumerate(tables)}
+                logged_steps = [ImportStep(table, f'ALTER TABLE "{table}" SET LOGGED;') for table, _ in tables]
+                run_steps(logged_steps, {
+                    i: {positions[ref] for ref in references if ref in positions}
+                    for i, (_, references) in enumerate(tables)
+                })
+
         print("PostgreSQL import executed successfully.")
 
     except psycopg.OperationalError as e:
@@ -90,6 +527,15 @@ def main():
     parser = argparse.ArgumentParser(description="Import a GTFS dataset into Neo4J or PostgreSQL.")
     parser.add_argument("dataset", help="The name of the GTFS dataset directory.")
     parser.add_argument("dbms", choices=['neo4j', 'postgres'], help="The target database management system.")
+    parser.add_argument("--zip", action="store_true", help="Stream the dataset from 'Datasets/GTFS/<dataset>.zip' without extracting it (PostgreSQL only).")
+    parser.add_argument("--bulk", action="store_true", help="Use unlogged tables and build indexes at the end, for faster PostgreSQL imports.")
+    parser.add_argument("--keep-unlogged", action="store_true", help="In bulk mode, leave tables unlogged (only for disposable databases, since they are emptied after a crash).")
+    parser.add_argument("--time-format", choices=['interval', 'seconds'], default='interval', help="How PostgreSQL stores GTFS times: as intervals or as integer seconds (smaller and faster to sort).")
+    parser.add_argument("--footpath-radius", type=float, default=1000, help="Maximum distance (in meters) of the walks between stops precomputed by PostgreSQL.")
+    parser.add_argument("--walking-speed", type=float, default=1.4, help="Walking speed (in meters per second) used to compute the duration of the footpaths.")
+    parser.add_argument("--transitive-footpaths", action="store_true", help="Add the transitive closure of the transfers and pathways (within the walking time of the radius), so their chains become single footpaths. Walks are never chained.")
+    parser.add_argument("--snapshots", action="store_true", help="Materialize the results of the parameterless queries, which are then served without recomputing them.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Maximum number of concurrent PostgreSQL connections (defaults to the number of CPUs).")
 
     args = parser.parse_args()
 
@@ -100,10 +546,22 @@ def main():
     root_dir = script_dir.parent
     dataset_dir = root_dir / "Datasets" / "GTFS" / dataset
 
-    if not dataset_dir.is_dir():
+    if args.zip:
+        if dbms != "postgres":
+            print("Error: Importing from a zip archive is only supported for PostgreSQL.", file=sys.stderr)
+            sys.exit(1)
+        dataset_zip = dataset_dir.with_name(f"{dataset}.zip")
+        if not dataset_zip.is_file():
+            print(f"Error: Dataset archive not found at '{dataset_zip}'", file=sys.stderr)
+            sys.exit(1)
+        source = ZipSource(dataset_zip)
+    elif not dataset_dir.is_dir():
         print(f"Error: Dataset directory not found at '{dataset_dir}'", file=sys.stderr)
         sys.exit(1)
+    else:
+        source = DirectorySource(dataset_dir)
 
+    prelude_parts = []
     command_string_parts = []
     file_extension = ""
 
@@ -116,15 +574,15 @@ def main():
         file_extension = "sql"
         # Initial setup commands.
         # NOTE: You can add "LOAD 'auto_explain';" to the command string if you want to debug execution times.
-        command_string_parts.append("""
-            SET client_min_messages = 'warning';
+        prelude_parts.append("""
             CREATE EXTENSION IF NOT EXISTS postgis;
             CREATE EXTENSION IF NOT EXISTS pgrouting;
+            CREATE EXTENSION IF NOT EXISTS btree_gist;
             SELECT pg_reload_conf();
         """)
         try:
             import_script = (import_dir / "base.sql").read_text()
-            command_string_parts.append(import_script)
+            prelude_parts.append(import_script)
         except FileNotFoundError:
             print(f"Error: PostgreSQL script 'base.sql' not found.", file=sys.stderr)
             exit(1)
@@ -177,18 +635,18 @@ def main():
 
     # Make sure base files are present first.
     for file in base_files:
-        if not (dataset_dir / f"{file}.txt").is_file():
+        if not source.exists(f"{file}.txt"):
             print(f"\nError: Missing fundamental files in the GTFS standard: {file}.txt\n", file=sys.stderr)
             sys.exit(1)
 
     # Handle the special case for services.
-    if not (dataset_dir / "calendar.txt").is_file() and not (dataset_dir / "calendar_dates.txt").is_file():
+    if not source.exists("calendar.txt") and not source.exists("calendar_dates.txt"):
         print("\nError: Missing calendar.txt or calendar_dates.txt. At least one of them is required.", file=sys.stderr)
         sys.exit(1)
 
     # Iterate over all files and compose the command string.
     for file in file_list:
-        file_exists = (dataset_dir / f"{file}.txt").is_file()
+        file_exists = source.exists(f"{file}.txt")
 
         if not file_exists:
             print(f"{file}: no")
@@ -198,22 +656,44 @@ def main():
         if file_exists or dbms == "postgres":
             try:
                 import_script = (import_dir / f"{file}.{file_extension}").read_text()
-                command_string_parts.append(import_script)
+                command_string_parts.append((f"{file}.{file_extension}", import_script))
             except FileNotFoundError:
                 print(f"Warning: GTFS files exist but script '{file}.{file_extension}' not found.", file=sys.stderr)
 
     # Append predefined queries to the command string.
     queries_script_path = (script_dir / "Neo4J" / "queries.cypher") if dbms == "neo4j" else (script_dir / "PostgreSQL" / "queries.sql")
     if queries_script_path.is_file():
-        command_string_parts.append(queries_script_path.read_text())
+        command_string_parts.append((queries_script_path.name, queries_script_path.read_text()))
+
+    # Reading every file again is only worth it when there are snapshots to tag.
+    fingerprint = ''
+    if args.snapshots:
+        with import_phase("Dataset fingerprint"):
+            fingerprint = dataset_fingerprint(source, [f"{file}.txt" for file in file_list])
 
     # Launch the commands.
     print("\nStarting import...\n")
 
     if dbms == "neo4j":
-        execute_neo4j_commands(command_string_parts, dataset)
+        parameters = {
+            'dataset': dataset,
+            'dataset_fingerprint': fingerprint,
+            'query_snapshots': args.snapshots
+        }
+        execute_neo4j_commands([script for _, script in command_string_parts], parameters)
     elif dbms == "postgres":
-        execute_postgres_commands(command_string_parts, dataset)
+        # Files are only streamed from the client when they cannot be read by the server.
+        variables = {
+            'dataset': dataset,
+            'dataset_dir': f"/var/lib/postgresql/import/GTFS/{dataset}",
+            'dataset_fingerprint': fingerprint,
+            'footpath_radius': str(args.footpath_radius),
+            'query_snapshots': 'true' if args.snapshots else 'false',
+            'time_format': args.time_format,
+            'transitive_footpaths': 'true' if args.transitive_footpaths else 'false',
+            'walking_speed': str(args.walking_speed)
+        }
+        execute_postgres_commands(prelude_parts, command_string_parts, variables, source if args.zip else None, args.jobs, args.bulk, args.keep_unlogged)
 
     print("Import finished.")
 
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+# This script measures the time it takes to load the stop times of a dataset into PostgreSQL
+# when defaults are applied by a second UPDATE pass (as previous versions of 'load_from_csv' did)
+# compared to applying them during the COPY itself.
+
+import argparse
+import statistics
+import sys
+import time
+import pathlib
+
+from database import PG_CONFIG
+from process_dataset import COLUMNS
+
+try:
+    import psycopg
+    from psycopg import sql
+except ImportError as e:
+    print(f"Error: A required library is not installed. Please install it using 'pip install psycopg'. Missing: {e.name}", file=sys.stderr)
+    sys.exit(1)
+
+SCRIPT_DIR = pathlib.Path(__file__).parent.resolve()
+READ_SIZE = 1024 * 1024
+
+# Optional columns of stop_times.txt with a default value, as defined in 'stop_times.sql'.
+DEFAULTS = {
+    'pickup_type': 0,
+    'drop_off_type': 0,
+    'continuous_pickup': 1,
+    'continuous_drop_off': 1,
+    'timepoint': 1
+}
+
+def create_table(cur):
+    """Creates an empty temporary copy of the stop times table, as it is before being transformed."""
+    cur.execute("DROP TABLE IF EXISTS stop_time_bench;")
+    cur.execute(sql.SQL("CREATE TEMP TABLE stop_time_bench ({});").format(sql.SQL(', ').join(
+        sql.SQL("{} INTEGER DEFAULT {}").format(sql.Identifier(col), sql.Literal(DEFAULTS[col])) if col in DEFAULTS
+        else sql.SQL("{} TEXT").format(sql.Identifier(col))
+        for col in COLUMNS['stop_times.txt']
+    )))
+
+def copy_file(cur, file_path, options):
+    """Streams a (pre-processed) GTFS file into the benchmark table."""
+    with open(file_path, 'rb') as f, cur.copy(f"COPY stop_time_bench FROM STDIN WITH ({options})") as copy:
+        while (data := f.read(READ_SIZE)):
+            copy.write(data)
+
+def load_with_update(cur, file_path):
+    """Loads the file with empty fields as NULLs, then replaces them with their defaults."""
+    copy_file(cur, file_path, "FORMAT CSV, HEADER MATCH, NULL ''")
+    cur.execute(sql.SQL("UPDATE stop_time_bench SET {} WHERE {};").format(
+        sql.SQL(', ').join(
+            sql.SQL("{0} = COALESCE({0}, {1})").format(sql.Identifier(col), sql.Literal(value))
+            for col, value in DEFAULTS.items()
+        ),
+        sql.SQL(' OR ').join(sql.SQL("{} IS NULL").format(sql.Identifier(col)) for col in DEFAULTS)
+    ))
+
+def load_with_default(cur, file_path):
+    """Loads the file with empty fields replaced by their defaults during the COPY."""
+    copy_file(cur, file_path, "FORMAT CSV, HEADER MATCH, NULL '\\N', DEFAULT ''")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ways of applying default values when loading stop times into PostgreSQL.")
+    parser.add_argument("dataset", help="The name of the (pre-processed) GTFS dataset directory.")
+    parser.add_argument("--repetitions", type=int, default=5, help="Number of times each method is run.")
+    args = parser.parse_args()
+
+    file_path = SCRIPT_DIR.parent / "Datasets" / "GTFS" / args.dataset / "stop_times.txt"
+    if not file_path.is_file():
+        print(f"Error: File not found at '{file_path}'", file=sys.stderr)
+        sys.exit(1)
+
+    methods = {
+        'COPY + UPDATE': load_with_update,
+        'COPY with DEFAULT': load_with_default
+    }
+    times = {name: [] for name in methods}
+    contents = {}
+
+    with psycopg.connect(**PG_CONFIG) as conn, conn.cursor() as cur:
+        for _ in range(args.repetitions):
+            for name, method in methods.items():
+                create_table(cur)
+                conn.commit()
+
+                start_time = time.perf_counter()
+                method(cur, file_path)
+                conn.commit()
+                times[name].append(time.perf_counter() - start_time)
+
+                # Both methods must produce the same table.
+                cur.execute("SELECT md5(string_agg(t::text, ',' ORDER BY t::text)) FROM stop_time_bench t;")
+                contents[name] = cur.fetchone()[0]
+
+        cur.execute("SELECT pg_size_pretty(pg_total_relation_size('stop_time_bench'));")
+        table_size = cur.fetchone()[0]
+
+    for name, measurements in times.items():
+        print(f"{name}: {statistics.mean(measurements):.4f} s (min {min(measurements):.4f} s)")
+    print(f"Final table size with COPY with DEFAULT: {table_size}")
+
+    if len(set(contents.values())) != 1:
+        print("Error: The methods produced different table contents.", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
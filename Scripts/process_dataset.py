@@ -2,10 +2,27 @@
 
 # This script takes a directory containing a GTFS dataset missing
 # optional fields and generates associated columns in the CSV files.
+#
+# Files are rewritten as a stream, so memory usage does not depend on their size.
+# Independent files, as well as chunks of the large ones (e.g. stop_times.txt or shapes.txt),
+# are processed in parallel by a pool of worker processes.
 
 import sys;
 import os;
-import pandas as pd;
+import csv;
+import shutil;
+import argparse;
+from concurrent.futures import ProcessPoolExecutor;
+
+# Size of the byte ranges that large files are split into.
+CHUNK_SIZE = 64 * 1024 * 1024
+
+# Values that were treated as missing by pandas.read_csv, which previous versions of this script used.
+# They are kept so that the output stays the same.
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
 
 # Define columns for each GTFS file based on the specification
 COLUMNS = {
@@ -74,34 +91,125 @@ COLUMNS = {
                          'attribution_url', 'attribution_email', 'attribution_phone']
 }
 
-def update_dataset(gtfs_dir):
-    for file_name, file_columns in COLUMNS.items():
-        file_path = os.path.join(gtfs_dir, file_name)
+def normalize_rows(rows, header, columns):
+    """
+    Yields the given CSV rows with their fields reordered according to 'columns'.
+    Missing optional columns are added and blank or NA-like values are replaced with empty strings.
+    """
+    indices = [header.index(col) if col in header else None for col in columns]
 
-        # Skip if the file does not exist
-        if not os.path.isfile(file_path):
+    for row in rows:
+        # Skip blank lines.
+        if not row:
             continue
+        yield [
+            '' if i is None or i >= len(row) or row[i] in NA_VALUES or row[i].isspace() else row[i]
+            for i in indices
+        ]
+
+def read_header(file_path):
+    """Reads the header of a GTFS file. Returns its fields and the offset where the data starts."""
+    with open(file_path, 'rb') as f:
+        line = f.readline()
+        header = next(csv.reader([line.decode('utf-8-sig')]), [])
+        return header, f.tell()
+
+def chunk_ranges(file_path, start, chunk_size):
+    """Splits a file into (start, end) byte ranges of roughly 'chunk_size' bytes, aligned to line breaks."""
+    size = os.path.getsize(file_path)
+    offsets = [start]
+
+    with open(file_path, 'rb') as f:
+        while offsets[-1] + chunk_size < size:
+            f.seek(offsets[-1] + chunk_size)
+            f.readline()    # Move to the beginning of the next line.
+            if f.tell() >= size:
+                break
+            offsets.append(f.tell())
+
+    offsets.append(size)
+    return list(zip(offsets, offsets[1:]))
+
+def process_chunk(file_path, start, end, header, columns, part_path):
+    """
+    Rewrites the rows between two byte offsets of a GTFS file into a separate part file.
+    Returns False if a quoted field crosses the boundaries of the chunk, in which case its output is not valid.
+    """
+    quote_count = 0
+
+    def lines(f):
+        nonlocal quote_count
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            quote_count += line.count(b'"')
+            yield line.decode('utf-8')
 
-        # Read the CSV file, treating all fields as strings to prevent data type issues
-        df = pd.read_csv(file_path, dtype=str)
+    with open(file_path, 'rb') as src, open(part_path, 'w', newline='', encoding='utf-8') as dst:
+        src.seek(start)
+        writer = csv.writer(dst, lineterminator=os.linesep)
+        try:
+            writer.writerows(normalize_rows(csv.reader(lines(src)), header, columns))
+        except csv.Error:
+            return False
 
-        # Replace strings with only spaces with empty strings
-        df = df.infer_objects(copy=False).replace(r'^\s*$', '', regex=True)
+    # Quotes are balanced at every boundary only if each chunk contains an even amount of them.
+    return quote_count % 2 == 0
 
-        # Add missing optional columns
-        for col in file_columns:
-            if col not in df.columns:
-                df[col] = ''
+def merge_parts(file_path, columns, part_paths):
+    """Replaces a GTFS file with the given header followed by the contents of its processed parts."""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as dst:
+        csv.writer(dst, lineterminator=os.linesep).writerow(columns)
+        for part_path in part_paths:
+            with open(part_path, 'r', newline='', encoding='utf-8') as src:
+                shutil.copyfileobj(src, dst)
+            os.remove(part_path)
+    os.replace(tmp_path, file_path)
 
-        # Reorder the dataframe and write back to the original file
-        column_order = COLUMNS[file_name]
-        df = df[column_order]
-        df.to_csv(file_path, index=False)
-        print(f"Updated {file_name}.")
+def update_dataset(gtfs_dir, workers=None, chunk_size=CHUNK_SIZE):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Submit every chunk of every file first, so that all of them can be processed in parallel.
+        jobs = []
+        for file_name, file_columns in COLUMNS.items():
+            file_path = os.path.join(gtfs_dir, file_name)
+
+            # Skip if the file does not exist
+            if not os.path.isfile(file_path):
+                continue
+
+            header, data_start = read_header(file_path)
+            futures = [
+                pool.submit(process_chunk, file_path, start, end, header, file_columns, f"{file_path}.part{i}")
+                for i, (start, end) in enumerate(chunk_ranges(file_path, data_start, chunk_size))
+            ]
+            jobs.append((file_name, file_path, header, data_start, futures))
+
+        # Merge the parts of each file back into it, in the same order as before.
+        for file_name, file_path, header, data_start, futures in jobs:
+            file_columns = COLUMNS[file_name]
+            part_paths = [f"{file_path}.part{i}" for i in range(len(futures))]
+
+            if not all([future.result() for future in futures]):
+                # Some quoted field contains line breaks and was split, so process the file as a whole.
+                for part_path in part_paths:
+                    os.remove(part_path)
+                part_paths = [f"{file_path}.part"]
+                pool.submit(process_chunk, file_path, data_start, os.path.getsize(file_path), header, file_columns, part_paths[0]).result()
+
+            merge_parts(file_path, file_columns, part_paths)
+            print(f"Updated {file_name}.")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: process_dataset.py <gtfs_directory>")
+    parser = argparse.ArgumentParser(description="Add missing optional columns to the files of a GTFS dataset.")
+    parser.add_argument("gtfs_directory", help="The directory containing the GTFS dataset.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (defaults to the number of CPUs).")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE // (1024 * 1024), help="Size in MiB of the chunks that large files are split into.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.gtfs_directory):
+        print(f"Error: Directory not found: {args.gtfs_directory}", file=sys.stderr)
         sys.exit(1)
-    directory = sys.argv[1]
-    update_dataset(directory)
+
+    update_dataset(args.gtfs_directory, args.workers, args.chunk_size * 1024 * 1024)
@@ -0,0 +1,488 @@
+# In-process version of the modified Connection Scan Algorithm (CSA) implemented by the
+# 'earliest_arrivals' and 'shortest_path' PostgreSQL functions, meant to be imported from other scripts.
+# The network is loaded once into contiguous NumPy arrays, so each query only needs
+# a single (cached) round trip to the database to find the services of its date.
+# NOTE: The scan itself is a Python loop over the connections of the day (about 0.7 us each), so a full
+#       scan of a large feed still takes from 0.1 s to 1 s. Shortest paths are faster, since they stop at the destination.
+
+from bisect import bisect_left
+from datetime import timedelta
+import heapq
+from itertools import chain, islice
+import numpy as np
+
+# Special trip values used in the results for walks and transfers (same as in PostgreSQL).
+WALK_TRIP_IDX = -1
+TRANSFER_TRIP_IDX = -2
+
+# PostgreSQL stores intervals with microsecond precision, so all times are handled in microseconds
+# to get exactly the same arithmetic (and therefore the same comparisons) as the SQL functions.
+USECS_PER_SEC = 1_000_000
+
+def _to_usecs(time_val) -> int:
+    """Converts a timedelta or a 'HH:MM:SS' string (which may exceed 24 hours) into microseconds."""
+    if isinstance(time_val, timedelta):
+        return round(time_val.total_seconds() * USECS_PER_SEC)
+    h, m, s = time_val.split(':')
+    return round((int(h) * 3600 + int(m) * 60 + float(s)) * USECS_PER_SEC)
+
+def _to_timedelta(time_usecs: int) -> timedelta | None:
+    """Rounds a time to the nearest second, like the SQL functions do. Unreachable stops get None."""
+    if time_usecs is None:
+        return None
+    return timedelta(seconds=(time_usecs + USECS_PER_SEC // 2) // USECS_PER_SEC)
+
+def _offsets(keys: np.ndarray, size: int) -> np.ndarray:
+    """Returns the CSR offsets of an array of sorted keys, so that key k spans [offsets[k], offsets[k + 1])."""
+    return np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=size)))).astype(np.int64)
+
+def _rounded_pareto_set(journeys: list[tuple[int, int]]) -> list[tuple[timedelta, timedelta]]:
+    """
+    Rounds (departure, arrival) pairs sorted by decreasing departure and returns the ones that are still
+    Pareto-optimal, sorted by departure. Departures are rounded down, so they never become too late to catch the journey.
+    """
+    pareto_set = []
+    for departure, arrival in journeys:
+        departure, arrival = timedelta(seconds=departure // USECS_PER_SEC), _to_timedelta(arrival)
+        if pareto_set and pareto_set[-1][0] == departure:
+            pareto_set.pop()
+        if not pareto_set or arrival < pareto_set[-1][1]:
+            pareto_set.append((departure, arrival))
+    pareto_set.reverse()
+    return pareto_set
+
+class ConnectionScanner:
+    """
+    Answers reachability queries with the same semantics as the PostgreSQL functions,
+    after loading the connections and footpaths of the network into memory.
+
+    Stops and trips are identified by their serials, which are used as array indices.
+    """
+
+    def __init__(self, pg_query_runner):
+        """
+        Loads the network from PostgreSQL.
+
+        Args:
+            pg_query_runner: Function returned by the pg_query_runner context manager.
+        """
+        self._run_query = pg_query_runner
+
+        stops = pg_query_runner("SELECT serial, stop_id, stop_name, location AS stop_geom FROM stop ORDER BY serial;", ())
+        self.stop_count = len(stops)
+        size = max((row['serial'] for row in stops), default=0) + 1
+        self.stop_ids = [None] * size
+        self.stop_names = [None] * size
+        self.stop_geoms = [None] * size
+        for row in stops:
+            self.stop_ids[row['serial']] = row['stop_id']
+            self.stop_names[row['serial']] = row['stop_name']
+            self.stop_geoms[row['serial']] = row['stop_geom']
+        self.stop_serials = {stop_id: serial for serial, stop_id in enumerate(self.stop_ids) if stop_id is not None}
+
+        trips = pg_query_runner("SELECT serial, trip_id FROM trip;", ())
+        self.trip_ids = {row['serial']: row['trip_id'] for row in trips}
+
+        # Connections, sorted by departure time (times are stored as integer seconds).
+        connections = pg_query_runner('''
+            SELECT
+                trip_idx,
+                service_idx,
+                gtfs_time_seconds(departure_time) AS departure_time,
+                gtfs_time_seconds(arrival_time) AS arrival_time,
+                departure_stop_idx,
+                arrival_stop_idx
+            FROM connections
+            ORDER BY departure_time;
+        ''', ())
+        self.trip_idx = np.array([row['trip_idx'] for row in connections], dtype=np.int32)
+        self.service_idx = np.array([row['service_idx'] for row in connections], dtype=np.int32)
+        self.departure_time = np.array([row['departure_time'] for row in connections], dtype=np.int64)
+        self.arrival_time = np.array([row['arrival_time'] for row in connections], dtype=np.int64)
+        self.departure_stop_idx = np.array([row['departure_stop_idx'] for row in connections], dtype=np.int32)
+        self.arrival_stop_idx = np.array([row['arrival_stop_idx'] for row in connections], dtype=np.int32)
+
+        # Walks of each stop, sorted by distance so the walking radius can be applied while scanning them.
+        neighbors = pg_query_runner('''
+            SELECT from_stop_idx, to_stop_idx, distance_meters
+            FROM footpath
+            WHERE kind = 'walk'
+            ORDER BY from_stop_idx, distance_meters;
+        ''', ())
+        self.neighbor_offsets = _offsets(np.array([row['from_stop_idx'] for row in neighbors], dtype=np.int64), size)
+        self.neighbor_stop_idx = np.array([row['to_stop_idx'] for row in neighbors], dtype=np.int32)
+        self.neighbor_distance = np.array([row['distance_meters'] for row in neighbors], dtype=np.float64)
+
+        # Any other footpath (transfers, pathways and their closure) of each stop, sorted by time.
+        transfers = pg_query_runner('''
+            SELECT from_stop_idx, to_stop_idx, duration_secs
+            FROM footpath
+            WHERE kind <> 'walk'
+            ORDER BY from_stop_idx, duration_secs;
+        ''', ())
+        self.transfer_offsets = _offsets(np.array([row['from_stop_idx'] for row in transfers], dtype=np.int64), size)
+        self.transfer_stop_idx = np.array([row['to_stop_idx'] for row in transfers], dtype=np.int32)
+        self.transfer_time = np.array([row['duration_secs'] for row in transfers], dtype=np.int64)
+
+        # Adjacency lists as plain Python lists, which are much faster than NumPy scalars inside the scan loop.
+        self._transfer_lists = self._adjacency_lists(self.transfer_offsets, self.transfer_stop_idx, self.transfer_time * USECS_PER_SEC)
+
+        # Caches that depend on the query parameters, but not on the origin.
+        self._active_connections = {}
+        self._walk_durations = {}
+        self._connection_lists = (None, None)
+
+    @staticmethod
+    def _adjacency_lists(offsets: np.ndarray, stop_idx: np.ndarray, values: np.ndarray) -> list[list[tuple]]:
+        """Splits CSR arrays into a list (indexed by stop serial) of (stop_idx, value) lists."""
+        pairs = list(zip(stop_idx.tolist(), values.tolist()))
+        bounds = offsets.tolist()
+        return [pairs[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+    def active_connections(self, departure_date) -> np.ndarray:
+        """Returns the indices (sorted by departure time) of the connections whose service runs on the given date."""
+        key = str(departure_date)
+        if key not in self._active_connections:
+            services = self._run_query("SELECT service_idx FROM active_service_indices(%s);", (departure_date,))
+            active = np.isin(self.service_idx, np.array([row['service_idx'] for row in services], dtype=np.int32))
+            self._active_connections[key] = np.flatnonzero(active)
+        return self._active_connections[key]
+
+    def _scan_lists(self, departure_date) -> tuple[list, ...]:
+        """
+        Returns the active connections of a date as plain Python lists (departure and arrival times in microseconds,
+        departure and arrival stops and trips), which are much faster to iterate than NumPy arrays.
+        Converting them takes about as long as a scan, so only the lists of the last date are kept (they take ~200 bytes
+        per connection, unlike the arrays).
+        """
+        key = str(departure_date)
+        if self._connection_lists[0] != key:
+            active = self.active_connections(departure_date)
+            self._connection_lists = (key, (
+                (self.departure_time[active] * USECS_PER_SEC).tolist(),
+                (self.arrival_time[active] * USECS_PER_SEC).tolist(),
+                self.departure_stop_idx[active].tolist(),
+                self.arrival_stop_idx[active].tolist(),
+                self.trip_idx[active].tolist()
+            ))
+        return self._connection_lists[1]
+
+    def _walks(self, walking_speed_mps: float) -> list[list[tuple]]:
+        """Returns the neighbors of each stop as (stop_idx, distance, walking time in microseconds) tuples."""
+        key = float(walking_speed_mps)
+        if key not in self._walk_durations:
+            durations = np.rint(self.neighbor_distance / key * USECS_PER_SEC).astype(np.int64).tolist()
+            distances = self.neighbor_distance.tolist()
+            stops = self.neighbor_stop_idx.tolist()
+            bounds = self.neighbor_offsets.tolist()
+            self._walk_durations[key] = [
+                list(zip(stops[bounds[i]:bounds[i + 1]], distances[bounds[i]:bounds[i + 1]], durations[bounds[i]:bounds[i + 1]]))
+                for i in range(len(bounds) - 1)
+            ]
+        return self._walk_durations[key]
+
+    def _scan(self, origin_idx: int, departure_date, departure_time: int, max_distance_walked_meters: float,
+              walking_speed_mps: float, destination_stop_serial: int | None,
+              labels: tuple[list, list, list] | None = None, exact: bool = False) -> tuple[list, list, list]:
+        """
+        Runs the modified CSA. Returns, for each stop serial, the earliest arrival time (in microseconds,
+        None if unreachable), the previous stop and the trip used (or one of the special values).
+        The results of a scan from a later departure can be given as labels, which are updated in place.
+        Since they are reachable by waiting at the origin, only the stops they don't reach as fast get expanded.
+
+        With exact, stops are expanded as soon as they are confirmed instead of after the whole batch, so chains
+        of footpaths don't wait for the next departure time. This finds the true earliest arrival times,
+        which can be earlier than the ones of the SQL functions.
+        """
+        size = len(self.stop_ids)
+        arrival, previous_stop, trip_used = labels or ([None] * size, [None] * size, [None] * size)
+        confirmed = [False] * size
+        walks = self._walks(walking_speed_mps)
+        transfers = self._transfer_lists
+        improved_stops = []
+
+        def expand(stop_idx: int, time: int):
+            for neighbor_idx, distance, duration in walks[stop_idx]:
+                if distance > max_distance_walked_meters:
+                    break
+                new_arrival = time + duration
+                if arrival[neighbor_idx] is None or new_arrival < arrival[neighbor_idx]:
+                    arrival[neighbor_idx] = new_arrival
+                    previous_stop[neighbor_idx] = stop_idx
+                    trip_used[neighbor_idx] = WALK_TRIP_IDX
+                    improved_stops.append(neighbor_idx)
+
+            for transfer_idx, duration in transfers[stop_idx]:
+                new_arrival = time + duration
+                if arrival[transfer_idx] is None or new_arrival < arrival[transfer_idx]:
+                    arrival[transfer_idx] = new_arrival
+                    previous_stop[transfer_idx] = stop_idx
+                    trip_used[transfer_idx] = TRANSFER_TRIP_IDX
+                    improved_stops.append(transfer_idx)
+
+        # Only the connections that depart at or after the departure time are scanned (rounding it up to seconds).
+        scan_lists = self._scan_lists(departure_date)
+        first = bisect_left(scan_lists[0], -(-departure_time // USECS_PER_SEC) * USECS_PER_SEC)
+        connections = zip(*(islice(values, first, None) for values in scan_lists))
+
+        arrival[origin_idx] = departure_time
+        previous_stop[origin_idx] = None
+        trip_used[origin_idx] = None
+        improved_stops.append(origin_idx)
+        heap = []
+        confirmed_stop_count = 0
+        last_scanned_departure_time = float('-inf')
+
+        # The final sentinel guarantees that all stops reached after the last departure get expanded.
+        for conn_departure, conn_arrival, from_idx, to_idx, trip_idx in \
+                chain(connections, [(float('inf'), None, None, None, None)]):
+
+            # Earliest arrival times are "confirmed" when they become <= the current connection's departure time.
+            # As in PostgreSQL, improvements found while expanding them wait until the next departure time.
+            if last_scanned_departure_time < conn_departure:
+                for stop_idx in improved_stops:
+                    if not confirmed[stop_idx]:
+                        heapq.heappush(heap, (arrival[stop_idx], stop_idx))
+                improved_stops.clear()
+
+                confirmed_stops = []
+                while heap and heap[0][0] <= conn_departure:
+                    time, stop_idx = heapq.heappop(heap)
+                    # Skip outdated entries.
+                    if confirmed[stop_idx] or time > arrival[stop_idx]:
+                        continue
+                    confirmed[stop_idx] = True
+                    if not exact:
+                        confirmed_stops.append((stop_idx, time))
+                        continue
+
+                    expand(stop_idx, time)
+                    for improved_idx in improved_stops:
+                        heapq.heappush(heap, (arrival[improved_idx], improved_idx))
+                    improved_stops.clear()
+
+                for stop_idx, time in confirmed_stops:
+                    confirmed_stop_count += 1
+                    if confirmed_stop_count == self.stop_count or stop_idx == destination_stop_serial:
+                        return arrival, previous_stop, trip_used
+                    expand(stop_idx, time)
+
+                last_scanned_departure_time = conn_departure
+
+            # Regular connection (trip), taken if its departure stop has been reached in time.
+            if from_idx is not None and arrival[from_idx] is not None and arrival[from_idx] <= conn_departure:
+                if arrival[to_idx] is None or conn_arrival < arrival[to_idx]:
+                    arrival[to_idx] = conn_arrival
+                    previous_stop[to_idx] = from_idx
+                    trip_used[to_idx] = trip_idx
+                    improved_stops.append(to_idx)
+
+        return arrival, previous_stop, trip_used
+
+    def _trip_id(self, trip_idx: int | None) -> str | None:
+        """Translates the trip used to reach a stop into the value returned by the SQL functions."""
+        if trip_idx == WALK_TRIP_IDX:
+            return 'Walk'
+        if trip_idx == TRANSFER_TRIP_IDX:
+            return 'Transfer'
+        return self.trip_ids.get(trip_idx)
+
+    def earliest_arrivals(self, origin_stop_id: str, departure_date, departure_time,
+                          max_distance_walked_meters: float = 500, walking_speed_mps: float = 1.4,
+                          destination_stop_serial: int | None = None) -> list[dict]:
+        """
+        Finds the minimum time required to reach each stop from a given origin stop.
+        Equivalent to the 'earliest_arrivals' PostgreSQL function, with None for unreachable stops.
+
+        Args:
+            origin_stop_id (str): The ID of the starting stop.
+            departure_date (date | str): The departure date.
+            departure_time (timedelta | str): The departure time, as a timedelta or in HH:MM:SS format.
+            max_distance_walked_meters (float): Maximum distance of a single walk between stops.
+            walking_speed_mps (float): Walking speed, in meters per second.
+            destination_stop_serial (int): If given, the algorithm stops as soon as this stop is confirmed.
+
+        Returns:
+            list: Dictionaries with the same keys as the rows of the SQL function,
+                  sorted by arrival time and stop ID.
+        """
+        if origin_stop_id not in self.stop_serials:
+            raise ValueError(f"Unknown origin stop: '{origin_stop_id}'.")
+
+        arrival, previous_stop, trip_used = self._scan(
+            self.stop_serials[origin_stop_id], departure_date, _to_usecs(departure_time),
+            float(max_distance_walked_meters), float(walking_speed_mps), destination_stop_serial
+        )
+
+        order = sorted(
+            self.stop_serials.values(),
+            key=lambda idx: (arrival[idx] is None, arrival[idx] or 0, self.stop_ids[idx])
+        )
+        return [{
+            'stop_id': self.stop_ids[idx],
+            'earliest_arrival_time': _to_timedelta(arrival[idx]),
+            'previous_stop_id': self.stop_ids[previous_stop[idx]] if previous_stop[idx] is not None else None,
+            'trip_id_used': self._trip_id(trip_used[idx]),
+            'stop_geom': self.stop_geoms[idx]
+        } for idx in order]
+
+    def _footpath_times(self, origin_idx: int, max_distance_walked_meters: float, walking_speed_mps: float) -> dict[int, int]:
+        """Returns the time (in microseconds) needed to reach each stop from the origin using only footpaths."""
+        walks = self._walks(walking_speed_mps)
+        times = {origin_idx: 0}
+        heap = [(0, origin_idx)]
+        while heap:
+            time, stop_idx = heapq.heappop(heap)
+            if time > times[stop_idx]:
+                continue
+            edges = chain(
+                ((neighbor_idx, duration) for neighbor_idx, distance, duration in walks[stop_idx]
+                 if distance <= max_distance_walked_meters),
+                self._transfer_lists[stop_idx]
+            )
+            for neighbor_idx, duration in edges:
+                new_time = time + duration
+                if neighbor_idx not in times or new_time < times[neighbor_idx]:
+                    times[neighbor_idx] = new_time
+                    heapq.heappush(heap, (new_time, neighbor_idx))
+        return times
+
+    def earliest_arrival_profile(self, origin_stop_id: str, departure_date, window_start, window_end,
+                                 max_distance_walked_meters: float = 500, walking_speed_mps: float = 1.4) -> dict[str, dict]:
+        """
+        Finds, for each stop, the Pareto set of (departure, arrival) pairs of the journeys from a given origin stop
+        that leave within a departure time window (none of them departs earlier and arrives later than another one).
+
+        Instead of scanning once per departure time, the scans run from the latest departure to the earliest one
+        and keep their labels (like rRAPTOR), so each scan only expands the stops it reaches faster than the previous ones.
+        Departures are only tried when they are the last moment to catch a connection from a stop reachable
+        on foot (through any chain of walks and footpaths), plus the end of the window.
+        The scans are exact (see _scan), so for any departure in the window the profile is never later than
+        earliest_arrivals, and it can be earlier when the batches of the latter delay a chain of footpaths.
+
+        Args:
+            origin_stop_id (str): The ID of the starting stop.
+            departure_date (date | str): The departure date.
+            window_start (timedelta | str): Earliest departure time, as a timedelta or in HH:MM:SS format.
+            window_end (timedelta | str): Latest departure time, as a timedelta or in HH:MM:SS format.
+            max_distance_walked_meters (float): Maximum distance of a single walk between stops.
+            walking_speed_mps (float): Walking speed, in meters per second.
+
+        Returns:
+            dict: For each stop ID, a dictionary with:
+                  - 'walking_time': Time needed to walk there from the origin (None if it can't be walked to).
+                  - 'journeys': (departure, arrival) pairs of the other journeys, sorted by departure.
+                  Use profile_arrival_time() and travel_time_percentiles() to evaluate it.
+        """
+        if origin_stop_id not in self.stop_serials:
+            raise ValueError(f"Unknown origin stop: '{origin_stop_id}'.")
+        origin_idx = self.stop_serials[origin_stop_id]
+        start, end = _to_usecs(window_start), _to_usecs(window_end)
+        max_distance_walked_meters, walking_speed_mps = float(max_distance_walked_meters), float(walking_speed_mps)
+
+        walking = self._footpath_times(origin_idx, max_distance_walked_meters, walking_speed_mps)
+
+        # Candidate departures: the last moment to leave the origin in order to catch each connection reachable on foot.
+        footpath_time = np.full(len(self.stop_ids), -1, dtype=np.int64)
+        for stop_idx, time in walking.items():
+            footpath_time[stop_idx] = time
+        active = self.active_connections(departure_date)
+        connection_footpath_time = footpath_time[self.departure_stop_idx[active]]
+        departures = self.departure_time[active] * USECS_PER_SEC - connection_footpath_time
+        departures = departures[(connection_footpath_time >= 0) & (departures >= start) & (departures <= end)]
+        candidates = sorted(set(departures.tolist()) | {end}, reverse=True)
+
+        size = len(self.stop_ids)
+        labels = ([None] * size, [None] * size, [None] * size)
+        journeys = [[] for _ in range(size)]
+        for departure in candidates:
+            previous_arrival = labels[0].copy()
+            self._scan(origin_idx, departure_date, departure, max_distance_walked_meters, walking_speed_mps, None, labels, exact=True)
+
+            # Labels only decrease, so every change is a journey that departs earlier and arrives earlier.
+            # Journeys that only walk are already described by the walking time.
+            for idx, arrival in enumerate(labels[0]):
+                if arrival is not None and arrival != previous_arrival[idx] and arrival - departure != walking.get(idx):
+                    journeys[idx].append((departure, arrival))
+
+        return {
+            self.stop_ids[idx]: {
+                'walking_time': _to_timedelta(walking.get(idx)),
+                'journeys': _rounded_pareto_set(journeys[idx])
+            }
+            for idx in self.stop_serials.values()
+        }
+
+    def shortest_path(self, origin_stop_id: str, destination_stop_id: str, departure_date, departure_time,
+                      max_distance_walked_meters: float = 500, walking_speed_mps: float = 1.4) -> list[dict]:
+        """
+        Finds the fastest path between two stops.
+        Equivalent to the 'shortest_path' PostgreSQL function.
+
+        Returns:
+            list: The stops of the path (from the origin to the destination) as dictionaries
+                  with the same keys as the rows of the SQL function.
+        """
+        if origin_stop_id not in self.stop_serials:
+            raise ValueError(f"Unknown origin stop: '{origin_stop_id}'.")
+        destination_idx = self.stop_serials.get(destination_stop_id)
+        if destination_idx is None:
+            return []
+
+        arrival, previous_stop, trip_used = self._scan(
+            self.stop_serials[origin_stop_id], departure_date, _to_usecs(departure_time),
+            float(max_distance_walked_meters), float(walking_speed_mps), destination_idx
+        )
+
+        # Walk back from the destination through the previous stops.
+        path = []
+        idx = destination_idx
+        while idx is not None:
+            path.append({
+                'stop_id': self.stop_ids[idx],
+                'stop_name': self.stop_names[idx],
+                'trip_id': self._trip_id(trip_used[idx]),
+                'arrival_time': _to_timedelta(arrival[idx]),
+                'stop_geom': self.stop_geoms[idx]
+            })
+            idx = previous_stop[idx]
+        path.reverse()
+        return path
+
+def profile_arrival_time(profile_entry: dict, departure_time) -> timedelta | None:
+    """
+    Returns the earliest arrival time at a stop when leaving the origin at the given time,
+    according to its entry in a profile. The departure time must be within the window of the profile.
+    """
+    departure = timedelta(microseconds=_to_usecs(departure_time))
+    journeys = profile_entry['journeys']
+    arrivals = []
+    # Arrivals of a Pareto set increase with the departures, so the first journey that can be caught is the fastest.
+    i = bisect_left(journeys, departure, key=lambda journey: journey[0])
+    if i < len(journeys):
+        arrivals.append(journeys[i][1])
+    if profile_entry['walking_time'] is not None:
+        arrivals.append(departure + profile_entry['walking_time'])
+    return min(arrivals, default=None)
+
+def travel_time_percentiles(profile_entry: dict, window_start, window_end, percentiles: list[float],
+                            step: timedelta = timedelta(minutes=1)) -> list[timedelta | None]:
+    """
+    Computes percentiles (0-100) of the travel time to a stop, for departures every 'step' within the window.
+    A percentile is None if the stop can't be reached for that share of the departures.
+    """
+    start, end = timedelta(microseconds=_to_usecs(window_start)), timedelta(microseconds=_to_usecs(window_end))
+    travel_times = []
+    departure = start
+    while departure <= end:
+        arrival = profile_arrival_time(profile_entry, departure)
+        travel_times.append((arrival - departure).total_seconds() if arrival is not None else np.inf)
+        departure += step
+
+    # Percentiles are taken from the samples (without interpolation), since some of them may be infinite.
+    values = np.percentile(travel_times, percentiles, method='inverted_cdf')
+    return [timedelta(seconds=float(value)) if np.isfinite(value) else None for value in values]
+
+def median_travel_time(profile_entry: dict, window_start, window_end, step: timedelta = timedelta(minutes=1)) -> timedelta | None:
+    """Computes the median travel time to a stop, for departures every 'step' within the window."""
+    return travel_time_percentiles(profile_entry, window_start, window_end, [50], step)[0]
@@ -20,27 +20,17 @@ except ImportError as e:
     sys.exit(1)
 
 
-def main():
+# Grid sizes precomputed during the import (see 'refresh_stop_density_grid' in queries.sql).
+DEFAULT_GRID_SIZES = [250, 500, 1000, 2000, 4000]
+
+def load_grid(runner, grid_size):
     """
-    Main function to run the stop_density_heatmap query and plot results
-    on an interactive map.
+    Runs the stop_density_heatmap query for a grid size and returns its hexagons as a GeoDataFrame.
+    Only hexagons that contain stops are returned by the query.
     """
-    parser = argparse.ArgumentParser(
-        description="Generates an interactive heatmap of public transit stop density."
-    )
-    parser.add_argument("--grid_size", type=int, required=True, help="The size of the hexagon grid cells in meters.")
-    parser.add_argument("--output", type=str, default="stop_density_heatmap.html", help="Path to save the output map HTML file.")
-    args = parser.parse_args()
-
-    # Fetch data using the query runner
-    heatmap_data = []
-    print(f"Fetching stop density data using a {args.grid_size}m grid...")
-    with pg_query_runner() as runner:
-        heatmap_data = runner(QUERIES['postgres']['stop_density_heatmap'], (args.grid_size,))
-
+    heatmap_data = runner(QUERIES['postgres']['stop_density_heatmap'], (grid_size,))
     if not heatmap_data:
-        print("No data was returned from the query to plot.")
-        return
+        return None
 
     # Prepare the data for plotting
     df = pd.DataFrame(heatmap_data)
@@ -50,53 +40,74 @@ def main():
 
     gdf = gpd.GeoDataFrame(df, geometry=geometry)
 
-    # Filter out hexagons with no stops. They are returned by the query's
-    # LEFT JOIN but are not useful for a heatmap visualization.
-    gdf = gdf[gdf['stop_count'] > 0].copy()
-
-    if gdf.empty:
-        print("No stops were found. Cannot generate a map.")
-        return
-
-    print(f"Successfully loaded {len(gdf)} hexagons with stops.")
-
-    # Create an interactive map
-    map_center = [gdf.union_all().centroid.y, gdf.union_all().centroid.x]
-    m = folium.Map(location=map_center, zoom_start=12, tiles="CartoDB.Positron")
-
-    # Create and add the Choropleth (Heatmap) Layer
-
     # First, reset the index to turn it into a column that Folium can find.
     # This creates a new column, typically named 'index'.
     gdf.reset_index(inplace=True)
+    return gdf
 
-    folium.Choropleth(
-        geo_data=gdf,
-        name='Stop Density',
-        data=gdf,
-        columns=['index', 'stop_count'], # Use index for key, 'stop_count' for value
-        key_on='feature.id',                    # Link to the feature's ID (which is the index)
-        fill_color='YlOrRd',
-        fill_opacity=0.3,
-        line_opacity=0.1,
-        legend_name='Number of Stops per Hexagon',
-        highlight=True, # Adds a nice highlight effect on hover
-    ).add_to(m)
-
-    # Add a separate layer for tooltips for a better user experience
-    tooltip = folium.GeoJsonTooltip(
-        fields=['stop_count'],
-        aliases=['Stops in this area:'],
-        sticky=True
+def main():
+    """
+    Main function to run the stop_density_heatmap query and plot results
+    on an interactive map, with a layer for each grid size.
+    """
+    parser = argparse.ArgumentParser(
+        description="Generates an interactive heatmap of public transit stop density."
     )
-    folium.GeoJson(
-        gdf,
-        style_function=lambda x: {'fillOpacity': 0, 'weight': 0}, # Invisible layer
-        tooltip=tooltip
-    ).add_to(m)
+    parser.add_argument("--grid_size", type=int, nargs='+', default=DEFAULT_GRID_SIZES, help="The sizes of the hexagon grid cells in meters. Each size gets its own layer on the map.")
+    parser.add_argument("--output", type=str, default="stop_density_heatmap.html", help="Path to save the output map HTML file.")
+    args = parser.parse_args()
+
+    # Fetch data using the query runner
+    grids = {}
+    with pg_query_runner() as runner:
+        for grid_size in args.grid_size:
+            print(f"Fetching stop density data using a {grid_size}m grid...")
+            gdf = load_grid(runner, grid_size)
+            if gdf is not None:
+                grids[grid_size] = gdf
+                print(f"Successfully loaded {len(gdf)} hexagons with stops.")
+
+    if not grids:
+        print("No stops were found. Cannot generate a map.")
+        return
+
+    # Create an interactive map
+    # The tiles are added separately so that they don't appear in the layer control.
+    first_gdf = next(iter(grids.values()))
+    map_center = [first_gdf.union_all().centroid.y, first_gdf.union_all().centroid.x]
+    m = folium.Map(location=map_center, zoom_start=12, tiles=None)
+    folium.TileLayer("CartoDB.Positron", control=False).add_to(m)
+
+    # Create and add a Choropleth (Heatmap) Layer for each grid size.
+    # They are base layers, so only one of them is shown at a time.
+    for i, (grid_size, gdf) in enumerate(grids.items()):
+        choropleth = folium.Choropleth(
+            geo_data=gdf,
+            name=f'Stop Density ({grid_size} m)',
+            data=gdf,
+            columns=['index', 'stop_count'], # Use index for key, 'stop_count' for value
+            key_on='feature.id',                    # Link to the feature's ID (which is the index)
+            fill_color='YlOrRd',
+            fill_opacity=0.3,
+            line_opacity=0.1,
+            legend_name=f'Number of Stops per Hexagon ({grid_size} m)',
+            highlight=True, # Adds a nice highlight effect on hover
+            overlay=False,
+            show=(i == 0)
+        )
+
+        # Add tooltips to the layer itself, so that they follow the selected grid size.
+        folium.GeoJsonTooltip(
+            fields=['stop_count'],
+            aliases=['Stops in this area:'],
+            sticky=True
+        ).add_to(choropleth.geojson)
+        choropleth.add_to(m)
+
+    folium.LayerControl(collapsed=False).add_to(m)
 
     # Fit the map's view to the bounds of the hexagons
-    m.fit_bounds(gdf.total_bounds.tolist())
+    m.fit_bounds(first_gdf.total_bounds.tolist())
 
     # Save the map to an HTML file
     m.save(args.output)
@@ -2,7 +2,7 @@
 
 import argparse
 import sys
-from database import pg_query_runner, QUERIES
+from database import pg_query_runner, stops_within_distance_batch
 from colors import ACCENT_PRIMARY
 
 import random
@@ -22,15 +22,13 @@ except ImportError as e:
     print(f"Error: A required library is not installed. Please install it using 'pip install folium'. Missing: {e.name}", file=sys.stderr)
     sys.exit(1)
 
-try:
-    from haversine import haversine, Unit
-except ImportError as e:
-    print(f"Error: A required library is not installed. Please install it using 'pip install haversine'. Missing: {e.name}", file=sys.stderr)
-    sys.exit(1)
-
 def generate_dispersed_points(center_lat, center_lon, radius_km, num_points, min_separation_km):
     """
     Generates random points that are guaranteed to be at least a minimum distance apart.
+
+    Accepted points are stored in a grid whose cells are small enough to hold at most one
+    point each, so every candidate is only checked against its neighbouring cells
+    instead of against all the accepted points.
     """
     points = []
     # Earth's radius in meters for coordinate calculation
@@ -38,35 +36,41 @@ def generate_dispersed_points(center_lat, center_lon, radius_km, num_points, min
     # Safety break to prevent infinite loops if parameters are impossible
     max_attempts = num_points * 100
 
+    min_separation = min_separation_km * 1000
+    # A cell's diagonal equals the minimum separation, so no two points can share a cell...
+    cell_size = min_separation / np.sqrt(2)
+    # ...and any conflicting point must lie within two cells in each direction.
+    grid = {}
+
     for i in range(max_attempts):
         # Stop once we have enough points
         if len(points) >= num_points:
             break
 
-        # 1. Generate a candidate point randomly within the circle
+        # 1. Generate a candidate point randomly within the circle (meters from the center)
         r = (radius_km * 1000) * np.sqrt(random.random())
         theta = random.random() * 2 * np.pi
         dx = r * np.cos(theta)
         dy = r * np.sin(theta)
 
-        candidate_lat = center_lat + (dy / earth_radius) * (180 / np.pi)
-        candidate_lon = center_lon + (dx / earth_radius) * (180 / np.pi) / np.cos(center_lat * np.pi / 180)
-
-        candidate_point_coords = (candidate_lat, candidate_lon)
-
-        # 2. Check if the candidate is far enough from all accepted points
-        is_valid = True
-        for p in points:
-            existing_point_coords = (p['lat'], p['lon'])
-            distance = haversine(candidate_point_coords, existing_point_coords, unit=Unit.KILOMETERS)
-
-            if distance < min_separation_km:
-                is_valid = False
-                break # It's too close, no need to check others
+        # 2. Check if the candidate is far enough from the accepted points in nearby cells
+        if min_separation > 0:
+            cell = (int(np.floor(dx / cell_size)), int(np.floor(dy / cell_size)))
+            is_valid = all(
+                np.hypot(dx - grid[neighbour][0], dy - grid[neighbour][1]) >= min_separation
+                for neighbour in (
+                    (cell[0] + di, cell[1] + dj) for di in range(-2, 3) for dj in range(-2, 3)
+                )
+                if neighbour in grid
+            )
+            if not is_valid:
+                continue
+            grid[cell] = (dx, dy)
 
         # 3. If it's valid, accept it
-        if is_valid:
-            points.append({'lat': candidate_lat, 'lon': candidate_lon})
+        candidate_lat = center_lat + (dy / earth_radius) * (180 / np.pi)
+        candidate_lon = center_lon + (dx / earth_radius) * (180 / np.pi) / np.cos(center_lat * np.pi / 180)
+        points.append({'lat': candidate_lat, 'lon': candidate_lon})
 
     if len(points) < num_points:
         print(f"Warning: Could only generate {len(points)}/{num_points} points with the given separation distance.", file=sys.stderr)
@@ -96,22 +100,19 @@ def main():
     # 1. Generate random points to search from
     random_origins = generate_dispersed_points(args.latitude, args.longitude, args.generation_radius, args.num_points, args.min_separation)
 
+    for origin in random_origins:
+        origin['radius'] = random.randint(args.min_search_radius, args.max_search_radius)
+        print(f"Searching at ({origin['lat']:.4f}, {origin['lon']:.4f}) with radius {origin['radius']:.0f}m...")
+        all_origins.append(origin)
+
     with pg_query_runner() as runner:
-        # 2. Loop through each generated point and find nearby stops
-        for origin in random_origins:
-            origin['radius'] = random.randint(args.min_search_radius, args.max_search_radius)
-            print(f"Searching at ({origin['lat']:.4f}, {origin['lon']:.4f}) with radius {origin['radius']:.0f}m...")
-            all_origins.append(origin)
-
-            results = runner(
-                QUERIES['postgres']['stops_within_distance'],
-                (origin['lat'], origin['lon'], origin['radius'])
-            )
+        # 2. Find the stops near every generated point in a single round trip
+        for results in stops_within_distance_batch(runner, all_origins):
             for stop in results:
                 # 3. Store by id to keep the dataset small and avoid overplotting
                 all_stops[stop['id']] = stop
 
-            print(f"\nTotal unique stops found: {len(all_stops)}")
+        print(f"\nTotal unique stops found: {len(all_stops)}")
 
     # Create an interactive map with Folium
     if not all_origins:
@@ -84,10 +84,11 @@ def test_stop_time_booking_rules_consistency(pg_query_runner, neo4j_query_runner
 
     # PostgreSQL: Get all stop_time entries that have a booking rule.
     pg_query = """
-        SELECT trip_id, stop_sequence, pickup_booking_rule_id, drop_off_booking_rule_id
-        FROM stop_time
-        WHERE pickup_booking_rule_id IS NOT NULL OR drop_off_booking_rule_id IS NOT NULL
-        ORDER BY trip_id, stop_sequence;
+        SELECT t.trip_id, st.stop_sequence, st.pickup_booking_rule_id, st.drop_off_booking_rule_id
+        FROM stop_time st
+        JOIN trip t ON st.trip_idx = t.serial
+        WHERE st.pickup_booking_rule_id IS NOT NULL OR st.drop_off_booking_rule_id IS NOT NULL
+        ORDER BY t.trip_id, st.stop_sequence;
     """
     pg_data = pg_query_runner(pg_query, ())
 
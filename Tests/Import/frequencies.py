@@ -10,11 +10,12 @@ def test_frequency_data_consistency(pg_query_runner, neo4j_query_runner):
 
     # PostgreSQL: Join with the enum table to get the string representation of exact_times.
     # The schema references a table named 'service_type' for this.
+    # Times are converted to intervals, since they may be stored as seconds.
     pg_query = """
         SELECT
             f.trip_id,
-            f.start_time,
-            f.end_time,
+            gtfs_time_interval(f.start_time) AS start_time,
+            gtfs_time_interval(f.end_time) AS end_time,
             f.headway_secs,
             tp.name AS exact_times_str
         FROM frequency f
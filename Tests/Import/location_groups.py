@@ -49,9 +49,11 @@ def test_stop_time_location_group_consistency(pg_query_runner, neo4j_query_runne
 
     # PostgreSQL: Get all stop_time entries that have a location_group_id.
     pg_query = """
-        SELECT trip_id, stop_sequence, location_group_id FROM stop_time
-        WHERE location_group_id IS NOT NULL
-        ORDER BY trip_id, stop_sequence;
+        SELECT t.trip_id, st.stop_sequence, st.location_group_id
+        FROM stop_time st
+        JOIN trip t ON st.trip_idx = t.serial
+        WHERE st.location_group_id IS NOT NULL
+        ORDER BY t.trip_id, st.stop_sequence;
     """
     pg_data = pg_query_runner(pg_query, ())
 
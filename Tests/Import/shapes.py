@@ -83,3 +83,57 @@ def test_trip_shape_consistency(pg_query_runner, neo4j_query_runner):
 
     assert pg_tuples[0:10000] == neo4j_tuples[0:10000], "Full data comparison failed for trip->shape links."
     print("Full data consistency check passed for trip to shape links.")
+
+
+def test_shape_metrics_consistency(pg_query_runner, neo4j_query_runner):
+    """
+    CROSS-VALIDATION: Verifies that the shape metrics computed during the import
+    (length, distance between both ends and bounding box) are equivalent in both databases.
+    """
+    print("\nPerforming consistency check for shape metrics...")
+
+    # PostgreSQL: Distances are measured on a sphere, like Neo4J does.
+    pg_query = """
+        SELECT
+            shape_id,
+            length_meters,
+            endpoints_distance_meters,
+            ST_XMin(bbox) AS min_lon,
+            ST_YMin(bbox) AS min_lat,
+            ST_XMax(bbox) AS max_lon,
+            ST_YMax(bbox) AS max_lat
+        FROM shape;
+    """
+    pg_data = pg_query_runner(pg_query, ())
+
+    neo4j_query = """
+        MATCH (s:Shape)
+        RETURN
+            s.id AS shape_id,
+            s.length_meters AS length_meters,
+            s.endpoints_distance_meters AS endpoints_distance_meters,
+            s.min_lon AS min_lon,
+            s.min_lat AS min_lat,
+            s.max_lon AS max_lon,
+            s.max_lat AS max_lat;
+    """
+    neo4j_data = neo4j_query_runner(neo4j_query, {})
+
+    pg_count = len(pg_data)
+    neo4j_count = len(neo4j_data)
+
+    assert pg_count == neo4j_count, f"Count mismatch for shape metrics: PostgreSQL has {pg_count}, Neo4J has {neo4j_count}."
+
+    # Both engines collate ids differently, so sort them here.
+    pg_data = sorted(pg_data, key=lambda row: row['shape_id'])
+    neo4j_data = sorted(neo4j_data, key=lambda row: row['shape_id'])
+
+    for pg, neo4j in zip(pg_data, neo4j_data):
+        assert pg['shape_id'] == neo4j['shape_id'], f"Shape mismatch: {pg['shape_id']} != {neo4j['shape_id']}."
+        # Both engines use slightly different Earth radii, so allow a small relative difference.
+        assert pg['length_meters'] == pytest.approx(neo4j['length_meters'], rel=1e-3), f"Length mismatch for shape {pg['shape_id']}."
+        assert pg['endpoints_distance_meters'] == pytest.approx(neo4j['endpoints_distance_meters'], rel=1e-3, abs=1e-3), \
+            f"Endpoints distance mismatch for shape {pg['shape_id']}."
+        for key in ('min_lon', 'min_lat', 'max_lon', 'max_lat'):
+            assert pg[key] == pytest.approx(neo4j[key], abs=1e-6), f"Bounding box mismatch ({key}) for shape {pg['shape_id']}."
+    print("Consistency check passed for shape metrics.")
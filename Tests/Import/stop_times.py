@@ -9,18 +9,19 @@ def test_stop_time_data_consistency(pg_query_runner, neo4j_query_runner):
     print("\nPerforming full data consistency check for stop times...")
 
     # PostgreSQL: Join with all enum tables to get their string representations.
+    # Times are converted to intervals, since they may be stored as seconds.
     pg_query = """
         SELECT
-            st.trip_id,
-            st.arrival_time,
-            st.departure_time,
-            st.stop_id,
+            t.trip_id,
+            gtfs_time_interval(st.arrival_time) AS arrival_time,
+            gtfs_time_interval(st.departure_time) AS departure_time,
+            s.stop_id,
             st.location_group_id,
             st.location_id,
             st.stop_sequence,
             st.stop_headsign,
-            st.start_pickup_drop_off_window,
-            st.end_pickup_drop_off_window,
+            gtfs_time_interval(st.start_pickup_drop_off_window) AS start_pickup_drop_off_window,
+            gtfs_time_interval(st.end_pickup_drop_off_window) AS end_pickup_drop_off_window,
             pt.name AS pickup_type_str,
             dt.name AS drop_off_type_str,
             cp.name AS continuous_pickup_str,
@@ -30,7 +31,9 @@ def test_stop_time_data_consistency(pg_query_runner, neo4j_query_runner):
             st.pickup_booking_rule_id,
             st.drop_off_booking_rule_id
         FROM stop_time st
+        JOIN trip t ON st.trip_idx = t.serial
         -- LEFT JOINs are crucial here as many of these fields can be NULL
+        LEFT JOIN stop s ON st.stop_idx = s.serial
         LEFT JOIN stop_method pt ON st.pickup_type = pt.id
         LEFT JOIN stop_method dt ON st.drop_off_type = dt.id
         LEFT JOIN continuous_status cp ON st.continuous_pickup = cp.id
@@ -26,6 +26,7 @@ from Scripts import database
 
 # Re-export queries for test files.
 QUERIES = database.QUERIES
+RECOMPUTED_QUERIES = database.RECOMPUTED_QUERIES
 
 # File to store execution times for all queries.
 QUERY_PERFORMANCE_FILE = "query_performance.json"
@@ -71,6 +72,19 @@ def random_point_in_bbox(bbox: dict) -> tuple[float, float]:
     random_lon = random.uniform(bbox['min_lon'], bbox['max_lon'])
     return (random_lat, random_lon)
 
+def random_date_range(service_date_range: dict, max_days: int) -> tuple:
+    """Generates a random (start_date, end_date) tuple of up to max_days days, starting within the service period."""
+    date_range_days = (service_date_range['max_date'] - service_date_range['min_date']).days
+    start_date = service_date_range['min_date'] + timedelta(days=random.randint(0, date_range_days))
+    return (start_date, start_date + timedelta(days=random.randint(0, max_days - 1)))
+
+def canonical_rows(rows: list[dict]) -> list[str]:
+    """
+    Converts query results into a sorted list of strings, ignoring their service date and the order of their columns.
+    Used to compare the results of the date range queries with the single-date ones.
+    """
+    return sorted(str(sorted((k, v) for k, v in row.items() if k != 'service_date')) for row in rows)
+
 def random_stop_id(pg_query_runner):
     """Fetches a random, valid stop_id from the database."""
     try:
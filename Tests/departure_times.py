@@ -19,9 +19,10 @@ def get_random_route_stop_pair(pg_query_runner):
     # then gets its route_id and a random stop_id associated with that trip.
     # This ensures the route and stop are a valid pair.
     query = """
-        SELECT t.route_id, st.stop_id
+        SELECT t.route_id, s.stop_id
         FROM stop_time st
-        JOIN trip t ON st.trip_id = t.trip_id
+        JOIN trip t ON st.trip_idx = t.serial
+        JOIN stop s ON st.stop_idx = s.serial
         ORDER BY RANDOM()
         LIMIT 1;
     """
@@ -0,0 +1,119 @@
+import pytest
+from conftest import RANDOM_SLOW_TEST_COUNT, RANDOM_SEED, random_stop_id
+from datetime import timedelta
+import random
+
+from Scripts import routing
+
+# Test parameters. The footpaths are built with a larger radius than the one walked by the queries, so a footpath
+# that absorbed a walk would let them walk further than allowed.
+FOOTPATH_RADIUS_METERS = 1000
+WALKING_SPEED_MPS = 1.4
+MAX_DISTANCE_WALKED_METERS = 300
+
+# Query statements. The footpaths are rebuilt inside a savepoint, which is rolled back at the end of the test.
+# They are sent without parameters, since statements with parameters can't be combined.
+BUILD_SQL = '''
+    SAVEPOINT footpaths;
+    CALL build_footpaths({radius}, {speed}, {transitive});
+    SELECT kind, edge_count, footpath_size() AS size FROM footpath_stats();
+'''
+ROLLBACK_SQL = '''
+    ROLLBACK TO SAVEPOINT footpaths;
+    SELECT 1;
+'''
+EARLIEST_ARRIVALS_SQL = '''
+    SELECT stop_id, NULLIF(earliest_arrival_time, 'infinity') AS earliest_arrival_time, previous_stop_id, trip_id_used
+    FROM earliest_arrivals(%s, %s, %s, %s, %s);
+'''
+# Walks used by a route, with the shortest distance between their stops.
+WALK_DISTANCES_SQL = '''
+    SELECT prev.stop_id AS from_stop_id, s.stop_id AS to_stop_id, MIN(fp.distance_meters) AS distance_meters
+    FROM unnest(%s::TEXT[], %s::TEXT[]) AS leg(from_stop_id, to_stop_id)
+    JOIN stop prev ON prev.stop_id = leg.from_stop_id
+    JOIN stop s ON s.stop_id = leg.to_stop_id
+    LEFT JOIN footpath fp ON fp.from_stop_idx = prev.serial AND fp.to_stop_idx = s.serial AND fp.kind = 'walk'
+    GROUP BY prev.stop_id, s.stop_id;
+'''
+# Whether the fastest footpath between two stops can also be followed only through transfers and pathways.
+WALK_FREE_TRANSFER_SQL = '''
+    WITH RECURSIVE edge AS (
+        SELECT fp.from_stop_idx, fp.to_stop_idx, fp.duration_secs
+        FROM footpath fp
+        JOIN stop prev ON prev.serial = fp.from_stop_idx
+        JOIN stop s ON s.serial = fp.to_stop_idx
+        WHERE prev.stop_id = %s AND s.stop_id = %s AND fp.kind <> 'walk'
+        ORDER BY fp.duration_secs
+        LIMIT 1
+    ),
+    reach(stop_idx, duration_secs) AS (
+        SELECT from_stop_idx, 0 FROM edge
+        UNION
+        SELECT fp.to_stop_idx, r.duration_secs + fp.duration_secs
+        FROM reach r
+        JOIN footpath fp ON fp.from_stop_idx = r.stop_idx
+        WHERE fp.kind IN ('transfer', 'pathway')
+          AND r.duration_secs + fp.duration_secs <= (SELECT duration_secs FROM edge)
+    )
+    SELECT EXISTS (SELECT 1 FROM reach r, edge e WHERE r.stop_idx = e.to_stop_idx) AS walk_free;
+'''
+
+random.seed(RANDOM_SEED)
+
+def random_departure(service_date_range) -> tuple:
+    """Generates a random (date, 'HH:MM:SS') departure within the service period."""
+    date_range_days = (service_date_range['max_date'] - service_date_range['min_date']).days
+    departure_date = service_date_range['min_date'] + timedelta(days=random.randint(0, date_range_days))
+    departure_time = f"{random.randint(5, 23):02}:{random.randint(0, 59):02}:{random.randint(0, 59):02}"
+    return (departure_date, departure_time)
+
+def check_legs(pg_query_runner, results: list):
+    """
+    Asserts that every walk of the results stays within the walking distance of the query, and that every transfer
+    can be followed without walking.
+    """
+    walks = [(row['previous_stop_id'], row['stop_id']) for row in results if row['trip_id_used'] == 'Walk']
+    if walks:
+        distances = pg_query_runner(WALK_DISTANCES_SQL, ([leg[0] for leg in walks], [leg[1] for leg in walks]))
+        for row in distances:
+            assert row['distance_meters'] is not None and row['distance_meters'] <= MAX_DISTANCE_WALKED_METERS, \
+                f"Walk longer than {MAX_DISTANCE_WALKED_METERS} m: {row}"
+
+    for row in results:
+        if row['trip_id_used'] == 'Transfer':
+            walk_free = pg_query_runner(WALK_FREE_TRANSFER_SQL, (row['previous_stop_id'], row['stop_id']))[0]['walk_free']
+            assert walk_free, f"Transfer from '{row['previous_stop_id']}' to '{row['stop_id']}' includes a walk."
+
+@pytest.mark.parametrize("transitive", [False, True])
+def test_build_footpaths(pg_query_runner, service_date_range, transitive):
+    """
+    PLAUSIBILITY: Rebuilding the footpaths must only add transitive ones when asked to, and routes over them must
+    never walk further than the query allows, in either engine.
+    """
+    print(f"\nTesting 'build_footpaths' (transitive: {transitive}, {RANDOM_SLOW_TEST_COUNT} iterations).")
+
+    assert service_date_range is not None, "Test setup failed: Service date range could not be determined."
+
+    stats = pg_query_runner(BUILD_SQL.format(
+        radius=FOOTPATH_RADIUS_METERS, speed=WALKING_SPEED_MPS, transitive='true' if transitive else 'false'
+    ), None)
+    try:
+        kinds = {row['kind']: row['edge_count'] for row in stats}
+        print(f"  Footpaths: {kinds}, {stats[0]['size'] if stats else 0} bytes.")
+        assert kinds and all(count > 0 for count in kinds.values()), f"Empty footpath kinds: {kinds}"
+        assert kinds.keys() <= {'walk', 'transfer', 'pathway', 'transitive'}, f"Unknown footpath kinds: {kinds}"
+        assert transitive or 'transitive' not in kinds, f"Transitive footpaths built without asking for them: {kinds}"
+        assert stats[0]['size'] > 0
+
+        # The scanner loads the footpaths rebuilt by this session.
+        scanner = routing.ConnectionScanner(pg_query_runner)
+        for i in range(RANDOM_SLOW_TEST_COUNT):
+            stop_id = random_stop_id(pg_query_runner)
+            departure_date, departure_time = random_departure(service_date_range)
+            print(f"\n[{i+1}/{RANDOM_SLOW_TEST_COUNT}] Testing stop: '{stop_id}', date: {departure_date}, time: {departure_time}")
+
+            params = (stop_id, departure_date, departure_time, MAX_DISTANCE_WALKED_METERS, WALKING_SPEED_MPS)
+            check_legs(pg_query_runner, pg_query_runner(EARLIEST_ARRIVALS_SQL, params))
+            check_legs(pg_query_runner, scanner.earliest_arrivals(*params))
+    finally:
+        pg_query_runner(ROLLBACK_SQL, None)
@@ -0,0 +1,165 @@
+import pytest
+from conftest import run_test_case as rtc, random_date_range, canonical_rows, RANDOM_SLOW_TEST_COUNT, RANDOM_SEED, to_canonical_time_str, time_str_to_seconds, QUERIES
+from hypothesis import given, strategies as st, settings
+from datetime import date, timedelta
+import random
+
+# Test parameters.
+MAX_RANGE_DAYS = 14
+
+# Query statements with format specifiers to fill.
+SQL = QUERIES['postgres']['headway_stats_range']
+CYPHER = QUERIES['neo4j']['headway_stats_range']
+SINGLE_DATE_SQL = QUERIES['postgres']['headway_stats']
+SINGLE_DATE_CYPHER = QUERIES['neo4j']['headway_stats']
+
+random.seed(RANDOM_SEED)
+
+# Run test case.
+def run_test_case(pg_query_runner, neo4j_query_runner, start_date: date, end_date: date) -> list:
+    """
+    Calls the generic run_test_case function with parameters for the headway_stats_range query.
+    """
+
+    # Plausibility checks.
+    def dates_in_range(results):
+        """Asserts that every result belongs to a date of the range."""
+        for row in results:
+            assert start_date <= row[0] <= end_date, f"Found a date outside of the range: {row}"
+
+    def stats_are_logical(results):
+        """Asserts that for each row, min_headway <= median_headway <= max_headway."""
+        for row in results:
+            service_date, route, min_h, med_h, max_h, _ = row
+            assert min_h <= med_h, f"Inconsistency in route '{route}' on {service_date}: min_headway '{min_h}' is greater than median_headway '{med_h}'."
+            assert med_h <= max_h, f"Inconsistency in route '{route}' on {service_date}: median_headway '{med_h}' is greater than max_headway '{max_h}'."
+
+    return rtc(
+        pg_query_runner,
+        neo4j_query_runner,
+        SQL,
+        CYPHER,
+        (start_date, end_date),
+        {'start_date': str(start_date), 'end_date': str(end_date)},
+        # Extract and normalize results from PostgreSQL.
+        lambda pg_results: [(
+            row['service_date'],
+            row['route_name'],
+            to_canonical_time_str(row['min_headway']),
+            to_canonical_time_str(row['median_headway']),
+            to_canonical_time_str(row['max_headway']),
+            int(row['stddev_seconds'])
+        ) for row in pg_results],
+        # Extract and normalize results from Neo4j.
+        lambda neo4j_results: [(
+            res['value']['service_date'],
+            res['value']['route_name'],
+            res['value']['min_headway'],
+            res['value']['median_headway'],
+            res['value']['max_headway'],
+            int(res['value']['stddev_seconds'])
+        ) for res in neo4j_results],
+        plausibility_checks=[dates_in_range, stats_are_logical],
+        result_name="headway statistics",
+        # Allow a 1 second difference for rounding errors in headways.
+        comparison_function=lambda pg, neo4j: len(pg) == len(neo4j) and all(
+            p[0] == n[0] and
+            p[1] == n[1] and
+            abs(time_str_to_seconds(p[2]) - time_str_to_seconds(n[2])) <= 1 and
+            abs(time_str_to_seconds(p[3]) - time_str_to_seconds(n[3])) <= 1 and
+            abs(time_str_to_seconds(p[4]) - time_str_to_seconds(n[4])) <= 1 and
+            abs(p[5] - n[5]) <= 1
+            for p, n in zip(pg, neo4j)
+        )
+    )
+
+def test_random_inputs(pg_query_runner, neo4j_query_runner, service_date_range, execution_times):
+    """
+    CROSS-VALIDATION: Generates random date ranges and asserts results are plausible and consistent.
+    """
+    print(f"\nRunning random input tests for 'headway_stats_range' ({RANDOM_SLOW_TEST_COUNT} iterations).")
+
+    assert service_date_range is not None, "Test setup failed: Service date range could not be determined."
+
+    pg_exec_times = execution_times.get('headway_stats_range', {}).get('pg', [])
+    neo4j_exec_times = execution_times.get('headway_stats_range', {}).get('neo4j', [])
+
+    for i in range(RANDOM_SLOW_TEST_COUNT):
+        start_date, end_date = random_date_range(service_date_range, MAX_RANGE_DAYS)
+        print(f"\n[{i+1}/{RANDOM_SLOW_TEST_COUNT}] Testing range: {start_date} to {end_date}")
+        (_, pg_exec_time, neo4j_exec_time) = run_test_case(pg_query_runner, neo4j_query_runner, start_date, end_date)
+        pg_exec_times.append(pg_exec_time)
+        neo4j_exec_times.append(neo4j_exec_time)
+
+    execution_times['headway_stats_range'] = {
+        'pg': pg_exec_times,
+        'neo4j': neo4j_exec_times
+    }
+
+def test_matches_single_dates(pg_query_runner, neo4j_query_runner, service_date_range):
+    """
+    CONSISTENCY: The results for each date of a range must match the single-date query.
+    """
+    print(f"\nComparing 'headway_stats_range' against 'headway_stats' ({RANDOM_SLOW_TEST_COUNT} iterations).")
+
+    assert service_date_range is not None, "Test setup failed: Service date range could not be determined."
+
+    for i in range(RANDOM_SLOW_TEST_COUNT):
+        start_date, end_date = random_date_range(service_date_range, MAX_RANGE_DAYS)
+        print(f"\n[{i+1}/{RANDOM_SLOW_TEST_COUNT}] Testing range: {start_date} to {end_date}")
+        pg_range = pg_query_runner(SQL, (start_date, end_date))
+        neo4j_range = neo4j_query_runner(CYPHER, {'start_date': str(start_date), 'end_date': str(end_date)})
+
+        for offset in range((end_date - start_date).days + 1):
+            curr_date = start_date + timedelta(days=offset)
+            pg_single = pg_query_runner(SINGLE_DATE_SQL, (curr_date,))
+            neo4j_single = neo4j_query_runner(SINGLE_DATE_CYPHER, {'curr_date': str(curr_date)})
+
+            # Rows are compared as sets, since ties may be returned in any order.
+            pg_day = [row for row in pg_range if row['service_date'] == curr_date]
+            neo4j_day = [res['value'] for res in neo4j_range if res['value']['service_date'] == curr_date]
+            assert canonical_rows(pg_day) == canonical_rows(pg_single), f"PostgreSQL mismatch on {curr_date}."
+            assert canonical_rows(neo4j_day) == canonical_rows([res['value'] for res in neo4j_single]), f"Neo4J mismatch on {curr_date}."
+
+def test_edge_cases(pg_query_runner, neo4j_query_runner, service_date_range):
+    """
+    EDGE CASE ANALYSIS: Tests with tricky date range inputs.
+    """
+    print("\nRunning edge case analysis for 'headway_stats_range'.")
+
+    assert service_date_range is not None, "Test setup failed: Service date range could not be determined."
+
+    # Test an inverted date range (start_date > end_date).
+    start_date = service_date_range['min_date'] + timedelta(days=1)
+    end_date = service_date_range['min_date']
+    print(f"\nTesting an inverted range: start={start_date}, end={end_date}")
+    results = run_test_case(pg_query_runner, neo4j_query_runner, start_date, end_date)[0]
+    assert len(results) == 0, f"Expected 0 results for an inverted date range, but got {len(results)}."
+
+    # Test a date range entirely before any services are active.
+    before_start = service_date_range['min_date'] - timedelta(days=30)
+    before_end = service_date_range['min_date'] - timedelta(days=15)
+    print(f"\nTesting a range entirely before service starts: {before_start} to {before_end}")
+    results = run_test_case(pg_query_runner, neo4j_query_runner, before_start, before_end)[0]
+    assert len(results) == 0, f"Expected 0 results for a date range before service starts, but got {len(results)}."
+
+
+@pytest.mark.hypothesis
+def test_property_based(pg_query_runner, neo4j_query_runner, service_date_range):
+    """
+    PROPERTY-BASED TESTING: Checks the query never crashes for any valid date range.
+    """
+    assert service_date_range is not None, "Test setup failed: Service date range could not be determined."
+
+    @given(
+        start_date=st.dates(min_value=service_date_range['min_date'], max_value=service_date_range['max_date']),
+        range_days=st.integers(min_value=-1, max_value=MAX_RANGE_DAYS)
+    )
+    @settings(deadline=None)
+    def test_pbt_headway_stats_range_never_crashes(start_date, range_days):
+        # Property: For any range within the service period, the query should execute without crashing.
+        end_date = start_date + timedelta(days=range_days)
+        pg_query_runner(SQL, (start_date, end_date))
+        neo4j_query_runner(CYPHER, {'start_date': str(start_date), 'end_date': str(end_date)})
+
+    test_pbt_headway_stats_range_never_crashes()
@@ -1,5 +1,5 @@
 import pytest
-from conftest import run_test_case as rtc, QUERIES
+from conftest import run_test_case as rtc, QUERIES, RECOMPUTED_QUERIES
 
 # Query statements.
 SQL = QUERIES['postgres']['routes_by_speed']
@@ -82,3 +82,19 @@ def test_cross_validation(pg_query_runner, neo4j_query_runner, execution_times):
         'pg': pg_exec_times,
         'neo4j': neo4j_exec_times
     }
+
+def test_snapshot_consistency(pg_query_runner, neo4j_query_runner):
+    """
+    SNAPSHOT CONSISTENCY: Asserts that the results served by the catalog, which may come from
+    a snapshot taken during the import, match a fresh computation in both databases.
+    """
+    print(f"\nComparing the results of 'routes_by_speed' with a fresh computation.")
+
+    # Rows are compared as sets, since ties may be returned in any order.
+    pg_served = sorted(map(str, pg_query_runner(SQL, ())))
+    pg_recomputed = sorted(map(str, pg_query_runner(RECOMPUTED_QUERIES['postgres']['routes_by_speed'], ())))
+    assert pg_served == pg_recomputed, "PostgreSQL results differ from a fresh computation."
+
+    neo4j_served = sorted(map(str, neo4j_query_runner(CYPHER, {})))
+    neo4j_recomputed = sorted(map(str, neo4j_query_runner(RECOMPUTED_QUERIES['neo4j']['routes_by_speed'], {})))
+    assert neo4j_served == neo4j_recomputed, "Neo4J results differ from a fresh computation."
@@ -0,0 +1,164 @@
+import pytest
+from conftest import RANDOM_TEST_COUNT, RANDOM_SLOW_TEST_COUNT, RANDOM_SEED, to_canonical_time_str, time_str_to_seconds, random_stop_id
+from datetime import timedelta
+import random
+import time
+
+from Scripts import routing
+
+# Query statements. Unreachable stops have an infinite arrival time, which is returned as NULL.
+EARLIEST_ARRIVALS_SQL = '''
+    SELECT stop_id, NULLIF(earliest_arrival_time, 'infinity') AS earliest_arrival_time, previous_stop_id, trip_id_used
+    FROM earliest_arrivals(%s, %s, %s);
+'''
+SHORTEST_PATH_SQL = '''
+    SELECT stop_id, trip_id, NULLIF(arrival_time, 'infinity') AS arrival_time
+    FROM shortest_path(%s, %s, %s, %s);
+'''
+
+# Test parameters.
+PROFILE_WINDOW_MINUTES = 120
+PROFILE_SAMPLE_COUNT = 3
+
+random.seed(RANDOM_SEED)
+
+@pytest.fixture(scope="session")
+def scanner(pg_query_runner):
+    """Loads the network into the in-process CSA engine once for all tests."""
+    return routing.ConnectionScanner(pg_query_runner)
+
+def random_departure(service_date_range) -> tuple:
+    """Generates a random (date, 'HH:MM:SS') departure within the service period."""
+    date_range_days = (service_date_range['max_date'] - service_date_range['min_date']).days
+    departure_date = service_date_range['min_date'] + timedelta(days=random.randint(0, date_range_days))
+    departure_time = f"{random.randint(5, 23):02}:{random.randint(0, 59):02}:{random.randint(0, 59):02}"
+    return (departure_date, departure_time)
+
+def test_earliest_arrivals(pg_query_runner, scanner, service_date_range):
+    """
+    CROSS-VALIDATION: The arrival times found in memory must be identical to the ones of the PostgreSQL function.
+    """
+    print(f"\nComparing 'earliest_arrivals' against the in-process CSA ({RANDOM_TEST_COUNT} iterations).")
+
+    assert service_date_range is not None, "Test setup failed: Service date range could not be determined."
+
+    for i in range(RANDOM_TEST_COUNT):
+        stop_id = random_stop_id(pg_query_runner)
+        departure_date, departure_time = random_departure(service_date_range)
+        print(f"\n[{i+1}/{RANDOM_TEST_COUNT}] Testing stop: '{stop_id}', date: {departure_date}, time: {departure_time}")
+
+        start_time = time.time()
+        pg_results = pg_query_runner(EARLIEST_ARRIVALS_SQL, (stop_id, departure_date, departure_time))
+        pg_exec_time = time.time() - start_time
+        start_time = time.time()
+        csa_results = scanner.earliest_arrivals(stop_id, departure_date, departure_time)
+        csa_exec_time = time.time() - start_time
+        print(f"  PostgreSQL: {pg_exec_time:.3f} s, in-process: {csa_exec_time:.3f} s.")
+
+        # Paths with the same arrival time may differ, so only the times are compared exactly.
+        pg_times = sorted((row['stop_id'], to_canonical_time_str(row['earliest_arrival_time'])) for row in pg_results)
+        csa_times = sorted((row['stop_id'], to_canonical_time_str(row['earliest_arrival_time'])) for row in csa_results)
+        assert pg_times == csa_times, f"Arrival time mismatch for stop '{stop_id}' at {departure_date} {departure_time}."
+
+        # Every reached stop (except the origin) must have been reached from somewhere.
+        for row in csa_results:
+            if row['earliest_arrival_time'] is not None and row['stop_id'] != stop_id:
+                assert row['previous_stop_id'] is not None and row['trip_id_used'] is not None, f"Missing path for row: {row}"
+
+def test_shortest_path(pg_query_runner, scanner, service_date_range):
+    """
+    CROSS-VALIDATION: The paths found in memory must reach the destination at the same time as the PostgreSQL function.
+    """
+    print(f"\nComparing 'shortest_path' against the in-process CSA ({RANDOM_TEST_COUNT} iterations).")
+
+    assert service_date_range is not None, "Test setup failed: Service date range could not be determined."
+
+    for i in range(RANDOM_TEST_COUNT):
+        origin_stop_id = random_stop_id(pg_query_runner)
+        destination_stop_id = random_stop_id(pg_query_runner)
+        departure_date, departure_time = random_departure(service_date_range)
+        print(f"\n[{i+1}/{RANDOM_TEST_COUNT}] Testing path: '{origin_stop_id}' -> '{destination_stop_id}', date: {departure_date}, time: {departure_time}")
+
+        pg_path = pg_query_runner(SHORTEST_PATH_SQL, (origin_stop_id, destination_stop_id, departure_date, departure_time))
+        csa_path = scanner.shortest_path(origin_stop_id, destination_stop_id, departure_date, departure_time)
+
+        assert csa_path[-1]['stop_id'] == destination_stop_id, f"Path does not end at the destination: {csa_path}"
+        assert pg_path[-1]['arrival_time'] == csa_path[-1]['arrival_time'], \
+            f"Arrival time mismatch: PostgreSQL {pg_path[-1]['arrival_time']}, in-process {csa_path[-1]['arrival_time']}."
+
+        # Reachable destinations must be reached from the origin, with arrival times that never decrease.
+        if csa_path[-1]['arrival_time'] is not None:
+            assert csa_path[0]['stop_id'] == origin_stop_id, f"Path does not start at the origin: {csa_path}"
+            arrival_times = [row['arrival_time'] for row in csa_path]
+            assert arrival_times == sorted(arrival_times), f"Arrival times are not sorted: {arrival_times}"
+
+def test_profile(pg_query_runner, scanner, service_date_range):
+    """
+    CROSS-VALIDATION: The profile of an origin must never be worse than the PostgreSQL function for any departure
+    in the window. Its scans are exact, so it can find journeys that the PostgreSQL function misses, but never slower ones.
+    """
+    print(f"\nComparing the profiles of the in-process CSA against 'earliest_arrivals' ({RANDOM_SLOW_TEST_COUNT} iterations).")
+
+    assert service_date_range is not None, "Test setup failed: Service date range could not be determined."
+
+    for i in range(RANDOM_SLOW_TEST_COUNT):
+        stop_id = random_stop_id(pg_query_runner)
+        departure_date, window_start = random_departure(service_date_range)
+        window_end = to_canonical_time_str(timedelta(seconds=time_str_to_seconds(window_start) + PROFILE_WINDOW_MINUTES * 60))
+        print(f"\n[{i+1}/{RANDOM_SLOW_TEST_COUNT}] Testing stop: '{stop_id}', date: {departure_date}, window: {window_start}-{window_end}")
+
+        start_time = time.time()
+        profile = scanner.earliest_arrival_profile(stop_id, departure_date, window_start, window_end)
+        print(f"  Profile computed in {time.time() - start_time:.3f} s.")
+
+        # Journeys form a Pareto set: departing later always means arriving later.
+        for entry in profile.values():
+            journeys = entry['journeys']
+            assert all(d1 < d2 and a1 < a2 for (d1, a1), (d2, a2) in zip(journeys, journeys[1:])), f"Not a Pareto set: {journeys}"
+
+        # Compare at the end of the window, at some of the departures found by the profile and at arbitrary departures
+        # inside the window (which catch journeys missing from the profile).
+        start_seconds, end_seconds = time_str_to_seconds(window_start), time_str_to_seconds(window_end)
+        departures = sorted({departure for entry in profile.values() for departure, _ in entry['journeys']})
+        departures = [timedelta(seconds=end_seconds)] \
+            + random.sample(departures, min(PROFILE_SAMPLE_COUNT, len(departures))) \
+            + [timedelta(seconds=random.randint(start_seconds, end_seconds)) for _ in range(PROFILE_SAMPLE_COUNT)]
+        for departure in departures:
+            pg_results = pg_query_runner(EARLIEST_ARRIVALS_SQL, (stop_id, departure_date, departure))
+            for row in pg_results:
+                if row['earliest_arrival_time'] is not None:
+                    arrival = routing.profile_arrival_time(profile[row['stop_id']], departure)
+                    assert arrival is not None and arrival <= row['earliest_arrival_time'], \
+                        f"Profile arrival {arrival} at '{row['stop_id']}' is later than {row['earliest_arrival_time']} (departure {departure})."
+
+        # Percentiles of the travel time must be sorted.
+        for entry in random.sample(list(profile.values()), min(RANDOM_TEST_COUNT, len(profile))):
+            percentiles = routing.travel_time_percentiles(entry, window_start, window_end, [10, 50, 90])
+            finite = [p for p in percentiles if p is not None]
+            assert finite == sorted(finite) and percentiles[len(finite):] == [None] * (len(percentiles) - len(finite)), \
+                f"Unsorted percentiles: {percentiles}"
+            assert percentiles[1] == routing.median_travel_time(entry, window_start, window_end)
+
+def test_edge_cases(pg_query_runner, scanner, service_date_range):
+    """
+    EDGE CASE ANALYSIS: Tests with tricky inputs.
+    """
+    print("\nRunning edge case analysis for the in-process CSA.")
+
+    assert service_date_range is not None, "Test setup failed: Service date range could not be determined."
+    stop_id = random_stop_id(pg_query_runner)
+
+    # Before the service period only walks and transfers are possible.
+    before_date = service_date_range['min_date'] - timedelta(days=1)
+    print(f"\nTesting with date before service starts: {before_date}")
+    results = scanner.earliest_arrivals(stop_id, before_date, '12:00:00')
+    assert all(row['trip_id_used'] in (None, 'Walk', 'Transfer') for row in results), "Trips were used outside the service period."
+
+    # The origin is always reached at the departure time.
+    origin = next(row for row in results if row['stop_id'] == stop_id)
+    assert origin['earliest_arrival_time'] == timedelta(hours=12), f"Unexpected arrival time at the origin: {origin}"
+
+    print("\nTesting with non-existent stop 'invalid-stop-id'")
+    with pytest.raises(ValueError):
+        scanner.earliest_arrivals('invalid-stop-id', service_date_range['min_date'], '12:00:00')
+    assert scanner.shortest_path(stop_id, 'invalid-stop-id', service_date_range['min_date'], '12:00:00') == []
@@ -0,0 +1,164 @@
+import pytest
+from conftest import random_point_in_bbox, run_test_case as rtc, RANDOM_TEST_COUNT, RANDOM_SEED, QUERIES
+from hypothesis import given, strategies as st, settings
+import random
+
+# Test parameters.
+MAX_SEARCH_DISTANCE_METERS = 1000
+MAX_BATCH_SIZE = 50
+
+# Query statements.
+SQL = QUERIES['postgres']['stops_within_distance_batch']
+CYPHER = QUERIES['neo4j']['stops_within_distance_batch']
+SINGLE_SQL = QUERIES['postgres']['stops_within_distance']
+
+random.seed(RANDOM_SEED)
+
+def random_origins(bbox: dict, count: int) -> tuple[list[float], list[float], list[float]]:
+    """Generates the latitude, longitude and distance arrays for a batch of random origins."""
+    points = [random_point_in_bbox(bbox) for _ in range(count)]
+    return (
+        [lat for lat, _ in points],
+        [lon for _, lon in points],
+        [float(random.randint(0, MAX_SEARCH_DISTANCE_METERS)) for _ in range(count)]
+    )
+
+# Run test case.
+def run_test_case(pg_query_runner, neo4j_query_runner, origin_lats: list, origin_lons: list, seek_dists: list) -> list:
+    """
+    Calls the generic run_test_case function with parameters for the stops_within_distance_batch query.
+    """
+
+    # Plausibility checks.
+    def in_range(results):
+        """
+        Asserts that all origin indices are valid and all distances are under their search distance.
+        """
+        assert [x for x in results if 0 <= x[0] < len(seek_dists) and x[3] >= 0 and x[3] <= seek_dists[x[0]]] == results
+
+    def sorted_by_origin(results):
+        """
+        Asserts that results are grouped by origin, in input order.
+        """
+        indices = [x[0] for x in results]
+        assert indices == sorted(indices), f"Results are not sorted by origin index: {indices}"
+
+    return rtc(
+        pg_query_runner,
+        neo4j_query_runner,
+        SQL,
+        CYPHER,
+        (origin_lats, origin_lons, seek_dists),
+        {'origin_lats': origin_lats, 'origin_lons': origin_lons, 'seek_dists': seek_dists},
+        lambda pg_results: [(row['origin_index'], row['id'], row['name'], int(row['distance'])) for row in pg_results],
+        lambda neo4j_results: [(record['value']['origin_index'], record['value']['id'], record['value']['name'], record['value']['distance']) for record in neo4j_results],
+        plausibility_checks=[in_range, sorted_by_origin],
+        result_name="stops",
+        # Check if the distances are approximately the same (allow 1 meter differences for rounding errors).
+        comparison_function=lambda pg, neo4j: len(pg) == len(neo4j) and all(
+            p[0] == n[0] and
+            p[1] == n[1] and
+            p[2] == n[2] and
+            abs(p[3] - n[3]) <= 1
+            for p, n in zip(pg, neo4j)
+        )
+    )
+
+def test_random_inputs(pg_query_runner, neo4j_query_runner, bounding_box, execution_times):
+    """
+    CROSS-VALIDATION: Generates random batches of points and asserts that results are plausible and consistent between both databases.
+    """
+    print(f"\nRunning random input tests for 'stops_within_distance_batch' ({RANDOM_TEST_COUNT} iterations).")
+
+    assert bounding_box is not None, "Test setup failed: Bounding box could not be determined."
+
+    pg_exec_times = execution_times.get('stops_within_distance_batch', {}).get('pg', [])
+    neo4j_exec_times = execution_times.get('stops_within_distance_batch', {}).get('neo4j', [])
+
+    for i in range(RANDOM_TEST_COUNT):
+        batch_size = random.randint(1, MAX_BATCH_SIZE)
+        origin_lats, origin_lons, seek_dists = random_origins(bounding_box, batch_size)
+        print(f"\n[{i+1}/{RANDOM_TEST_COUNT}] Testing a batch of {batch_size} points")
+        (_, pg_exec_time, neo4j_exec_time) = run_test_case(pg_query_runner, neo4j_query_runner, origin_lats, origin_lons, seek_dists)
+        pg_exec_times.append(pg_exec_time)
+        neo4j_exec_times.append(neo4j_exec_time)
+
+    execution_times['stops_within_distance_batch'] = {
+        'pg': pg_exec_times,
+        'neo4j': neo4j_exec_times
+    }
+
+def test_matches_single_queries(pg_query_runner, bounding_box):
+    """
+    CONSISTENCY: A batch must return the same stops as one stops_within_distance call per origin.
+    """
+    print(f"\nComparing 'stops_within_distance_batch' against 'stops_within_distance' ({RANDOM_TEST_COUNT} iterations).")
+
+    assert bounding_box is not None, "Test setup failed: Bounding box could not be determined."
+
+    for i in range(RANDOM_TEST_COUNT):
+        batch_size = random.randint(1, MAX_BATCH_SIZE)
+        origin_lats, origin_lons, seek_dists = random_origins(bounding_box, batch_size)
+        print(f"\n[{i+1}/{RANDOM_TEST_COUNT}] Testing a batch of {batch_size} points")
+        batch = [(row['origin_index'], row['id']) for row in pg_query_runner(SQL, (origin_lats, origin_lons, seek_dists))]
+        single = [
+            (origin_index, row['id'])
+            for origin_index, params in enumerate(zip(origin_lats, origin_lons, seek_dists))
+            for row in pg_query_runner(SINGLE_SQL, params)
+        ]
+
+        assert batch == single, "Batch results differ from individual queries."
+
+def test_edge_cases(pg_query_runner, neo4j_query_runner, bounding_box):
+    """
+    EDGE CASE ANALYSIS: Tests with tricky inputs.
+    """
+
+    print("\nRunning edge case analysis for 'stops_within_distance_batch'.")
+
+    assert bounding_box is not None, "Test setup failed: Bounding box is None."
+
+    print("\nTesting an empty batch")
+    results = run_test_case(pg_query_runner, neo4j_query_runner, [], [], [])[0]
+
+    assert len(results) == 0, f"Unexpected result for empty batch, results were non-empty: {results}"
+
+    print(f"\nTesting both poles, distance={MAX_SEARCH_DISTANCE_METERS}m")
+    results = run_test_case(pg_query_runner, neo4j_query_runner, [90.0, -90.0], [0.0, 0.0], [float(MAX_SEARCH_DISTANCE_METERS)] * 2)[0]
+
+    assert len(results) == 0, f"Unexpected result for the poles, results were non-empty: {results}"
+
+    print("\nTesting null search distances (distance=0m)")
+    origin_lats, origin_lons, _ = random_origins(bounding_box, MAX_BATCH_SIZE)
+    results = run_test_case(pg_query_runner, neo4j_query_runner, origin_lats, origin_lons, [0.0] * MAX_BATCH_SIZE)[0]
+
+    assert len(results) == 0, f"Unexpected result for null search distances, results were non-empty: {results}"
+
+
+
+@pytest.mark.hypothesis
+def test_property_based(pg_query_runner, neo4j_query_runner):
+    """
+    PROPERTY-BASED TESTING: Check properties remain true for a wide variety of inputs.
+    """
+
+    @given(
+        origins=st.lists(
+            st.tuples(
+                st.floats(min_value=-90.0, max_value=90.0),
+                st.floats(min_value=-180.0, max_value=180.0),
+                st.integers(min_value=0, max_value=MAX_SEARCH_DISTANCE_METERS).map(float)
+            ),
+            max_size=MAX_BATCH_SIZE
+        )
+    )
+    @settings(deadline=None)
+    # Property: For any batch of valid coordinates, the query should execute without crashing.
+    def test_pbt_batch_query_never_crashes(origins):
+        origin_lats = [lat for lat, _, _ in origins]
+        origin_lons = [lon for _, lon, _ in origins]
+        seek_dists = [dist for _, _, dist in origins]
+        pg_query_runner(SQL, (origin_lats, origin_lons, seek_dists))
+        neo4j_query_runner(CYPHER, {'origin_lats': origin_lats, 'origin_lons': origin_lons, 'seek_dists': seek_dists})
+
+    test_pbt_batch_query_never_crashes()